@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Måler byggetid og størrelse på serialisert figur for tunkartene.
+
+Sammenligner den gamle tegnemåten (én Scattermapbox-trace per hytte) med
+de samlede tracene i map_utils (én trace per kategori), for 100, 1 000 og
+10 000 syntetiske hytter. Over MAX_INDIVIDUAL_MARKERS hytter tegner
+vis_alle_hytter_tunkart ferdige klynger, så traces og JSON holder seg små.
+
+    python scripts/benchmark_map_rendering.py
+    python scripts/benchmark_map_rendering.py --sizes 100 1000 --legacy-max 1000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Legg til prosjektets rotmappe i Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from utils.core.config import TZ
+from utils.services import map_interface, map_utils
+
+
+def synthetic_data(n_cabins: int, seed: int = 1):
+    """Hyttekoordinater og bestillinger for omtrent en tredel av hyttene"""
+    rng = np.random.default_rng(seed)
+    ids = [str(i) for i in range(1, n_cabins + 1)]
+    lat = 59.391 + rng.uniform(-0.01, 0.01, n_cabins)
+    lon = 6.428 + rng.uniform(-0.02, 0.02, n_cabins)
+    coordinates = {cid: (la, lo) for cid, la, lo in zip(ids, lat, lon)}
+
+    booked = rng.choice(n_cabins, size=n_cabins // 3, replace=False)
+    today = pd.Timestamp.now(tz=TZ).normalize()
+    bookings = pd.DataFrame({
+        "customer_id": [ids[i] for i in booked],
+        "abonnement_type": rng.choice(["Årsabonnement", "Ukentlig ved bestilling"], len(booked)),
+        "ankomst_dato": today,
+        "avreise_dato": today + pd.Timedelta(days=3),
+    })
+    return coordinates, bookings
+
+
+def legacy_all_cabins_map(bookings, coordinates):
+    """Den gamle tegnemåten: én trace per hytte"""
+    fig = go.Figure()
+    active = set()
+    for _, booking in bookings.iterrows():
+        cid = str(booking["customer_id"])
+        lat, lon = coordinates[cid]
+        active.add(cid)
+        fig.add_trace(go.Scattermapbox(
+            lat=[lat], lon=[lon], mode="markers+text",
+            marker=dict(size=15, color="blue" if booking["abonnement_type"] == "Årsabonnement" else "red"),
+            text=[cid], hovertext=[f"Hytte {cid}<br>Type: {booking['abonnement_type']}"],
+            name=booking["abonnement_type"],
+        ))
+    for cid, (lat, lon) in coordinates.items():
+        if cid not in active:
+            fig.add_trace(go.Scattermapbox(
+                lat=[lat], lon=[lon], mode="markers+text",
+                marker=dict(size=15, color="gray", opacity=0.5),
+                text=[cid], hovertext=[f"Hytte {cid}<br>Status: Ingen aktiv bestilling"],
+                name="Ingen bestilling",
+            ))
+    return fig
+
+
+def measure(build):
+    start = time.perf_counter()
+    fig = build()
+    build_time = time.perf_counter() - start
+    return build_time, len(fig.data), len(fig.to_json())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--legacy-max", type=int, default=10_000,
+                        help="Hopp over gammel tegnemåte over dette antallet hytter")
+    args = parser.parse_args()
+
+    print(f"{'hytter':>8} {'variant':>10} {'tid (ms)':>10} {'traces':>8} {'JSON (kB)':>10}")
+    for n in args.sizes:
+        coordinates, bookings = synthetic_data(n)
+        variants = [("samlet", lambda: map_utils.vis_alle_hytter_tunkart(bookings, "token", "Benchmark"))]
+        if n <= args.legacy_max:
+            variants.insert(0, ("gammel", lambda: legacy_all_cabins_map(bookings, coordinates)))
+
+        coordinates_df = pd.DataFrame.from_dict(coordinates, orient="index", columns=["lat", "lon"])
+        with patch.object(map_utils, "get_cabin_coordinates_df", return_value=coordinates_df), \
+                patch.object(map_interface, "get_cabin_coordinates_df", return_value=coordinates_df):
+            for name, build in variants:
+                build_time, traces, size = measure(build)
+                print(f"{n:>8} {name:>10} {build_time * 1000:>10.1f} {traces:>8} {size / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
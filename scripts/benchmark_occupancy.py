@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Måler utregning av daglig belegg for aktivitetsgrafen på hjemmesiden.
+
+Sammenligner den gamle løkken i vis_hyttegrend_aktivitet (to filtreringer
+med normalize_datetime per rad for hver dag) med compute_daily_occupancy,
+som regner ut hele perioden i ett sveip. Standard er en sesong på 180 dager
+med 1 000, 10 000 og 50 000 syntetiske bestillinger.
+
+    python scripts/benchmark_occupancy.py
+    python scripts/benchmark_occupancy.py --days 7 --sizes 1000 --legacy-max 1000
+"""
+
+import argparse
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Legg til prosjektets rotmappe i Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from utils.core.config import TZ, normalize_datetime
+from utils.services.occupancy_utils import compute_daily_occupancy
+
+
+def synthetic_bookings(n_bookings: int, start, days: int, seed: int = 1) -> pd.DataFrame:
+    """Bestillinger spredt over sesongen, omtrent en femtedel årsabonnement"""
+    rng = np.random.default_rng(seed)
+    ankomst = pd.Timestamp(start, tz=TZ) + pd.to_timedelta(rng.integers(0, days, n_bookings), unit="D")
+    annual = rng.random(n_bookings) < 0.2
+    lengde = pd.to_timedelta(rng.integers(1, 60, n_bookings), unit="D")
+    avreise = pd.Series(ankomst + lengde).where(annual & (rng.random(n_bookings) < 0.7))
+    return pd.DataFrame({
+        "ankomst_dato": ankomst,
+        "avreise_dato": avreise,
+        "abonnement_type": np.where(annual, "Årsabonnement", "Ukentlig ved bestilling"),
+    })
+
+
+def legacy_occupancy(alle_bestillinger, start_date, end_date) -> pd.DataFrame:
+    """Den gamle løkken fra vis_hyttegrend_aktivitet"""
+    dato_range = pd.date_range(start=start_date, end=end_date, freq="D")
+    df_aktivitet = pd.DataFrame(index=dato_range)
+    df_aktivitet["årsabonnement"] = 0
+    df_aktivitet["ukentlig"] = 0
+    for dato in dato_range:
+        dato_normalized = normalize_datetime(dato)
+        enkelt = alle_bestillinger[
+            (alle_bestillinger["abonnement_type"] != "Årsabonnement")
+            & (alle_bestillinger["ankomst_dato"].apply(normalize_datetime) == dato_normalized)
+        ]
+        df_aktivitet.loc[dato, "ukentlig"] = len(enkelt)
+        års = alle_bestillinger[
+            (alle_bestillinger["abonnement_type"] == "Årsabonnement")
+            & (alle_bestillinger["ankomst_dato"].apply(normalize_datetime) <= dato_normalized)
+            & (
+                alle_bestillinger["avreise_dato"].isna()
+                | (alle_bestillinger["avreise_dato"].apply(normalize_datetime) >= dato_normalized)
+            )
+        ]
+        df_aktivitet.loc[dato, "årsabonnement"] = len(års)
+    return df_aktivitet
+
+
+def measure(compute):
+    start = time.perf_counter()
+    result = compute()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--legacy-max", type=int, default=1_000,
+                        help="Hopp over gammel løkke over dette antallet bestillinger")
+    args = parser.parse_args()
+
+    start = pd.Timestamp("2024-11-01").date()
+    end = start + timedelta(days=args.days - 1)
+
+    print(f"{'bestillinger':>12} {'dager':>6} {'variant':>8} {'tid (ms)':>10}")
+    for n in args.sizes:
+        bookings = synthetic_bookings(n, start, args.days)
+        sweep_time, sweep = measure(lambda: compute_daily_occupancy(bookings, start, end))
+        if n <= args.legacy_max:
+            legacy_time, legacy = measure(lambda: legacy_occupancy(bookings, start, end))
+            same = (legacy[["årsabonnement", "ukentlig"]].to_numpy()
+                    == sweep[["årsabonnement", "ukentlig"]].to_numpy()).all()
+            print(f"{n:>12} {args.days:>6} {'gammel':>8} {legacy_time * 1000:>10.1f}"
+                  f"{'' if same else '  AVVIK'}")
+        print(f"{n:>12} {args.days:>6} {'sveip':>8} {sweep_time * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
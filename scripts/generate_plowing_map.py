@@ -1,143 +1,134 @@
 #!/usr/bin/env python3
 """
 Dette scriptet genererer et statisk kart over hyttene med fargekoding for abonnementstype.
-Kartet bruker sirkel-markører med hyttenummer og forskjellige farger for ulike abonnementstyper.
+
+Hyttene legges inn som ett GeoJSON-lag med bare id og abonnementstilstand per
+hytte; farger, hyttenummer og popup lages i nettleseren (samme Leaflet-mal som
+utils/components/ui/cabin_map.py). Kartet bygges bare på nytt når innholdet i
+customers.csv er endret, med mindre --force er gitt.
+
+    python scripts/generate_plowing_map.py
+    python scripts/generate_plowing_map.py --force
 """
 
-import os
+import argparse
+import hashlib
+import re
+import sys
+import time
 from pathlib import Path
+
 import pandas as pd
-import folium
-from folium import plugins
 
 # Sett opp paths
 SCRIPT_DIR = Path(__file__).parent.absolute()
 PROJECT_ROOT = SCRIPT_DIR.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from utils.components.ui.cabin_map import TILE_LAYERS, render_cabin_map_html
+from utils.services.cabin_geojson_utils import PLOWING_MAP_FILE
+
 DATA_DIR = PROJECT_ROOT / "data"
 CUSTOMERS_FILE = DATA_DIR / "customers.csv"
-OUTPUT_FILE = PROJECT_ROOT / "utils" / "services" / "plowing_map.html"
-
-def load_customer_data():
-    """Laster kundedata fra CSV-filen."""
-    if not CUSTOMERS_FILE.exists():
-        raise FileNotFoundError(f"Kunne ikke finne {CUSTOMERS_FILE}")
-    
-    return pd.read_csv(CUSTOMERS_FILE)
-
-def create_map(data):
-    """Oppretter kartet med markører for hver hytte."""
-    # Sett fast senterpunkt for kartet (midt i hyttefeltet)
-    center_lat = 59.39184  # Midt i hyttefeltet
-    center_lon = 6.42908   # Midt i hyttefeltet
-    
-    # Opprett basiskart med OpenStreetMap som standard
-    m = folium.Map(
-        location=[center_lat, center_lon],
-        zoom_start=15,
-        tiles='OpenStreetMap'  # Bruker OpenStreetMap som standard
-    )
-    
-    # Legg til alternative kartlag
-    folium.TileLayer(
-        tiles='cartodbpositron',
-        name='Lyst bakgrunnskart',
-        attr='© CartoDB',
-        control=True
-    ).add_to(m)
-    
-    # Legg til OpenStreetMap Norway for ekstra veidetaljer
-    folium.TileLayer(
-        tiles='https://opencache.statkart.no/gatekeeper/gk/gk.open_gmaps?layers=topo4&zoom={z}&x={x}&y={y}',
-        name='Topografisk (Kartverket)',
-        attr='© Kartverket',
-        control=True
-    ).add_to(m)
-    
-    # Legg til satellittkart som alternativ
-    folium.TileLayer(
-        tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
-        name='Satellitt',
-        attr='© Esri',
-        control=True
-    ).add_to(m)
-    
-    # Legg til lagkontroll
-    folium.LayerControl().add_to(m)
-    
-    # Legg til markører for hver hytte
-    for _, row in data.iterrows():
-        # Bestem farge og abonnementstype
-        if row['Subscription'] == 'star_white':
-            color = '#4B9CD3'  # Lysere blå (#4B9CD3)
-            abo_type = 'Årsabonnement'
-        elif row['Subscription'] == 'star_red':
-            color = 'red'
-            abo_type = 'Ukentlig ved bestilling'
-        else:
-            color = 'gray'
-            abo_type = 'Ingen abonnement'
-        
-        # Opprett sirkelmarkør med hyttenummer og abonnementstype
-        folium.CircleMarker(
-            location=[row['Latitude'], row['Longitude']],
-            radius=10,
-            popup=folium.Popup(
-                f"Hytte {row['customer_id']}<br>{abo_type}",
-                show=False  # Viser bare ved klikk
-            ),
-            color=color,
-            fill=True,
-            fill_color=color,
-            fill_opacity=0.7,
-            weight=2
-        ).add_to(m)
-        
-        # Legg til permanent tekst med hyttenummer
-        folium.map.Marker(
-            location=[row['Latitude'], row['Longitude']],
-            icon=folium.DivIcon(
-                html=f'<div style="font-size: 12pt; color: white; text-shadow: 1px 1px 2px black;">{row["customer_id"]}</div>',
-                icon_size=(25, 25),
-                icon_anchor=(0, 0)
+OUTPUT_FILE = PLOWING_MAP_FILE
+
+# Øk når malen eller innholdet endres, så kartet bygges på nytt
+MAP_FORMAT_VERSION = 2
+
+# Sett fast senterpunkt for kartet (midt i hyttefeltet)
+CENTER = (59.39184, 6.42908)
+
+SUBSCRIPTION_STATES = {"star_white": "annual", "star_red": "weekly"}
+SUBSCRIPTION_STYLES = {
+    "annual": {"color": "#4B9CD3", "label": "Årsabonnement"},
+    "weekly": {"color": "red", "label": "Ukentlig ved bestilling"},
+    "none": {"color": "gray", "label": "Ingen abonnement"},
+}
+
+_HASH_RE = re.compile(r"<!-- customers-hash: ([0-9a-f]+) -->")
+
+
+def content_hash(csv_bytes: bytes) -> str:
+    """Hash av customers.csv og kartformatet"""
+    digest = hashlib.sha256(csv_bytes)
+    digest.update(f"format={MAP_FORMAT_VERSION}".encode())
+    return digest.hexdigest()
+
+
+def existing_hash(path: Path):
+    """Hashen som ble lagret i den forrige genererte filen"""
+    if not path.exists():
+        return None
+    with path.open(encoding="utf-8") as f:
+        match = _HASH_RE.search(f.read(512))
+    return match.group(1) if match else None
+
+
+def build_geojson(data: pd.DataFrame) -> dict:
+    """Ett punkt per hytte med id og abonnementstilstand"""
+    data = data.dropna(subset=["Latitude", "Longitude"])
+    states = data["Subscription"].map(SUBSCRIPTION_STATES).fillna("none")
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {"id": cabin_id, "state": state},
+            }
+            for cabin_id, lat, lon, state in zip(
+                data["customer_id"].astype(str).tolist(),
+                data["Latitude"].astype(float).round(5).tolist(),
+                data["Longitude"].astype(float).round(5).tolist(),
+                states.tolist(),
             )
-        ).add_to(m)
-    
-    # Legg til tegnforklaring
-    legend_html = '''
-    <div style="position: fixed; bottom: 50px; left: 50px; z-index: 1000; 
-         background-color: white; padding: 10px; border: 2px solid grey; 
-         border-radius: 5px;">
-        <p><strong>Tegnforklaring:</strong></p>
-        <p><span style="color: #4B9CD3;">●</span> Årsabonnement</p>
-        <p><span style="color: red;">●</span> Ukentlig ved bestilling</p>
-        <p><span style="color: gray;">●</span> Ingen abonnement</p>
-    </div>
-    '''
-    m.get_root().html.add_child(folium.Element(legend_html))
-    
-    # Legg til målestokk
-    folium.plugins.MeasureControl().add_to(m)
-    
-    return m
+        ],
+    }
+
+
+def create_map(data: pd.DataFrame, digest: str) -> str:
+    """Oppretter kart-HTML med hyttene som ett GeoJSON-lag."""
+    html = render_cabin_map_html(
+        geojson=build_geojson(data),
+        styles=SUBSCRIPTION_STYLES,
+        legend_title="Tegnforklaring:",
+        center=CENTER,
+        zoom=15,
+        tiles=TILE_LAYERS,
+    )
+    return html.replace("<!DOCTYPE html>\n", f"<!DOCTYPE html>\n<!-- customers-hash: {digest} -->\n", 1)
+
 
 def main():
     """Hovedfunksjon som genererer kartet."""
+    parser = argparse.ArgumentParser(description="Genererer statisk hyttekart")
+    parser.add_argument("--force", action="store_true", help="Bygg selv om customers.csv er uendret")
+    args = parser.parse_args()
+
     try:
-        print("Laster kundedata...")
-        data = load_customer_data()
-        
+        if not CUSTOMERS_FILE.exists():
+            raise FileNotFoundError(f"Kunne ikke finne {CUSTOMERS_FILE}")
+
+        start = time.perf_counter()
+        csv_bytes = CUSTOMERS_FILE.read_bytes()
+        digest = content_hash(csv_bytes)
+        if not args.force and existing_hash(OUTPUT_FILE) == digest:
+            print(f"customers.csv er uendret, {OUTPUT_FILE} er oppdatert.")
+            return
+
         print("Genererer kart...")
-        map_obj = create_map(data)
-        
-        print(f"Lagrer kart til {OUTPUT_FILE}...")
-        map_obj.save(str(OUTPUT_FILE))
-        
-        print("Kart generert vellykket!")
-        print(f"Åpne {OUTPUT_FILE} i en nettleser for å se resultatet.")
-        
+        html = create_map(pd.read_csv(CUSTOMERS_FILE), digest)
+        OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
+        OUTPUT_FILE.write_text(html, encoding="utf-8")
+        elapsed = time.perf_counter() - start
+
+        print(f"Kart lagret til {OUTPUT_FILE}")
+        print(f"Størrelse: {OUTPUT_FILE.stat().st_size / 1024:.1f} kB, byggetid: {elapsed * 1000:.0f} ms")
+
     except Exception as e:
         print(f"Feil ved generering av kart: {str(e)}")
         raise
 
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
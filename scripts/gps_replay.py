@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Opptak og lokal avspilling av plowman-delingssiden.
+
+Eksempler:
+    # Ta opp 30 svar med ett minutts mellomrom
+    python scripts/gps_replay.py record data/gps_recordings --count 30 --interval 60
+
+    # Spill av opptaket 20x raskere, med tidsstempler flyttet til nå
+    python scripts/gps_replay.py serve --recording data/gps_recordings --speed 20 --shift-to-now
+
+    # Syntetisk brøytebil (to biler, 60x tid)
+    python scripts/gps_replay.py serve --synthetic --vehicles 2 --speed 60
+
+    # Mål henting + parsing mot en lokal stand-in
+    python scripts/gps_replay.py bench --synthetic --rounds 50
+
+Appen peker mot stand-in-serveren med
+    GPS_SOURCES=plowman PLOWMAN_SHARE_URL=http://127.0.0.1:8765/ streamlit run src/app.py
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Legg til prosjektets rotmappe i Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from utils.services.gps_replay_utils import (
+    RecordedSource,
+    SyntheticSource,
+    record_share_pages,
+    start_replay_server,
+)
+
+
+def build_source(args):
+    if args.synthetic:
+        return SyntheticSource(
+            speed=args.speed,
+            vehicles=args.vehicles,
+            sample_every=args.sample_every,
+            max_points=args.max_points,
+        )
+    if not args.recording:
+        sys.exit("Oppgi --recording eller --synthetic")
+    return RecordedSource(args.recording, speed=args.speed, shift_to_now=args.shift_to_now)
+
+
+def cmd_record(args):
+    saved = record_share_pages(args.output_dir, count=args.count, interval=args.interval)
+    print(f"Lagret {saved} sider i {args.output_dir}")
+
+
+def cmd_serve(args):
+    server = start_replay_server(build_source(args), host=args.host, port=args.port)
+    print(f"Serverer på http://{args.host}:{server.server_address[1]}/ (Ctrl+C for å stoppe)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+def cmd_bench(args):
+    import utils.services.gps_utils as gps_utils
+
+    server = start_replay_server(build_source(args))
+    gps_utils.PLOWMAN_SHARE_URL = f"http://127.0.0.1:{server.server_address[1]}/"
+    gps_utils.GPS_SOURCES = ["plowman"]
+
+    timings, points = [], 0
+    try:
+        for _ in range(args.rounds):
+            gps_utils.get_geojson_data.clear()
+            start = time.perf_counter()
+            snapshot = gps_utils.build_gps_snapshot(gps_utils.get_geojson_data())
+            timings.append(time.perf_counter() - start)
+            points = len(snapshot.timestamps)
+    finally:
+        server.shutdown()
+
+    timings.sort()
+    print(f"Runder: {len(timings)}, punkter i siste snapshot: {points}")
+    print(f"Median: {timings[len(timings) // 2] * 1000:.1f} ms, "
+          f"maks: {timings[-1] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Opptak og avspilling av GPS-delingssiden")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record = sub.add_parser("record", help="Lagre svar fra delingssiden")
+    record.add_argument("output_dir")
+    record.add_argument("--count", type=int, default=1)
+    record.add_argument("--interval", type=float, default=60.0)
+    record.set_defaults(func=cmd_record)
+
+    for name, func, helptext in (
+        ("serve", cmd_serve, "Start lokal stand-in for delingssiden"),
+        ("bench", cmd_bench, "Tidsmål henting og parsing mot lokal stand-in"),
+    ):
+        p = sub.add_parser(name, help=helptext)
+        p.add_argument("--recording", help="Mappe med opptak fra 'record'")
+        p.add_argument("--synthetic", action="store_true", help="Syntetisk kjøring langs en rute")
+        p.add_argument("--speed", type=float, default=1.0, help="Tidsakselerasjon")
+        p.add_argument("--shift-to-now", action="store_true",
+                       help="Flytt opptakets tidsstempler slik at de ser ferske ut")
+        p.add_argument("--vehicles", type=int, default=1)
+        p.add_argument("--sample-every", type=float, default=10.0,
+                       help="Sekunder (virtuell tid) mellom syntetiske punkter")
+        p.add_argument("--max-points", type=int, default=500)
+        p.set_defaults(func=func)
+
+    serve = sub.choices["serve"]
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    bench = sub.choices["bench"]
+    bench.add_argument("--rounds", type=int, default=20)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
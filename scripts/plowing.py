@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Kommandolinjeverktøy for brøytedata fra GPS-kildene.
+
+Erstatter check_plowing.py og check_last_plowing.py.
+
+Eksempler:
+    python scripts/plowing.py last-plowed
+    python scripts/plowing.py sessions
+    python scripts/plowing.py raw > geojson.json
+
+    # Følg med og skriv bare ut endringer
+    python scripts/plowing.py last-plowed --watch --interval 60
+
+    # Fra cron/systemd-timer: én kjøring, men bare utskrift når noe er endret
+    python scripts/plowing.py last-plowed --state-file /var/tmp/plowing.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# Legg til prosjektets rotmappe i Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from utils.core.config import TZ
+from utils.services.gps_source_utils import fetch_gps_sources
+from utils.services.gps_track_utils import split_sessions
+from utils.services.gps_utils import build_gps_snapshot, get_gps_sources
+
+
+def format_last_plowed(snapshot) -> str:
+    if snapshot.empty:
+        return "❌ Fant ingen brøytedata"
+    lines = [f"🚜 Siste brøyting: {snapshot.latest_local().strftime('%d.%m.%Y kl. %H:%M')}"]
+    per_vehicle = snapshot.to_frame().groupby("bilnr")["ts"].max().sort_values(ascending=False)
+    for bilnr, ts in per_vehicle.items():
+        lines.append(f"   {bilnr}: {ts.tz_convert(TZ).strftime('%d.%m.%Y kl. %H:%M')}")
+    return "\n".join(lines)
+
+
+def format_sessions(snapshot) -> str:
+    points = snapshot.to_frame().sort_values(["bilnr", "ts"])
+    sessions = split_sessions(points)
+    if sessions.empty:
+        return "❌ Fant ingen brøyteøkter"
+    lines = ["🚜 Brøyteøkter:"]
+    for s in sessions.sort_values("start").itertuples(index=False):
+        minutes = int((s.end - s.start).total_seconds() // 60)
+        lines.append(
+            f"   {s.bilnr}: {s.start.tz_convert(TZ).strftime('%d.%m.%Y %H:%M')}"
+            f"–{s.end.tz_convert(TZ).strftime('%H:%M')} "
+            f"({minutes // 60:02d}:{minutes % 60:02d}, {s.points} punkter)"
+        )
+    return "\n".join(lines)
+
+
+def format_raw(geojson) -> str:
+    return json.dumps(geojson, ensure_ascii=False, indent=2)
+
+
+def render(command: str, geojson) -> str:
+    if command == "raw":
+        return format_raw(geojson)
+    snapshot = build_gps_snapshot(geojson)
+    if command == "sessions":
+        return format_sessions(snapshot)
+    return format_last_plowed(snapshot)
+
+
+def load_state(path, sources):
+    if not path or not Path(path).exists():
+        return None
+    state = json.loads(Path(path).read_text())
+    for source in sources:
+        # Featurene lagres også, så en kilde som svarer 304 ikke mangler i utskriften
+        source.restore_state(state.get("sources", {}).get(source.name, {}))
+    return state.get("output")
+
+
+def save_state(path, sources, output):
+    if not path:
+        return
+    state = {
+        "sources": {s.name: s.export_state() for s in sources},
+        "output": output,
+    }
+    Path(path).write_text(json.dumps(state, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Brøytedata fra GPS-kildene")
+    parser.add_argument("command", choices=["last-plowed", "sessions", "raw"])
+    parser.add_argument("--watch", action="store_true", help="Følg med og skriv bare ut endringer")
+    parser.add_argument("--interval", type=float, default=60.0, help="Sekunder mellom hver henting")
+    parser.add_argument("--state-file", help="Husk forrige svar mellom kjøringer (cron/systemd)")
+    args = parser.parse_args()
+
+    sources = get_gps_sources()
+    previous = load_state(args.state_file, sources)
+
+    while True:
+        geojson = fetch_gps_sources(sources)
+        if not geojson:
+            print("❌ Kunne ikke hente brøytedata", file=sys.stderr)
+            if not args.watch:
+                sys.exit(1)
+        # Uendrede kilder (304 eller samme innhold) parses ikke på nytt
+        elif previous is None or any(s.changed for s in sources):
+            output = render(args.command, geojson)
+            if output != previous:
+                print(output, flush=True)
+                previous = output
+            save_state(args.state_file, sources, output)
+
+        if not args.watch:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
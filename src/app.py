@@ -31,6 +31,7 @@ from utils.services.admin_utils import (  # admin_utils er i services, ikke core
 from utils.services.alert_utils import (
     get_active_alerts
 )
+from utils.services.cabin_pass_utils import vis_siste_passering
 from utils.services.customer_utils import (
     get_customer_by_id,
     handle_customers
@@ -41,7 +42,10 @@ from utils.services.feedback_utils import (
     display_admin_dashboard,
 )
 from utils.services.gps_utils import display_last_activity
+from utils.services.gps_ingest_utils import innles_gps_data
 from utils.services.map_utils import display_live_plowmap
+from utils.services.occupancy_utils import rebuild_occupancy_once
+from utils.services.operations_map_utils import vis_driftskart
 from utils.services.stroing_utils import (
     admin_stroing_page,
     bestill_stroing
@@ -68,6 +72,9 @@ def display_home_page(customer):
     # Vis siste brøyteaktivitet først
     logger.info("Displaying last activity")
     display_last_activity()
+    # Høyst én innlesing per GPS-snapshot i prosessen; ellers bare lesing
+    innles_gps_data()
+    vis_siste_passering(customer["customer_id"])
     logger.info("Last activity displayed")
 
     try:
@@ -172,6 +179,9 @@ def initialize_app():
         if not initialize_database_system():
             logger.error("Failed to initialize database system")
             return False
+
+        # Bygg belegget på nytt fra bestillingene, så det retter seg selv ved avvik
+        rebuild_occupancy_once()
             
         logger.info("=== App initialization completed successfully ===")
         return True
@@ -265,6 +275,8 @@ def main():
                 elif selected == "Administrasjon" and st.session_state.is_admin:
                     if admin_choice == "Tunkart":
                         vis_tunbroyting_oversikt()
+                    elif admin_choice == "Driftskart":
+                        vis_driftskart()
                     elif admin_choice == "Varsler":
                         admin_alert()
                     elif admin_choice == "Feedback Dashboard":
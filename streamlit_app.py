@@ -41,6 +41,7 @@ try:
         bestill_stroing,
         display_live_plowmap,
         vis_tunbroyting_oversikt,
+        vis_driftskart,
         admin_alert,
         handle_user_feedback,
         admin_stroing_page,
@@ -99,6 +100,8 @@ try:
             elif selected == "Administrasjon" and st.session_state.is_admin:
                 if admin_choice == "Tunkart":
                     vis_tunbroyting_oversikt()
+                elif admin_choice == "Driftskart":
+                    vis_driftskart()
                 elif admin_choice == "Varsler":
                     admin_alert()
                 elif admin_choice == "Feedback Dashboard":
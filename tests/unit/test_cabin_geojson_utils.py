@@ -0,0 +1,140 @@
+import json
+import os
+import re
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from utils.components.ui.cabin_map import render_cabin_map_html
+from utils.db.schemas import get_database_schemas
+from utils.services import cabin_geojson_utils
+from utils.services.cabin_geojson_utils import build_cabin_state_geojson, get_cabin_state_url
+
+
+@pytest.fixture
+def coordinates(mocker):
+    coords = pd.DataFrame(
+        {"lat": [59.391, 59.392, 59.393], "lon": [6.428, 6.429, 6.430]},
+        index=pd.Index(["1", "2", "3"], name="customer_id"),
+    )
+    mocker.patch("utils.services.map_interface.get_cabin_coordinates_df", return_value=coords)
+    return coords
+
+
+@pytest.fixture
+def map_state_dir(tmp_path, monkeypatch):
+    """Midlertidige databaser med versjonstriggere og egen static-mappe"""
+    monkeypatch.setattr("utils.db.connection.DATABASE_PATH", tmp_path)
+    monkeypatch.setattr(cabin_geojson_utils, "MAP_STATE_DIR", tmp_path / "map_state")
+    schemas = get_database_schemas()
+    for db_name in ("tunbroyting", "customer"):
+        conn = sqlite3.connect(tmp_path / f"{db_name}.db")
+        conn.executescript(schemas[db_name])
+        conn.close()
+    return tmp_path
+
+
+def _bookings():
+    return pd.DataFrame({
+        "customer_id": ["1", "2"],
+        "abonnement_type": ["Årsabonnement", "Ukentlig ved bestilling"],
+    })
+
+
+def test_build_cabin_state_geojson(coordinates):
+    geojson = build_cabin_state_geojson(_bookings())
+
+    states = {f["properties"]["id"]: f["properties"]["state"] for f in geojson["features"]}
+    assert states == {"1": "annual", "2": "weekly", "3": "inactive"}
+    assert geojson["features"][0]["geometry"]["coordinates"] == [6.428, 59.391]
+
+
+def test_build_cabin_state_geojson_skips_admin_placeholders(mocker):
+    coords = pd.DataFrame(
+        {"lat": [59.391, 0.0, 0.0], "lon": [6.428, 0.0, 0.0]},
+        index=pd.Index(["1", "999", "1111"], name="customer_id"),
+    )
+    mocker.patch("utils.services.map_interface.get_cabin_coordinates_df", return_value=coords)
+
+    geojson = build_cabin_state_geojson(pd.DataFrame(columns=["customer_id", "abonnement_type"]))
+
+    assert [f["properties"]["id"] for f in geojson["features"]] == ["1"]
+
+
+def test_cabin_state_file_is_written_once_per_version(coordinates, map_state_dir):
+    calls = []
+
+    def bookings():
+        calls.append(1)
+        return _bookings()
+
+    first = get_cabin_state_url("2024-01-05", bookings)
+    second = get_cabin_state_url("2024-01-05", bookings)
+    assert first == second
+    assert len(calls) == 1
+
+    filename = first.rsplit("/", 1)[1]
+    data = json.loads((map_state_dir / "map_state" / filename).read_text())
+    assert len(data["features"]) == 3
+
+    conn = sqlite3.connect(map_state_dir / "tunbroyting.db")
+    conn.execute(
+        "INSERT INTO tunbroyting_bestillinger (customer_id, ankomst_dato, abonnement_type) "
+        "VALUES ('3', '2024-01-05', 'Årsabonnement')"
+    )
+    conn.commit()
+    conn.close()
+
+    second = get_cabin_state_url("2024-01-05", bookings)
+    assert second != first
+    assert len(calls) == 2
+
+    # Nye eller avsluttede gjentakelser endrer også dagens bestillinger
+    conn = sqlite3.connect(map_state_dir / "tunbroyting.db")
+    conn.execute(
+        "INSERT INTO tunbroyting_gjentakelser (customer_id, start_dato) VALUES ('3', '2024-01-01')"
+    )
+    conn.commit()
+    conn.close()
+
+    assert get_cabin_state_url("2024-01-05", bookings) not in (first, second)
+    assert len(calls) == 3
+
+
+def test_cabin_state_file_name_is_not_guessable(coordinates, map_state_dir):
+    old_file = map_state_dir / "map_state" / "cabin_state_2024-01-04_0_0_0.geojson"
+    old_file.parent.mkdir()
+    old_file.write_text("{}")
+    os.utime(old_file, (0, 0))
+
+    filename = get_cabin_state_url("2024-01-05", _bookings).rsplit("/", 1)[1]
+
+    assert "2024-01-05" not in filename
+    assert re.fullmatch(r"cabin_state_[0-9a-f]{32}\.geojson", filename)
+    # Filer fra tidligere prosesser fjernes
+    assert not old_file.exists()
+
+
+def test_render_cabin_map_html_escapes_inline_data():
+    geojson = {"type": "FeatureCollection", "features": [{
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [6.4, 59.4]},
+        "properties": {"id": "</script>", "state": "annual"},
+    }]}
+
+    html = render_cabin_map_html(geojson=geojson)
+
+    assert html.count("</script>") == 2
+    assert "<\\/script>" in html
+
+
+def test_cabin_state_geojson_has_clusters_for_many_cabins(coordinates, mocker):
+    mocker.patch("utils.services.map_interface.MAX_INDIVIDUAL_MARKERS", 2)
+
+    geojson = build_cabin_state_geojson(_bookings())
+
+    assert geojson["detailZoom"] > 0
+    for features in geojson["clusters"].values():
+        assert sum(f["properties"]["count"] for f in features) == 3
+    json.dumps(geojson)
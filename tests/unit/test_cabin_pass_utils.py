@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.db.schemas import get_database_schemas
+from utils.services.cabin_pass_utils import (
+    CabinGrid,
+    build_cabin_grid,
+    get_cabin_last_pass,
+    update_cabin_last_pass,
+)
+
+# Tre hytter: to nær hverandre og én ca. 500 meter unna
+CABIN_IDS = ["142", "143", "300"]
+CABIN_LAT = [59.39111, 59.39120, 59.39550]
+CABIN_LON = [6.42755, 6.42770, 6.43500]
+
+
+@pytest.fixture
+def grid():
+    return CabinGrid(CABIN_IDS, CABIN_LAT, CABIN_LON, cell_size_m=40.0)
+
+
+@pytest.fixture
+def gps_db(tmp_path, monkeypatch):
+    """Midlertidig gps-database"""
+    monkeypatch.setattr("utils.db.connection.DATABASE_PATH", tmp_path)
+    import sqlite3
+    conn = sqlite3.connect(tmp_path / "gps.db")
+    conn.executescript(get_database_schemas()["gps"])
+    conn.close()
+    return tmp_path
+
+
+def test_query_pairs_finds_only_nearby_cabins(grid):
+    p_idx, c_idx = grid.query_pairs([59.39112], [6.42757])
+    assert sorted(grid.cabin_ids[c_idx]) == ["142", "143"]
+    assert set(p_idx) == {0}
+
+
+def test_query_pairs_matches_brute_force(grid):
+    rng = np.random.default_rng(1)
+    lat = 59.391 + rng.uniform(-0.005, 0.005, 500)
+    lon = 6.428 + rng.uniform(-0.01, 0.01, 500)
+
+    p_idx, c_idx = grid.query_pairs(lat, lon, radius_m=30.0)
+
+    px, py = grid._project(lat, lon)
+    dist = np.hypot(px[:, None] - grid.x[None, :], py[:, None] - grid.y[None, :])
+    expected = set(zip(*np.nonzero(dist <= 30.0)))
+    assert set(zip(p_idx, c_idx)) == expected
+
+
+def test_radius_larger_than_cell_is_rejected(grid):
+    with pytest.raises(ValueError):
+        grid.query_pairs([59.39], [6.42], radius_m=100.0)
+
+
+def test_update_cabin_last_pass_is_incremental(grid, gps_db):
+    ts = pd.to_datetime(["2024-12-01T06:00:00Z", "2024-12-01T07:42:00Z"])
+    updated = update_cabin_last_pass(
+        [59.39111, 59.39550], [6.42755, 6.43500], ts, grid=grid
+    )
+    assert updated == 3
+    assert get_cabin_last_pass("300").strftime("%H:%M") == "08:42"  # Oslo-tid
+
+    # Samme batch på nytt gir ingen nye oppdateringer
+    assert update_cabin_last_pass([59.39111], [6.42755], ts[:1], grid=grid) == 0
+    assert get_cabin_last_pass("999") is None
+
+
+def test_build_cabin_grid_skips_cabins_without_rode(mocker):
+    coordinates = dict(zip(CABIN_IDS, zip(CABIN_LAT, CABIN_LON)))
+    coordinates.update({"999": (0.0, 0.0), "1111": (0.0, 0.0)})
+    mocker.patch("utils.services.cabin_pass_utils.get_cabin_coordinates", return_value=coordinates)
+
+    grid = build_cabin_grid()
+
+    assert sorted(grid.cabin_ids) == ["142", "143", "300"]
+    assert grid.ref_lat == pytest.approx(np.mean(CABIN_LAT))
@@ -0,0 +1,105 @@
+import io
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.db.schemas import get_database_schemas
+from utils.services.coverage_utils import (
+    GRID_SIZE,
+    cell_centers,
+    cell_index,
+    get_dekning,
+    oppdater_dekning,
+    oppdater_dekning_etter_innlesing,
+    rasterize,
+)
+
+
+@pytest.fixture
+def gps_db(tmp_path, monkeypatch):
+    """Midlertidig gps-database"""
+    monkeypatch.setattr("utils.db.connection.DATABASE_PATH", tmp_path)
+    conn = sqlite3.connect(tmp_path / "gps.db")
+    conn.executescript(get_database_schemas()["gps"])
+    conn.close()
+    return tmp_path
+
+
+def _insert_points(db_path, rows):
+    conn = sqlite3.connect(db_path / "gps.db")
+    conn.executemany("INSERT INTO gps_points (ts, bilnr, lat, lon) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def _stored_counts(db_path):
+    conn = sqlite3.connect(db_path / "gps.db")
+    rows = conn.execute("SELECT counts FROM coverage_raster").fetchall()
+    conn.close()
+    return sum(int(np.load(io.BytesIO(r[0])).sum()) for r in rows)
+
+
+def test_cell_roundtrip():
+    cells = cell_index([59.391, 59.395, 70.0], [6.428, 6.430, 6.428])
+    assert cells[2] == -1
+    lat, lon = cell_centers(cells[:2])
+    assert np.array_equal(cell_index(lat, lon), cells[:2])
+    assert cells.max() < GRID_SIZE * GRID_SIZE
+
+
+def test_rasterize_counts_points_per_cell():
+    cells, counts = rasterize([59.391, 59.391, 59.395], [6.428, 6.428, 6.430])
+    assert sorted(counts.tolist()) == [1, 2]
+
+
+def test_oppdater_dekning_is_incremental(gps_db):
+    start = pd.Timestamp("2024-12-01T00:00Z")
+    end = pd.Timestamp("2024-12-02T00:00Z")
+    _insert_points(gps_db, [
+        ("2024-12-01T06:00:00+00:00", "T1", 59.391, 6.428),
+        ("2024-12-01T06:01:00+00:00", "T1", 59.392, 6.428),
+    ])
+    assert oppdater_dekning(start, end) == 1
+    assert oppdater_dekning(start, end) == 0
+
+    # Økten fortsetter: bare det nye punktet rastres
+    _insert_points(gps_db, [("2024-12-01T06:03:00+00:00", "T1", 59.391, 6.428)])
+    assert oppdater_dekning(start, end) == 1
+    assert _stored_counts(gps_db) == 3
+
+
+def test_dekning_is_written_on_ingest_and_read_only_in_get_dekning(gps_db):
+    now = pd.Timestamp.now(tz="UTC").floor("s")
+    first = [(now - pd.Timedelta(minutes=m), "T1", 59.391, 6.428) for m in (30, 29)]
+    _insert_points(gps_db, [(ts.isoformat(), *rest) for ts, *rest in first])
+
+    assert oppdater_dekning_etter_innlesing() == 1
+    _insert_points(gps_db, [((now - pd.Timedelta(minutes=28)).isoformat(), "T1", 59.391, 6.428)])
+
+    # get_dekning skriver ikke; det nye punktet kommer først etter neste innlesing
+    get_dekning.clear()
+    dag = now.tz_convert("Europe/Oslo").date()
+    assert get_dekning(dag - pd.Timedelta(days=1), dag)["count"].sum() == 2
+    assert oppdater_dekning_etter_innlesing() == 1
+    assert _stored_counts(gps_db) == 3
+
+
+def test_dekning_after_ingest_keeps_each_vehicles_session_whole(gps_db):
+    now = pd.Timestamp.now(tz="UTC").floor("s")
+
+    def points(bilnr, minutes):
+        return [((now - pd.Timedelta(minutes=m)).isoformat(), bilnr, 59.391, 6.428) for m in minutes]
+
+    # A startet før B; begge økter pågår fortsatt ved neste innlesing
+    _insert_points(gps_db, points("A", (40, 38, 36)) + points("B", (35, 33)))
+    assert oppdater_dekning_etter_innlesing() == 2
+    _insert_points(gps_db, points("A", (30, 28)) + points("B", (29, 27)))
+    assert oppdater_dekning_etter_innlesing() == 2
+
+    conn = sqlite3.connect(gps_db / "gps.db")
+    rows = conn.execute("SELECT bilnr, start_ts FROM coverage_raster ORDER BY bilnr").fetchall()
+    conn.close()
+    assert [bilnr for bilnr, _ in rows] == ["A", "B"]
+    assert _stored_counts(gps_db) == 9
@@ -0,0 +1,33 @@
+import sqlite3
+
+import pytest
+
+from utils.db.schemas import get_database_schemas
+from utils.services.customer_utils import get_cabin_coordinates_df
+
+
+@pytest.fixture
+def customer_db(tmp_path, monkeypatch):
+    """Kundedatabase med én hytte"""
+    monkeypatch.setattr("utils.db.connection.DATABASE_PATH", tmp_path)
+    conn = sqlite3.connect(tmp_path / "customer.db")
+    conn.executescript(get_database_schemas()["customer"])
+    conn.execute("INSERT INTO customer (customer_id, lat, lon) VALUES ('1', 59.39, 6.42)")
+    conn.commit()
+    conn.close()
+    return tmp_path / "customer.db"
+
+
+def test_cabin_coordinates_follow_customer_version(customer_db):
+    assert get_cabin_coordinates_df().index.tolist() == ["1"]
+
+    # Samme skriving som data_import gjør, uten å gå via customer_utils
+    conn = sqlite3.connect(customer_db)
+    conn.execute("INSERT OR REPLACE INTO customer (customer_id, lat, lon) VALUES ('1', 59.40, 6.43)")
+    conn.execute("INSERT OR REPLACE INTO customer (customer_id, lat, lon) VALUES ('2', 59.41, 6.44)")
+    conn.commit()
+    conn.close()
+
+    df = get_cabin_coordinates_df()
+    assert df.index.tolist() == ["1", "2"]
+    assert df.loc["1", "lat"] == 59.40
@@ -0,0 +1,84 @@
+import sqlite3
+
+import plotly.graph_objects as go
+import pytest
+
+from utils.db.schemas import get_database_schemas
+from utils.services.figure_cache_utils import FigureCache, get_cached_figure, get_figure_cache
+
+
+@pytest.fixture
+def version_dbs(tmp_path, monkeypatch):
+    """Midlertidige tunbroyting- og customer-databaser med versjonstriggere"""
+    monkeypatch.setattr("utils.db.connection.DATABASE_PATH", tmp_path)
+    schemas = get_database_schemas()
+    for db_name in ("tunbroyting", "customer"):
+        conn = sqlite3.connect(tmp_path / f"{db_name}.db")
+        conn.executescript(schemas[db_name])
+        conn.close()
+    get_figure_cache().clear()
+    yield tmp_path
+    get_figure_cache().clear()
+
+
+def _figure(title):
+    return go.Figure(layout=dict(title=title))
+
+
+def test_figure_cache_evicts_least_recently_used():
+    cache = FigureCache(maxsize=2)
+    cache.put("a", _figure("a"))
+    cache.put("b", _figure("b"))
+    assert cache.get("a") is not None
+    cache.put("c", _figure("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("c").layout.title.text == "c"
+    assert cache.stats() == {"hits": 2, "misses": 1, "size": 2, "maxsize": 2}
+
+
+def test_cached_figure_is_rebuilt_when_bookings_change(version_dbs):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return _figure(f"kart {len(builds)}")
+
+    first = get_cached_figure("tunkart_i_dag", "2024-01-05", "token", build)
+    first.add_trace(go.Scattermapbox(lat=[59.39], lon=[6.42]))
+    second = get_cached_figure("tunkart_i_dag", "2024-01-05", "token", build)
+
+    # Treff gir en egen kopi uten lag lagt til av forrige kaller
+    assert len(builds) == 1
+    assert len(second.data) == 0
+
+    conn = sqlite3.connect(version_dbs / "tunbroyting.db")
+    conn.execute(
+        "INSERT INTO tunbroyting_bestillinger (customer_id, ankomst_dato, abonnement_type) "
+        "VALUES ('1', '2024-01-05', 'Årsabonnement')"
+    )
+    conn.commit()
+    conn.close()
+
+    third = get_cached_figure("tunkart_i_dag", "2024-01-05", "token", build)
+    assert len(builds) == 2
+    assert third.layout.title.text == "kart 2"
+    assert get_figure_cache().stats()["hits"] == 1
+
+
+def test_cached_figure_is_rebuilt_when_recurrence_rules_change(version_dbs):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return _figure(f"kart {len(builds)}")
+
+    get_cached_figure("tunkart_i_dag", "2024-01-05", "token", build)
+    conn = sqlite3.connect(version_dbs / "tunbroyting.db")
+    conn.execute(
+        "INSERT INTO tunbroyting_gjentakelser (customer_id, start_dato) VALUES ('1', '2024-01-01')"
+    )
+    conn.commit()
+    conn.close()
+
+    assert get_cached_figure("tunkart_i_dag", "2024-01-05", "token", build).layout.title.text == "kart 2"
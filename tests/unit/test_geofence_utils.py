@@ -0,0 +1,85 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from utils.db.schemas import get_database_schemas
+from utils.services.gps_utils import build_gps_snapshot
+from utils.services.geofence_utils import (
+    build_rode_polygons,
+    classify_points,
+    convex_hull,
+    get_siste_rodebesok,
+    hent_rodehendelser,
+    oppdater_rodehendelser,
+    points_in_polygon,
+)
+
+# Rode 1 (hytte 142-168) og rode 4 (269-307), ca. 1 km fra hverandre
+COORDINATES = {
+    "142": (59.3900, 6.4200),
+    "150": (59.3905, 6.4215),
+    "160": (59.3915, 6.4205),
+    "280": (59.3990, 6.4350),
+    "290": (59.3995, 6.4365),
+}
+
+
+@pytest.fixture
+def gps_db(tmp_path, monkeypatch):
+    """Midlertidig gps-database"""
+    monkeypatch.setattr("utils.db.connection.DATABASE_PATH", tmp_path)
+    conn = sqlite3.connect(tmp_path / "gps.db")
+    conn.executescript(get_database_schemas()["gps"])
+    conn.close()
+    return tmp_path
+
+
+def _snapshot(points):
+    return build_gps_snapshot({"features": [
+        {
+            "properties": {"lastUpdated": ts, "BILNR": "T1"},
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        }
+        for ts, lat, lon in points
+    ]})
+
+
+def test_convex_hull_and_point_in_polygon():
+    square = np.array([[0, 0], [10, 0], [10, 10], [0, 10], [5, 5]], dtype=float)
+    hull = convex_hull(square)
+    assert len(hull) == 4
+    inside = points_in_polygon([5, 15, -1, 9.9], [5, 5, 5, 9.9], hull)
+    assert list(inside) == [True, False, False, True]
+
+
+def test_rode_polygons_cover_their_cabins():
+    polygons = build_rode_polygons(COORDINATES)
+    assert sorted(polygons) == ["1", "4"]
+
+    lat = [c[0] for c in COORDINATES.values()]
+    lon = [c[1] for c in COORDINATES.values()]
+    inside = classify_points(lat, lon, polygons)
+    assert list(inside["1"]) == [True, True, True, False, False]
+    assert list(inside["4"]) == [False, False, False, True, True]
+
+
+def test_enter_and_exit_events_are_incremental(gps_db):
+    polygons = build_rode_polygons(COORDINATES)
+    first = _snapshot([
+        ("2024-12-01T06:30:00.000Z", 59.3800, 6.4100),  # utenfor
+        ("2024-12-01T06:42:00.000Z", 59.3905, 6.4210),  # inn i rode 1
+    ])
+    assert oppdater_rodehendelser(first, polygons) == 1
+    assert oppdater_rodehendelser(first, polygons) == 0
+
+    second = _snapshot([
+        ("2024-12-01T06:50:00.000Z", 59.3908, 6.4208),  # fortsatt i rode 1
+        ("2024-12-01T07:00:00.000Z", 59.3993, 6.4358),  # ut av 1, inn i 4
+    ])
+    assert oppdater_rodehendelser(second, polygons) == 2
+
+    assert get_siste_rodebesok("1").strftime("%H:%M") == "07:42"  # Oslo-tid
+    assert get_siste_rodebesok("3") is None
+    rode_1 = hent_rodehendelser("1")
+    assert list(rode_1["event"]) == ["exit", "enter"]
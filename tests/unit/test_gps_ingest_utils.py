@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from utils.services import gps_ingest_utils
+from utils.services.gps_ingest_utils import innles_gps_data
+from utils.services.gps_utils import build_gps_snapshot
+
+
+def _snapshot(ts):
+    return build_gps_snapshot({"features": [{
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [6.428, 59.391]},
+        "properties": {"lastUpdated": ts, "BILNR": "T1"},
+    }]})
+
+
+@pytest.fixture
+def steps(mocker, monkeypatch):
+    monkeypatch.setattr(gps_ingest_utils, "_sist_forsokt", None)
+    monkeypatch.setattr(gps_ingest_utils, "_sist_innlest", None)
+    return {
+        name: mocker.patch(f"utils.services.gps_ingest_utils.{name}", return_value=1)
+        for name in ("lagre_gps_punkter", "oppdater_dekning_etter_innlesing",
+                     "oppdater_rodehendelser", "oppdater_hyttepasseringer")
+    }
+
+
+def test_innles_gps_data_runs_once_per_interval_and_snapshot(steps, mocker, monkeypatch):
+    snapshot = mocker.patch("utils.services.gps_ingest_utils.get_gps_snapshot",
+                            return_value=_snapshot("2024-12-01T06:00:00Z"))
+    klokke = iter([0.0, 10.0, 70.0, 140.0])
+    monkeypatch.setattr(gps_ingest_utils.time, "monotonic", lambda: next(klokke))
+
+    assert innles_gps_data()
+    # Innenfor intervallet hentes ikke engang snapshotet
+    assert not innles_gps_data()
+    assert snapshot.call_count == 1
+    # Samme snapshot etter intervallet leses ikke inn på nytt
+    assert not innles_gps_data()
+    snapshot.return_value = _snapshot("2024-12-01T06:01:00Z")
+    assert innles_gps_data()
+
+    for step in steps.values():
+        assert step.call_count == 2
+    assert steps["oppdater_hyttepasseringer"].call_args.args[0].latest == pd.Timestamp(
+        "2024-12-01T06:01:00Z"
+    )
+
+
+def test_innles_gps_data_skips_while_another_session_ingests(steps, mocker):
+    mocker.patch("utils.services.gps_ingest_utils.get_gps_snapshot",
+                 return_value=_snapshot("2024-12-01T06:00:00Z"))
+    with gps_ingest_utils._lock:
+        assert not innles_gps_data()
+    assert steps["lagre_gps_punkter"].call_count == 0
@@ -0,0 +1,64 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+import utils.services.gps_utils as gps_utils
+from utils.services.gps_replay_utils import (
+    RecordedSource,
+    SyntheticSource,
+    render_share_page,
+    shift_timestamps,
+    start_replay_server,
+)
+
+
+@pytest.fixture
+def replay_url(monkeypatch):
+    """Starter stand-in-serveren og peker gps_utils mot den"""
+    servers = []
+
+    def _start(source):
+        server = start_replay_server(source)
+        servers.append(server)
+        monkeypatch.setattr(
+            gps_utils, "PLOWMAN_SHARE_URL", f"http://127.0.0.1:{server.server_address[1]}/"
+        )
+        monkeypatch.setattr(gps_utils, "GPS_SOURCES", ["plowman"])
+        gps_utils.get_geojson_data.clear()
+        return server
+
+    yield _start
+    for server in servers:
+        server.shutdown()
+    gps_utils.get_geojson_data.clear()
+
+
+def test_synthetic_page_is_parsed_by_get_geojson_data(replay_url):
+    source = SyntheticSource(speed=1.0, sample_every=10.0, vehicles=2)
+    source.started -= 60  # ett minutt virtuell kjøring
+
+    replay_url(source)
+    snapshot = gps_utils.build_gps_snapshot(gps_utils.get_geojson_data())
+
+    assert set(snapshot.bilnr) == {"SIM1", "SIM2"}
+    assert len(snapshot.timestamps) == 2 * 7
+    assert (snapshot.latest - snapshot.earliest) == timedelta(seconds=60)
+
+
+def test_recorded_source_replays_and_shifts(tmp_path, replay_url):
+    geojson = {"type": "FeatureCollection", "features": [{
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [6.428, 59.391]},
+        "properties": {"BILNR": "T1", "lastUpdated": "$D2024-12-01T06:00:00.000Z"},
+    }]}
+    (tmp_path / "page.html").write_text(render_share_page(geojson))
+    (tmp_path / "manifest.json").write_text(json.dumps(
+        [{"file": "page.html", "captured_at": "2024-12-01T06:00:05+00:00"}]
+    ))
+
+    replay_url(RecordedSource(tmp_path))
+    assert gps_utils.get_latest_plowing_time(gps_utils.get_geojson_data()) == "2024-12-01T06:00:00.000Z"
+
+    shifted = shift_timestamps(render_share_page(geojson), timedelta(hours=1))
+    assert "2024-12-01T07:00:00.000Z" in shifted
@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils.services.gps_source_utils import (
+    GpsSource,
+    IruteJsonSource,
+    PlowmanShareSource,
+    fetch_gps_sources,
+)
+from utils.services.gps_replay_utils import render_share_page
+from utils.services.gps_utils import build_gps_snapshot
+
+
+class FakeSource(GpsSource):
+    def __init__(self, name, features, delay=0.0, timeout=1.0, fail=False):
+        super().__init__(url="", timeout=timeout)
+        self.name = name
+        self.features = features
+        self.delay = delay
+        self.fail = fail
+
+    def fetch(self):
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("nede")
+        return [dict(f, properties=dict(f["properties"])) for f in self.features]
+
+    def parse(self, text):
+        return []
+
+
+def _point(ts, bilnr, lon=6.428, lat=59.391):
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        "properties": {"lastUpdated": ts, "BILNR": bilnr},
+    }
+
+
+def test_plowman_source_parses_share_page():
+    page = render_share_page({"type": "FeatureCollection", "features": [_point("2024-12-01T06:00:00.000Z", "T1")]})
+    features = PlowmanShareSource("").parse(page)
+    assert features[0]["properties"]["BILNR"] == "T1"
+
+
+def test_irute_source_normalizes_vehicle_list():
+    text = json.dumps({"buses": [
+        {"id": 7, "lat": 59.39, "lng": 6.43, "timestamp": 1733032800},
+        {"id": 8, "lat": None, "lng": 6.43, "timestamp": 1733032800},
+    ]})
+    features = IruteJsonSource("").parse(text)
+    assert len(features) == 1
+    assert features[0]["geometry"]["coordinates"] == [6.43, 59.39]
+    assert build_gps_snapshot({"features": features}).latest.isoformat() == "2024-12-01T06:00:00+00:00"
+
+
+def test_fetch_gps_sources_merges_and_skips_slow_or_broken():
+    sources = [
+        FakeSource("a", [_point("2024-12-01T06:00:00.000Z", "T1")]),
+        FakeSource("b", [_point("2024-12-01T06:05:00.000Z", "B7")]),
+        FakeSource("treg", [_point("2024-12-01T07:00:00.000Z", "X")], delay=2.0, timeout=0.2),
+        FakeSource("nede", [], fail=True),
+    ]
+    started = time.monotonic()
+    data = fetch_gps_sources(sources)
+
+    assert time.monotonic() - started < 1.5
+    assert sorted(f["properties"]["source"] for f in data["features"]) == ["a", "b"]
+
+
+def test_bus_features_are_kept_out_of_plow_snapshot():
+    plow = FakeSource("plowman", [_point("2024-12-01T06:00:00.000Z", "T1")])
+    bus = FakeSource("irute", [_point("2024-12-01T07:00:00.000Z", "B7")])
+    bus.kind = IruteJsonSource.kind
+    data = fetch_gps_sources([plow, bus])
+
+    assert sorted(f["properties"]["kind"] for f in data["features"]) == ["buss", "plog"]
+    snapshot = build_gps_snapshot(data)
+    assert snapshot.bilnr.tolist() == ["T1"]
+    assert snapshot.latest.isoformat() == "2024-12-01T06:00:00+00:00"
+
+
+def test_source_without_parse_cannot_be_created():
+    class Incomplete(GpsSource):
+        name = "ufullstendig"
+
+    with pytest.raises(TypeError):
+        Incomplete("")
+
+
+def test_fetch_gps_sources_all_failed():
+    assert fetch_gps_sources([FakeSource("nede", [], fail=True)]) == {}
+
+
+def test_unchanged_page_is_not_parsed_again(tmp_path):
+    from utils.services.gps_replay_utils import RecordedSource, start_replay_server
+
+    page = render_share_page({"type": "FeatureCollection", "features": [_point("2024-12-01T06:00:00.000Z", "T1")]})
+    (tmp_path / "page.html").write_text(page)
+    (tmp_path / "manifest.json").write_text(json.dumps(
+        [{"file": "page.html", "captured_at": "2024-12-01T06:00:05+00:00"}]
+    ))
+    server = start_replay_server(RecordedSource(tmp_path))
+    try:
+        source = PlowmanShareSource(f"http://127.0.0.1:{server.server_address[1]}/", timeout=2)
+        parsed = []
+        original_parse = source.parse
+        source.parse = lambda text: parsed.append(1) or original_parse(text)
+
+        assert len(source.fetch()) == 1 and source.changed
+        assert source.etag
+        assert len(source.fetch()) == 1 and not source.changed
+        assert len(parsed) == 1
+
+        # Etter omstart gir 304 de lagrede featurene, ikke et tomt svar
+        restarted = PlowmanShareSource(source.url, timeout=2)
+        restarted.restore_state(json.loads(json.dumps(source.export_state())))
+        assert len(restarted.fetch()) == 1 and not restarted.changed
+
+        # Gammel tilstand uten features gir full henting
+        legacy = PlowmanShareSource(source.url, timeout=2)
+        legacy.restore_state({"etag": source.etag})
+        assert legacy.etag is None
+        assert len(legacy.fetch()) == 1 and legacy.changed
+    finally:
+        server.shutdown()
+
+
+def test_concurrent_fetches_of_one_source_are_serialized(monkeypatch):
+    page = render_share_page({"type": "FeatureCollection", "features": [_point("2024-12-01T06:00:00.000Z", "T1")]})
+    active, overlaps = [0], []
+
+    def fake_get(url, timeout, headers):
+        active[0] += 1
+        overlaps.append(active[0] > 1)
+        time.sleep(0.05)
+        active[0] -= 1
+        return SimpleNamespace(status_code=200, ok=True, headers={"ETag": "v1"},
+                               content=page.encode(), text=page)
+
+    monkeypatch.setattr("utils.services.gps_source_utils.requests.get", fake_get)
+    source = PlowmanShareSource("")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(source.fetch())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not any(overlaps)
+    assert [len(r) for r in results] == [1, 1, 1, 1]
+    assert source.etag == "v1"
@@ -0,0 +1,87 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.db.schemas import get_database_schemas
+from utils.services.gps_utils import build_gps_snapshot
+from utils.services.gps_track_utils import (
+    douglas_peucker,
+    hent_gps_punkter,
+    lagre_gps_punkter,
+    simplify_track,
+    split_sessions,
+    tolerance_for_zoom,
+)
+
+
+@pytest.fixture
+def gps_db(tmp_path, monkeypatch):
+    """Midlertidig gps-database"""
+    monkeypatch.setattr("utils.db.connection.DATABASE_PATH", tmp_path)
+    conn = sqlite3.connect(tmp_path / "gps.db")
+    conn.executescript(get_database_schemas()["gps"])
+    conn.close()
+    return tmp_path
+
+
+def _feature(ts, bilnr, coords):
+    return {
+        "properties": {"lastUpdated": ts, "BILNR": bilnr},
+        "geometry": {"type": "LineString", "coordinates": coords},
+    }
+
+
+def test_douglas_peucker_drops_collinear_points():
+    x = np.arange(10, dtype=float)
+    y = np.zeros(10)
+    y[5] = 3.0
+    keep = douglas_peucker(x, y, tolerance=1.0)
+    assert list(np.nonzero(keep)[0]) == [0, 4, 5, 6, 9]
+
+
+def test_simplify_track_respects_tolerance():
+    lat = 59.391 + np.linspace(0, 0.01, 200)
+    lon = 6.428 + 0.00001 * np.sin(np.linspace(0, 20, 200))  # under én meter støy
+    s_lat, s_lon = simplify_track(lat, lon, tolerance_for_zoom(14))
+    assert len(s_lat) == 2
+    assert (s_lat[0], s_lat[-1]) == (lat[0], lat[-1])
+
+
+def test_tolerance_shrinks_with_zoom():
+    assert tolerance_for_zoom(12) > tolerance_for_zoom(14) > tolerance_for_zoom(17)
+
+
+def test_split_sessions_on_gap_and_vehicle():
+    points = pd.DataFrame({
+        "ts": pd.to_datetime([
+            "2024-12-01T06:00Z", "2024-12-01T06:05Z", "2024-12-01T06:30Z", "2024-12-01T06:01Z",
+        ]),
+        "bilnr": ["T1", "T1", "T1", "T2"],
+        "lat": [59.39] * 4,
+        "lon": [6.42] * 4,
+    }).sort_values(["bilnr", "ts"])
+    sessions = split_sessions(points)
+    assert list(sessions["bilnr"]) == ["T1", "T1", "T2"]
+    assert list(sessions["points"]) == [2, 1, 1]
+
+
+def test_lagre_gps_punkter_is_incremental(gps_db):
+    first = build_gps_snapshot({"features": [
+        _feature("2024-12-01T06:00:00.000Z", "T1", [[6.427, 59.391], [6.428, 59.392]]),
+    ]})
+    assert lagre_gps_punkter(first) == 2
+    assert lagre_gps_punkter(first) == 0
+
+    second = build_gps_snapshot({"features": [
+        _feature("2024-12-01T06:00:00.000Z", "T1", [[6.427, 59.391], [6.428, 59.392]]),
+        _feature("2024-12-01T06:02:00.000Z", "T1", [[6.429, 59.393]]),
+    ]})
+    assert lagre_gps_punkter(second) == 1
+
+    points = hent_gps_punkter(
+        pd.Timestamp("2024-12-01T00:00Z"), pd.Timestamp("2024-12-02T00:00Z")
+    )
+    assert len(points) == 3
+    assert len(split_sessions(points)) == 1
@@ -0,0 +1,42 @@
+import numpy as np
+
+from utils.services.gps_utils import build_gps_snapshot, get_latest_plowing_time
+
+GEOJSON = {
+    "type": "FeatureCollection",
+    "features": [
+        {
+            "properties": {"lastUpdated": "$D2024-12-01T06:00:00.000Z", "BILNR": "T1"},
+            "geometry": {"type": "LineString", "coordinates": [[6.427, 59.391], [6.428, 59.392]]},
+        },
+        {
+            "properties": {"lastUpdated": "2024-12-01T07:42:10.500Z", "BILNR": "T2"},
+            "geometry": {"type": "Point", "coordinates": [6.430, 59.393]},
+        },
+        {"properties": {"lastUpdated": "2024-12-01T05:00:00.000Z", "BILNR": "T1"}, "geometry": None},
+        {"properties": {"lastUpdated": "ugyldig"}, "geometry": None},
+        {"properties": {}, "geometry": {"type": "Point", "coordinates": [6.0, 59.0]}},
+    ],
+}
+
+
+def test_build_gps_snapshot_flattens_points():
+    snapshot = build_gps_snapshot(GEOJSON)
+
+    assert len(snapshot.timestamps) == 4
+    assert list(snapshot.bilnr) == ["T1", "T1", "T2", "T1"]
+    assert snapshot.lat[0] == 59.391 and snapshot.lon[0] == 6.427
+    assert np.isnan(snapshot.lat[3])
+    assert snapshot.earliest.isoformat() == "2024-12-01T05:00:00+00:00"
+    assert snapshot.latest_local().strftime("%H:%M") == "08:42"  # Oslo-tid
+
+
+def test_build_gps_snapshot_empty():
+    snapshot = build_gps_snapshot({})
+    assert snapshot.empty
+    assert snapshot.latest_local() is None
+
+
+def test_get_latest_plowing_time():
+    assert get_latest_plowing_time(GEOJSON) == "2024-12-01T07:42:10.500Z"
+    assert get_latest_plowing_time({"features": []}) is None
@@ -7,6 +7,7 @@ from zoneinfo import ZoneInfo
 from utils.services.map_utils import (
     vis_dagens_tunkart,
     vis_stroingskart_kommende,
+    vis_alle_hytter_tunkart,
     create_map
 )
 
@@ -60,10 +61,109 @@ def test_vis_dagens_tunkart(test_bestillinger, mocker):
     
     # Mock funksjoner
     mocker.patch('utils.services.map_utils.create_map', return_value=mock_figure)
-    mocker.patch('utils.services.map_utils.get_cabin_coordinates', 
-                return_value={'test_hytte': (59.39111, 6.42755)})
+    coordinates = pd.DataFrame({"lat": [59.39111], "lon": [6.42755]},
+                               index=pd.Index(['test_hytte'], name="customer_id"))
+    mocker.patch('utils.services.map_utils.get_cabin_coordinates_df', return_value=coordinates)
+    mocker.patch('utils.services.map_interface.get_cabin_coordinates_df', return_value=coordinates)
     mocker.patch('utils.services.tun_utils.hent_aktive_bestillinger_for_dag',
                 return_value=test_bestillinger)
     
     fig = vis_dagens_tunkart(test_bestillinger, 'test_token', 'Test Kart')
-    assert isinstance(fig, go.Figure)
\ No newline at end of file
+    assert isinstance(fig, go.Figure)
+
+
+def test_vis_alle_hytter_tunkart_uses_one_trace_per_category(mocker):
+    """Alle hytter tegnes med én trace per kategori"""
+    coordinates = pd.DataFrame(
+        {"lat": [59.39 + i * 1e-4 for i in range(1, 51)], "lon": [6.42 + i * 1e-4 for i in range(1, 51)]},
+        index=pd.Index([str(i) for i in range(1, 51)], name="customer_id"),
+    )
+    mocker.patch('utils.services.map_utils.get_cabin_coordinates_df', return_value=coordinates)
+    mocker.patch('utils.services.map_interface.get_cabin_coordinates_df', return_value=coordinates)
+    bookings = pd.DataFrame({
+        "customer_id": ["1", "2", "3"],
+        "abonnement_type": ["Årsabonnement", "Ukentlig ved bestilling", "Årsabonnement"],
+        "ankomst_dato": [datetime.now(TZ)] * 3,
+        "avreise_dato": [None] * 3,
+    })
+
+    fig = vis_alle_hytter_tunkart(bookings, 'test_token', 'Test Kart')
+
+    assert [trace.name for trace in fig.data] == ["Årsabonnement", "Ukentlig ved bestilling", "Ingen bestilling"]
+    assert [len(trace.lat) for trace in fig.data] == [2, 1, 47]
+    assert "Ankomst:" in fig.data[0].hovertext[0]
+
+
+def test_build_booking_markers_joins_coordinates_once(mocker):
+    """Siste bestilling per hytte gjelder, og hytter uten koordinater utelates"""
+    from utils.services.map_interface import build_booking_markers
+
+    coordinates = pd.DataFrame(
+        {"lat": [59.391, 59.392, 59.393], "lon": [6.428, 6.429, 6.430]},
+        index=pd.Index(["1", "2", "3"], name="customer_id"),
+    )
+    mocker.patch('utils.services.map_interface.get_cabin_coordinates_df', return_value=coordinates)
+    bookings = pd.DataFrame({
+        "customer_id": [1, 1, 2, 99],
+        "abonnement_type": ["Ukentlig ved bestilling", "Årsabonnement", "Ukentlig ved bestilling", "Årsabonnement"],
+        "ankomst_dato": ["2024-01-05", "2024-01-06", "2024-01-07", "2024-01-08"],
+    })
+
+    markers = build_booking_markers(bookings, include_idle_cabins=True)
+
+    assert markers["customer_id"].tolist() == ["1", "2", "3"]
+    assert markers["category"].tolist() == ["annual", "weekly", "inactive"]
+    assert markers["color"].tolist() == ["blue", "red", "gray"]
+    assert "Ankomst: 06.01.2024" in markers.loc[0, "hover"]
+
+
+def test_vis_alle_hytter_tunkart_clusters_many_cabins(mocker):
+    """Over grensen for enkeltmarkører tegnes én klyngetrace med antall per type"""
+    from utils.services.map_interface import cluster_markers
+
+    n = 40
+    coordinates = pd.DataFrame(
+        {"lat": [59.39 + (i % 8) * 1e-3 for i in range(n)], "lon": [6.42 + (i // 8) * 1e-3 for i in range(n)]},
+        index=pd.Index([str(i) for i in range(n)], name="customer_id"),
+    )
+    mocker.patch('utils.services.map_utils.get_cabin_coordinates_df', return_value=coordinates)
+    mocker.patch('utils.services.map_interface.get_cabin_coordinates_df', return_value=coordinates)
+    mocker.patch('utils.services.map_interface.MAX_INDIVIDUAL_MARKERS', 10)
+    bookings = pd.DataFrame({
+        "customer_id": ["0", "1", "2"],
+        "abonnement_type": ["Årsabonnement", "Ukentlig ved bestilling", "Årsabonnement"],
+    })
+
+    fig = vis_alle_hytter_tunkart(bookings, 'test_token', 'Test Kart', zoom=12)
+
+    assert len(fig.data) == 1
+    assert sum(int(t) for t in fig.data[0].text) == n
+
+    from utils.services.map_interface import build_booking_markers
+    clusters = cluster_markers(build_booking_markers(bookings, include_idle_cabins=True), 12)
+    assert clusters["count"].sum() == n
+    assert (clusters["annual"] + clusters["weekly"] + clusters["inactive"]).equals(clusters["count"])
+    assert clusters["annual"].sum() == 2
+
+    # Helt innzoomet tegnes hyttene enkeltvis igjen
+    fig = vis_alle_hytter_tunkart(bookings, 'test_token', 'Test Kart', zoom=17)
+    assert sum(len(t.lat) for t in fig.data) == n
+
+
+def test_compute_viewports_per_rode():
+    """Utsnitt per rode og totalt; admin-plassholdere (0, 0) holdes utenfor"""
+    from utils.services.map_interface import ALL_RODER, compute_viewports
+
+    coordinates = pd.DataFrame(
+        {"lat": [59.3880, 59.3884, 59.3925, 0.0], "lon": [6.4360, 6.4368, 6.4260, 0.0]},
+        index=pd.Index(["142", "150", "5", "999"], name="customer_id"),
+    )
+
+    viewports = compute_viewports(coordinates)
+
+    assert set(viewports) == {"1", "5", ALL_RODER}
+    assert viewports["1"].min_lat == 59.3880 and viewports["1"].max_lon == 6.4368
+    alle = viewports[ALL_RODER]
+    assert (alle.min_lat, alle.max_lat) == (59.3880, 59.3925)
+    assert 59.388 < alle.center["lat"] < 59.393
+    assert 10 <= alle.zoom() <= viewports["1"].zoom() <= 17
@@ -0,0 +1,163 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from utils.core.config import normalize_datetime, safe_to_datetime
+from utils.services import occupancy_utils
+from utils.services.occupancy_utils import (
+    BookingIntervalIndex,
+    compute_daily_occupancy,
+    compute_tun_statistics,
+    rebuild_occupancy_once,
+    to_local_days,
+)
+
+
+def reference_occupancy(bookings, start_date, end_date):
+    """Den gamle løkken i vis_hyttegrend_aktivitet, én filtrering per dag"""
+    counts = {}
+    for dato in pd.date_range(start=start_date, end=end_date, freq="D"):
+        day = normalize_datetime(dato)
+        ukentlig = årlig = 0
+        for _, b in bookings.iterrows():
+            ankomst = normalize_datetime(b["ankomst_dato"])
+            if ankomst is None:
+                continue
+            if b["abonnement_type"] != "Årsabonnement":
+                ukentlig += ankomst == day
+            elif ankomst <= day and (
+                pd.isna(b["avreise_dato"]) or normalize_datetime(b["avreise_dato"]) >= day
+            ):
+                årlig += 1
+        counts[dato] = (årlig, ukentlig)
+    return counts
+
+
+def random_bookings(n, start, seed=3):
+    rng = np.random.default_rng(seed)
+    ankomst = [start + timedelta(days=int(d)) for d in rng.integers(-20, 20, n)]
+    lengde = rng.integers(-2, 10, n)
+    return pd.DataFrame({
+        "ankomst_dato": [safe_to_datetime(a.isoformat()) for a in ankomst],
+        "avreise_dato": [
+            None if length > 7 else safe_to_datetime((a + timedelta(days=int(length))).isoformat())
+            for a, length in zip(ankomst, lengde)
+        ],
+        "abonnement_type": rng.choice(["Årsabonnement", "Ukentlig ved bestilling"], n),
+    })
+
+
+def test_compute_daily_occupancy_matches_per_day_filtering():
+    start, end = date(2024, 3, 25), date(2024, 4, 5)  # Over overgangen til sommertid
+    bookings = random_bookings(60, start)
+
+    df = compute_daily_occupancy(bookings, start, end)
+
+    expected = reference_occupancy(bookings, start, end)
+    assert list(df.columns) == ["dato_str", "årsabonnement", "ukentlig"]
+    assert len(df) == 12
+    for dato, (årlig, ukentlig) in expected.items():
+        assert df.loc[dato, "årsabonnement"] == årlig
+        assert df.loc[dato, "ukentlig"] == ukentlig
+
+
+def test_compute_daily_occupancy_empty_bookings():
+    df = compute_daily_occupancy(pd.DataFrame(), date(2024, 1, 1), date(2024, 1, 7))
+    assert len(df) == 7
+    assert df[["årsabonnement", "ukentlig"]].to_numpy().sum() == 0
+
+
+def test_to_local_days_handles_offsets_and_naive_values():
+    values = pd.Series([
+        "2024-01-05T23:30:00Z",        # 00:30 norsk tid neste dag
+        "2024-06-05T23:30:00+02:00",
+        "2024-06-05 23:30",            # naiv, tolkes som norsk tid
+        None,
+    ])
+    days = to_local_days(values)
+    assert list(days[:3].astype(str)) == ["2024-01-06", "2024-06-05", "2024-06-05"]
+    assert np.isnat(days[3])
+
+
+def test_booking_interval_index_matches_brute_force():
+    start = date(2024, 3, 25)
+    bookings = random_bookings(200, start, seed=7)
+    bookings.loc[::17, "ankomst_dato"] = None
+    index = BookingIntervalIndex(bookings)
+    ankomst = to_local_days(bookings["ankomst_dato"])
+    avreise = to_local_days(bookings["avreise_dato"])
+    annual = (bookings["abonnement_type"] == "Årsabonnement").to_numpy()
+
+    for offset, length in [(-30, 0), (-5, 0), (0, 0), (3, 6), (10, 40), (25, 3)]:
+        first = np.datetime64(start + timedelta(days=offset))
+        last = first + np.timedelta64(length, "D")
+        expected = [
+            i for i in range(len(bookings))
+            if not np.isnat(ankomst[i]) and (
+                (annual[i] and ankomst[i] <= last and (np.isnat(avreise[i]) or avreise[i] >= max(first, ankomst[i])))
+                or (not annual[i] and first <= ankomst[i] <= last)
+            )
+        ]
+        assert index.positions_between(first.item(), last.item()).tolist() == expected
+
+
+def test_booking_interval_index_returns_local_copies():
+    bookings = pd.DataFrame({
+        "id": [1, 2],
+        "ankomst_dato": ["2024-02-23T23:30:00Z", "2024-02-20"],
+        "avreise_dato": [None, None],
+        "abonnement_type": ["Ukentlig ved bestilling", "Årsabonnement"],
+    })
+    index = BookingIntervalIndex(bookings)
+
+    active = index.active_on(date(2024, 2, 24))
+
+    assert active["id"].tolist() == [1, 2]
+    assert str(active["ankomst_dato"].dt.tz) == "Europe/Oslo"
+    active.loc[:, "id"] = 0
+    assert index.bookings["id"].tolist() == [1, 2]
+    assert index.active_on(date(2024, 2, 19)).empty
+
+
+def test_compute_tun_statistics_matches_per_day_counts():
+    start, end = date(2024, 3, 25), date(2024, 4, 5)
+    bookings = random_bookings(80, start, seed=11)
+    bookings["customer_id"] = [str(c) for c in np.random.default_rng(11).choice([1, 20, 60, 150, 999], 80)]
+
+    statistikk = compute_tun_statistics(bookings, start, end)
+    daglig = statistikk.daglig
+
+    pd.testing.assert_frame_equal(
+        daglig[["dato_str", "årsabonnement", "ukentlig"]], compute_daily_occupancy(bookings, start, end)
+    )
+    assert (daglig["aktive"] == daglig["årsabonnement"] + daglig["ukentlig"]).all()
+    assert (statistikk.per_rode.sum(axis=1) == daglig["aktive"]).all()
+    assert list(statistikk.per_rode.columns) == ["1", "5", "6", "7", "ukjent"]
+    assert sum(statistikk.per_abonnement.values()) == statistikk.totalt == 80
+
+    ankomst = to_local_days(bookings["ankomst_dato"])
+    avreise = to_local_days(bookings["avreise_dato"])
+    for dato in daglig.index:
+        dag = np.datetime64(dato.date())
+        assert daglig.loc[dato, "ankomster"] == (ankomst == dag).sum()
+        assert daglig.loc[dato, "avreiser"] == ((avreise == dag) & (avreise >= ankomst)).sum()
+
+
+def test_compute_tun_statistics_empty_bookings():
+    statistikk = compute_tun_statistics(pd.DataFrame(), date(2024, 1, 1), date(2024, 1, 7))
+    assert statistikk.totalt == 0
+    assert len(statistikk.daglig) == 7
+    assert statistikk.daglig["aktive"].sum() == 0
+
+
+def test_rebuild_occupancy_once_runs_once_per_process(mocker):
+    occupancy_utils._rebuild_occupancy_once.clear()
+    rebuild = mocker.patch("utils.services.occupancy_utils.rebuild_occupancy", side_effect=[False, True, True])
+
+    # Et mislykket forsøk caches ikke, så neste kall prøver igjen
+    assert not rebuild_occupancy_once()
+    assert rebuild_occupancy_once()
+    assert rebuild_occupancy_once()
+    assert rebuild.call_count == 2
+    occupancy_utils._rebuild_occupancy_once.clear()
@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from utils.core.config import get_current_time
+from utils.services.gps_utils import build_gps_snapshot
+from utils.services.operations_map_utils import (
+    LAYER_GPS,
+    LAYER_STROING,
+    LAYER_TUN,
+    OperationsData,
+    build_operations_map,
+    fetch_operations_data,
+)
+
+
+@pytest.fixture
+def operations_data():
+    now = get_current_time()
+    bookings = pd.DataFrame({
+        "id": [1, 2],
+        "customer_id": ["1", "2"],
+        "ankomst_dato": [now.isoformat(), (now + timedelta(days=3)).isoformat()],
+        "avreise_dato": [None, None],
+        "abonnement_type": ["Årsabonnement", "Ukentlig ved bestilling"],
+    })
+    stroing = pd.DataFrame({
+        "customer_id": ["2", "3", "3"],
+        "onske_dato": [now.date().isoformat(), (now + timedelta(days=2)).date().isoformat(),
+                       (now + timedelta(days=30)).date().isoformat()],
+    })
+    gps = build_gps_snapshot({"features": [
+        {"geometry": {"type": "Point", "coordinates": [6.428, 59.391]},
+         "properties": {"BILNR": "A", "lastUpdated": "2024-01-05T10:00:00.000Z"}},
+        {"geometry": {"type": "Point", "coordinates": [6.429, 59.392]},
+         "properties": {"BILNR": "A", "lastUpdated": "2024-01-05T10:01:00.000Z"}},
+        {"geometry": {"type": "Point", "coordinates": [6.430, 59.393]},
+         "properties": {"BILNR": "B", "lastUpdated": "2024-01-05T10:00:00.000Z"}},
+    ]})
+    return OperationsData(bookings, stroing, gps)
+
+
+def test_build_operations_map_has_one_group_per_layer(operations_data, mocker):
+    coordinates = pd.DataFrame(
+        {"lat": [59.391, 59.392, 59.393], "lon": [6.428, 6.429, 6.430]},
+        index=pd.Index(["1", "2", "3"], name="customer_id"),
+    )
+    join = mocker.patch(
+        "utils.services.operations_map_utils.get_cabin_coordinates_df", return_value=coordinates
+    )
+
+    fig = build_operations_map(operations_data, "token")
+
+    # Koordinatene kobles én gang for alle lagene
+    assert join.call_count == 1
+    groups = {trace.name: trace.legendgroup for trace in fig.data}
+    assert groups == {
+        LAYER_GPS: LAYER_GPS,
+        "Strøing i dag": LAYER_STROING,
+        "Strøing kommende": LAYER_STROING,
+        "Årsabonnement": LAYER_TUN,
+    }
+    # To biler gir ett brudd i sporet
+    gps_trace = fig.data[0]
+    assert len(gps_trace.lat) == 4
+    assert pd.isna(gps_trace.lat[2])
+
+
+def test_fetch_operations_data_collects_all_sources(operations_data, mocker):
+    mocker.patch("utils.services.operations_map_utils.hent_aktive_bestillinger_for_dag",
+                 return_value=operations_data.bookings)
+    mocker.patch("utils.services.operations_map_utils.hent_stroing_bestillinger",
+                 return_value=operations_data.stroing)
+    mocker.patch("utils.services.operations_map_utils.get_gps_snapshot", return_value=operations_data.gps)
+
+    data = fetch_operations_data()
+
+    assert data.bookings is operations_data.bookings
+    assert data.stroing is operations_data.stroing
+    assert data.gps is operations_data.gps
@@ -0,0 +1,101 @@
+import sqlite3
+from datetime import date
+from itertools import islice
+
+import pytest
+
+from utils.core.models import Gjentakelse
+from utils.db.schemas import get_database_schemas
+from utils.services.occupancy_utils import get_occupancy, rebuild_occupancy
+from utils.services.recurrence_utils import (
+    avslutt_gjentakelse,
+    gjentakende_bestillinger,
+    hent_kundens_gjentakelser,
+    lagre_gjentakelse,
+    slett_gjentakelse,
+)
+from utils.services.tun_utils import hent_bestillinger_for_periode
+
+
+@pytest.fixture
+def tun_db(tmp_path, monkeypatch):
+    """Tunbrøyting-database med én lagret fredagsbestilling for hytte 1"""
+    monkeypatch.setattr("utils.db.connection.DATABASE_PATH", tmp_path)
+    conn = sqlite3.connect(tmp_path / "tunbroyting.db")
+    conn.executescript(get_database_schemas()["tunbroyting"])
+    conn.execute(
+        "INSERT INTO tunbroyting_bestillinger (customer_id, ankomst_dato, abonnement_type) "
+        "VALUES ('1', '2024-02-23T00:00:00+01:00', 'Ukentlig ved bestilling')"
+    )
+    conn.commit()
+    conn.close()
+    assert rebuild_occupancy()
+    return tmp_path
+
+
+def test_forekomster_aligns_to_weekday_and_window():
+    regel = Gjentakelse(id=1, customer_id="1", start_dato=date(2024, 1, 3), slutt_dato=date(2024, 3, 1),
+                        intervall_uker=2)
+
+    # Første fredag etter 3. januar er 5. januar, deretter annenhver uke
+    assert list(regel.forekomster(date(2024, 1, 1), date(2024, 2, 10))) == [
+        date(2024, 1, 5), date(2024, 1, 19), date(2024, 2, 2),
+    ]
+    assert list(regel.forekomster(date(2024, 2, 3), date(2024, 12, 31))) == [
+        date(2024, 2, 16), date(2024, 3, 1),
+    ]
+
+
+def test_forekomster_is_lazy_for_open_ended_rules():
+    regel = Gjentakelse(id=1, customer_id="1", start_dato=date(2024, 11, 1))
+
+    forste = list(islice(regel.forekomster(date(2024, 11, 1), date(9999, 12, 31)), 3))
+
+    assert forste == [date(2024, 11, 1), date(2024, 11, 8), date(2024, 11, 15)]
+
+
+def test_gjentakende_bestillinger_in_queries(tun_db):
+    assert lagre_gjentakelse("1", date(2024, 2, 1), date(2024, 3, 31))
+    assert lagre_gjentakelse("150", date(2024, 2, 20))
+    assert not lagre_gjentakelse("150", date(2024, 2, 20), date(2024, 2, 1))
+
+    forekomster = gjentakende_bestillinger(date(2024, 2, 20), date(2024, 3, 2))
+    # Hytte 1 har allerede en lagret bestilling 23. februar
+    assert sorted(zip(forekomster["customer_id"], forekomster["ankomst_dato"])) == [
+        ("1", "2024-03-01"), ("150", "2024-02-23"), ("150", "2024-03-01"),
+    ]
+
+    periode = hent_bestillinger_for_periode(date(2024, 2, 23), date(2024, 2, 23))
+    assert sorted(periode["customer_id"]) == ["1", "150"]
+    assert periode["id"].isna().sum() == 1
+
+    belegg = get_occupancy(date(2024, 2, 23), date(2024, 3, 1)).groupby("date")["weekly_count"].sum()
+    assert dict(zip(belegg.index.strftime("%Y-%m-%d"), belegg)) == {"2024-02-23": 2, "2024-03-01": 2}
+
+
+def test_slett_gjentakelse_checks_owner(tun_db):
+    assert lagre_gjentakelse("150", date(2024, 2, 20))
+    regel = hent_kundens_gjentakelser("150")[0]
+
+    assert not slett_gjentakelse(regel.id, "151")
+    assert slett_gjentakelse(regel.id, "150")
+    assert hent_kundens_gjentakelser("150") == []
+
+
+def test_avslutt_gjentakelse_keeps_past_occurrences(tun_db):
+    assert lagre_gjentakelse("150", date(2024, 2, 2))
+    assert lagre_gjentakelse("151", date(2024, 3, 1))
+    regel = hent_kundens_gjentakelser("150")[0]
+
+    assert not avslutt_gjentakelse(regel.id, date(2024, 2, 20), "151")
+    assert avslutt_gjentakelse(regel.id, date(2024, 2, 20), "150")
+    assert hent_kundens_gjentakelser("150")[0].slutt_dato == date(2024, 2, 20)
+    forekomster = gjentakende_bestillinger(date(2024, 2, 1), date(2024, 3, 31))
+    assert sorted(forekomster.loc[forekomster["customer_id"] == "150", "ankomst_dato"]) == [
+        "2024-02-02", "2024-02-09", "2024-02-16",
+    ]
+
+    # En regel som ikke har startet ennå har ingen historikk og slettes
+    ikke_startet = hent_kundens_gjentakelser("151")[0]
+    assert avslutt_gjentakelse(ikke_startet.id, date(2024, 2, 20), "151")
+    assert hent_kundens_gjentakelser("151") == []
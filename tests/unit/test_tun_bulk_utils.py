@@ -0,0 +1,111 @@
+import io
+import sqlite3
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from utils.db.schemas import get_database_schemas
+from utils.services.occupancy_utils import get_occupancy, rebuild_occupancy
+from utils.services.tun_bulk_utils import (
+    eksporter_bestillinger_csv,
+    finn_batchendringer,
+    importer_bestillinger,
+    lagre_batchendringer,
+    les_bestillingsfil,
+    valider_bestillinger,
+)
+
+CSV = """customer_id,ankomst_dato,avreise_dato,abonnement_type
+1,2024-11-01,2025-04-30,Årsabonnement
+150,2024-11-08,,Ukentlig ved bestilling
+150,2024-11-08,,Ukentlig ved bestilling
+,2024-11-08,,Ukentlig ved bestilling
+500,2024-11-08,,Ukentlig ved bestilling
+20,ikke en dato,,Ukentlig ved bestilling
+21,2024-11-08,2024-11-01,Årsabonnement
+22,2024-11-08,,Månedlig
+23,2024-11-08T00:00:00+01:00,,Ukentlig ved bestilling
+"""
+
+
+@pytest.fixture
+def tun_db(tmp_path, monkeypatch):
+    """Tom tunbrøyting-database med én eksisterende bestilling"""
+    monkeypatch.setattr("utils.db.connection.DATABASE_PATH", tmp_path)
+    conn = sqlite3.connect(tmp_path / "tunbroyting.db")
+    conn.executescript(get_database_schemas()["tunbroyting"])
+    conn.execute(
+        "INSERT INTO tunbroyting_bestillinger (customer_id, ankomst_dato, abonnement_type) "
+        "VALUES ('23', '2024-11-08', 'Ukentlig ved bestilling')"
+    )
+    conn.commit()
+    conn.close()
+    assert rebuild_occupancy()
+    return tmp_path
+
+
+def _les(tekst=CSV):
+    fil = io.BytesIO(tekst.encode())
+    fil.name = "bestillinger.csv"
+    return les_bestillingsfil(fil)
+
+
+def test_valider_bestillinger_marks_each_rule():
+    validert = valider_bestillinger(_les())
+
+    assert validert["feil"].tolist() == [
+        "", "", "Duplikat i filen", "Mangler hytte", "Ukjent hytte", "Ugyldig ankomstdato",
+        "Avreise må være etter ankomst", "Ugyldig abonnementstype", "",
+    ]
+    assert validert.loc[0, "avreise_dato"] == "2025-04-30"
+    assert validert.loc[8, "ankomst_dato"] == "2024-11-08"
+
+
+def test_les_bestillingsfil_requires_columns():
+    with pytest.raises(ValueError):
+        _les("customer_id,ankomst_dato\n1,2024-11-01\n")
+
+
+def test_importer_skips_existing_and_updates_occupancy(tun_db):
+    validert = valider_bestillinger(_les())
+
+    lagret, fantes = importer_bestillinger(validert[validert["feil"] == ""])
+
+    assert (lagret, fantes) == (2, 1)
+    belegg = get_occupancy(date(2024, 11, 8), date(2024, 11, 8)).set_index("rode")
+    assert belegg.loc["5", "annual_count"] == 1
+    assert belegg["weekly_count"].sum() == 2
+
+
+def test_batchendringer_update_and_delete(tun_db):
+    validert = valider_bestillinger(_les())
+    importer_bestillinger(validert[validert["feil"] == ""])
+    original = pd.read_csv(io.StringIO("".join(eksporter_bestillinger_csv(chunksize=1))))
+    assert len(original) == 3
+
+    redigert = original[original["customer_id"] != 150].copy()
+    redigert.loc[redigert["customer_id"] == 1, "avreise_dato"] = "2024-11-07"
+    endrede, slettede = finn_batchendringer(original, redigert)
+
+    assert endrede["customer_id"].tolist() == [1]
+    assert slettede == original.loc[original["customer_id"] == 150, "id"].tolist()
+    assert lagre_batchendringer(valider_bestillinger(endrede), slettede)
+
+    belegg = get_occupancy(date(2024, 11, 8), date(2024, 11, 8))
+    assert belegg["annual_count"].sum() == 0
+    assert belegg["weekly_count"].sum() == 1
+
+
+def test_batchendringer_roll_back_on_conflict(tun_db):
+    validert = valider_bestillinger(_les())
+    importer_bestillinger(validert[validert["feil"] == ""])
+    original = pd.read_csv(io.StringIO("".join(eksporter_bestillinger_csv())))
+
+    # Hytte 150 flyttes til samme hytte og dag som 23 sin bestilling
+    redigert = original.copy()
+    redigert.loc[redigert["customer_id"] == 150, "customer_id"] = 23
+    endrede, slettede = finn_batchendringer(original, redigert)
+
+    assert not lagre_batchendringer(valider_bestillinger(endrede), slettede)
+    assert sorted(pd.read_csv(io.StringIO("".join(eksporter_bestillinger_csv())))["customer_id"]) == [1, 23, 150]
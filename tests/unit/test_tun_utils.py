@@ -0,0 +1,225 @@
+import sqlite3
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+import streamlit as st
+
+from utils.core.config import TZ
+from utils.core.models import BrukerBestilling
+from utils.db.migrations import migrate_tunbroyting_table
+from utils.db.schemas import get_database_schemas
+from utils.services.occupancy_utils import (
+    BookingIntervalIndex,
+    compute_daily_occupancy,
+    get_daily_occupancy,
+    get_occupancy,
+    rebuild_occupancy,
+)
+import utils.services.tun_utils as tun_utils
+from utils.services.tun_utils import (
+    AKTIVE_BESTILLINGER_QUERY,
+    bruker_bestilling_lagret,
+    bruker_bestilling_slettet,
+    get_bruker_bestillinger,
+    get_bookings,
+    get_tun_statistics,
+    hent_aktive_bestillinger_for_dag,
+    hent_bestillinger_for_periode,
+    lagre_bestilling,
+    oppdater_bestilling,
+    slett_bestilling,
+)
+
+# Datoene lagres både som ren dato (ny bestilling) og isoformat med tidssone (redigert)
+BESTILLINGER = [
+    ("1", "2024-02-23", None, "Ukentlig ved bestilling"),
+    ("2", "2024-02-23T00:00:00+01:00", None, "Ukentlig ved bestilling"),
+    ("3", "2024-02-20", None, "Årsabonnement"),
+    ("4", "2024-02-10T00:00:00+01:00", "2024-02-22T00:00:00+01:00", "Årsabonnement"),
+    ("5", "2024-02-21", "2024-02-25", "Årsabonnement"),
+    ("6", "2024-02-24", None, "Ukentlig ved bestilling"),
+    ("7", "2024-02-26", "2024-02-20", "Årsabonnement"),
+]
+
+
+@pytest.fixture
+def tun_db(tmp_path, monkeypatch):
+    """Midlertidig tunbrøyting-database med bestillinger i begge datoformater"""
+    monkeypatch.setattr("utils.db.connection.DATABASE_PATH", tmp_path)
+    conn = sqlite3.connect(tmp_path / "tunbroyting.db")
+    conn.executescript(get_database_schemas()["tunbroyting"])
+    conn.executemany(
+        "INSERT INTO tunbroyting_bestillinger "
+        "(customer_id, ankomst_dato, avreise_dato, abonnement_type) VALUES (?, ?, ?, ?)",
+        BESTILLINGER,
+    )
+    conn.commit()
+    conn.close()
+    return tmp_path
+
+
+def test_aktive_bestillinger_for_dag_filters_in_sql(tun_db):
+    aktive = hent_aktive_bestillinger_for_dag(date(2024, 2, 23))
+
+    assert sorted(aktive["customer_id"]) == ["1", "2", "3", "5"]
+    assert str(aktive["ankomst_dato"].dt.tz) == "Europe/Oslo"
+
+
+def test_periode_matches_interval_index(tun_db, mocker):
+    mocker.patch("utils.services.tun_utils.verify_tunbroyting_database", return_value=True)
+    index = BookingIntervalIndex(get_bookings())
+
+    for start, slutt in [(date(2024, 2, 1), date(2024, 2, 9)), (date(2024, 2, 22), date(2024, 2, 24)),
+                         (date(2024, 2, 25), date(2024, 3, 1))]:
+        periode = hent_bestillinger_for_periode(start, slutt)
+        assert sorted(periode["id"]) == sorted(index.active_between(start, slutt)["id"])
+
+
+def test_aktive_bestillinger_query_uses_day_index(tun_db):
+    conn = sqlite3.connect(tun_db / "tunbroyting.db")
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN " + AKTIVE_BESTILLINGER_QUERY, {"start": "2024-02-23", "slutt": "2024-02-23"}
+    ).fetchall()
+    conn.close()
+
+    details = " ".join(row[-1] for row in plan)
+    assert "idx_tunbroyting_ankomst_dag" in details or "idx_tunbroyting_type_ankomst_dag" in details
+    assert "SCAN tunbroyting_bestillinger" not in details
+
+
+def test_occupancy_table_follows_writes(tun_db, mocker):
+    mocker.patch("utils.services.tun_utils.verify_tunbroyting_database", return_value=True)
+    assert rebuild_occupancy()
+
+    assert lagre_bestilling("150", "2024-02-23", None, "Ukentlig ved bestilling")
+    assert lagre_bestilling("300", "2024-02-20", "2024-02-28", "Årsabonnement")
+    assert oppdater_bestilling(3, {
+        "customer_id": "3",
+        "ankomst_dato": datetime(2024, 2, 22, tzinfo=TZ),
+        "avreise_dato": datetime(2024, 2, 24, tzinfo=TZ),
+        "abonnement_type": "Årsabonnement",
+    })
+    assert slett_bestilling(1)
+
+    start, slutt = date(2024, 2, 1), date(2024, 3, 10)
+    inkrementelt = get_occupancy(start, slutt)
+    assert rebuild_occupancy()
+    pd.testing.assert_frame_equal(inkrementelt, get_occupancy(start, slutt))
+
+    # Summert over rodene er belegget det samme som sveipet over bestillingene
+    forventet = compute_daily_occupancy(get_bookings(), start, slutt)
+    pd.testing.assert_frame_equal(get_daily_occupancy(start, slutt), forventet)
+
+
+def test_occupancy_per_rode(tun_db):
+    assert rebuild_occupancy()
+
+    belegg = get_occupancy(date(2024, 2, 23), date(2024, 2, 23)).set_index("rode")
+
+    # Hytte 1-7 ligger i rode 5: to ukentlige og to årsabonnement (ett åpent) er aktive
+    assert list(belegg.index) == ["5"]
+    assert belegg.loc["5", "weekly_count"] == 2
+    assert belegg.loc["5", "annual_count"] == 2
+
+
+def test_lagre_bestilling_rejects_same_day_duplicate(tun_db, mocker):
+    mocker.patch("utils.services.tun_utils.verify_tunbroyting_database", return_value=True)
+    assert rebuild_occupancy()
+
+    # Hytte 2 er lagret med tidssone; samme dag som ren dato er også et duplikat
+    assert not lagre_bestilling("1", "2024-02-23", None, "Ukentlig ved bestilling")
+    assert not lagre_bestilling("2", "2024-02-23", None, "Ukentlig ved bestilling")
+    assert lagre_bestilling("1", "2024-02-24", None, "Ukentlig ved bestilling")
+
+    belegg = get_occupancy(date(2024, 2, 23), date(2024, 2, 23))
+    assert belegg["weekly_count"].sum() == 2
+
+
+def test_lagre_bestilling_is_idempotent_per_token(tun_db, mocker):
+    mocker.patch("utils.services.tun_utils.verify_tunbroyting_database", return_value=True)
+
+    assert lagre_bestilling("150", "2024-03-01", None, "Ukentlig ved bestilling", request_token="abc")
+    assert lagre_bestilling("150", "2024-03-01", None, "Ukentlig ved bestilling", request_token="abc")
+
+    bestillinger = get_bookings()
+    assert (bestillinger["customer_id"] == "150").sum() == 1
+
+
+def test_migration_removes_duplicates(tmp_path, monkeypatch):
+    monkeypatch.setattr("utils.db.connection.DATABASE_PATH", tmp_path)
+    conn = sqlite3.connect(tmp_path / "tunbroyting.db")
+    conn.execute(
+        "CREATE TABLE tunbroyting_bestillinger (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "customer_id TEXT NOT NULL, ankomst_dato TEXT NOT NULL, avreise_dato TEXT, "
+        "abonnement_type TEXT NOT NULL)"
+    )
+    conn.executemany(
+        "INSERT INTO tunbroyting_bestillinger "
+        "(customer_id, ankomst_dato, avreise_dato, abonnement_type) VALUES (?, ?, ?, ?)",
+        BESTILLINGER + [
+            ("1", "2024-02-23T00:00:00+01:00", None, "Ukentlig ved bestilling"),
+            ("3", "2024-02-20", None, "Årsabonnement"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    assert migrate_tunbroyting_table()
+
+    conn = sqlite3.connect(tmp_path / "tunbroyting.db")
+    rader = conn.execute(
+        "SELECT customer_id, ankomst_dato FROM tunbroyting_bestillinger ORDER BY id"
+    ).fetchall()
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute(
+            "INSERT INTO tunbroyting_bestillinger (customer_id, ankomst_dato, abonnement_type) "
+            "VALUES ('5', '2024-02-21T00:00:00+01:00', 'Årsabonnement')"
+        )
+    conn.close()
+    assert rader == [(b[0], b[1]) for b in BESTILLINGER]
+
+
+def test_bruker_bestillinger_view_updates_incrementally(tun_db, mocker):
+    mocker.patch("utils.services.tun_utils.verify_tunbroyting_database", return_value=True)
+    st.session_state.pop("tun_bruker_visning", None)
+    tun_utils._cached_bruker_bestillinger.clear()
+    lastet = mocker.spy(tun_utils, "_cached_bruker_bestillinger")
+
+    assert get_bruker_bestillinger("4") == [
+        BrukerBestilling(4, date(2024, 2, 10), date(2024, 2, 22), "Årsabonnement")
+    ]
+    get_bruker_bestillinger("4")
+    assert lastet.call_count == 1
+
+    # Egen lagring og sletting oppdaterer visningen uten ny spørring
+    assert lagre_bestilling("4", "2024-03-01", None, "Ukentlig ved bestilling")
+    bruker_bestilling_lagret("4", date(2024, 3, 1))
+    rader = get_bruker_bestillinger("4")
+    assert [b.ankomst_dato for b in rader] == [date(2024, 3, 1), date(2024, 2, 10)]
+    assert slett_bestilling(4)
+    bruker_bestilling_slettet("4", 4)
+    assert [b.ankomst_dato for b in get_bruker_bestillinger("4")] == [date(2024, 3, 1)]
+    assert lastet.call_count == 1
+
+    # Andres endringer i mellomtiden gir full innlasting
+    assert lagre_bestilling("5", "2024-03-01", None, "Ukentlig ved bestilling")
+    assert lagre_bestilling("4", "2024-03-08", None, "Ukentlig ved bestilling")
+    bruker_bestilling_lagret("4", date(2024, 3, 8))
+    assert len(get_bruker_bestillinger("4")) == 2
+    assert lastet.call_count == 2
+
+
+def test_tun_statistics_follow_table_versions(tun_db, mocker):
+    mocker.patch("utils.services.tun_utils.verify_tunbroyting_database", return_value=True)
+    tun_utils._cached_tun_statistics.clear()
+    dag = date(2024, 2, 23)
+
+    assert get_tun_statistics(dag, dag).daglig.loc[pd.Timestamp(dag), "aktive"] == 4
+    assert lagre_bestilling("8", "2024-02-23", None, "Ukentlig ved bestilling")
+    assert tun_utils.lagre_gjentakelse("150", date(2024, 2, 20))
+
+    statistikk = get_tun_statistics(dag, dag)
+    assert statistikk.daglig.loc[pd.Timestamp(dag), "aktive"] == 6
+    assert statistikk.per_rode.loc[pd.Timestamp(dag)].to_dict() == {"1": 1, "5": 5}
+    assert statistikk.totalt == sum(statistikk.per_abonnement.values())
@@ -0,0 +1,219 @@
+# Fil: components/ui/cabin_map.py
+# Kategori: UI Components
+#
+# Lett Leaflet-kart for hytter. Serveren sender bare en GeoJSON
+# FeatureCollection (inline eller som URL); farger, markører og popup lages i
+# nettleseren ut fra properties.state. Markøren er samme SVG som i
+# mapmarker.js: en halvgjennomsiktig sirkel med en fylt sirkel inni.
+
+import json
+from typing import Dict, Optional
+
+import streamlit as st
+
+from utils.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_CENTER = (59.39184, 6.42908)
+
+# Tilstand -> farge og tekst i tegnforklaringen
+BOOKING_STATE_STYLES = {
+    "annual": {"color": "#0000FF", "label": "Årsabonnement"},
+    "weekly": {"color": "#FF0000", "label": "Ukentlig ved bestilling"},
+    "inactive": {"color": "#808080", "label": "Ingen bestilling"},
+}
+
+# Bakgrunnskart som i det statiske oversiktskartet
+TILE_LAYERS = [
+    {
+        "name": "OpenStreetMap",
+        "url": "https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png",
+        "attribution": "© OpenStreetMap",
+    },
+    {
+        "name": "Lyst bakgrunnskart",
+        "url": "https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png",
+        "attribution": "© CartoDB",
+    },
+    {
+        "name": "Topografisk (Kartverket)",
+        "url": "https://opencache.statkart.no/gatekeeper/gk/gk.open_gmaps?layers=topo4&zoom={z}&x={x}&y={y}",
+        "attribution": "© Kartverket",
+    },
+    {
+        "name": "Satellitt",
+        "url": "https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
+        "attribution": "© Esri",
+    },
+]
+
+_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>
+  html, body, #map { height: 100%; margin: 0; }
+  .cabin-label { font-size: 11px; font-weight: 600; color: white;
+                 text-shadow: 1px 1px 2px black; white-space: nowrap; }
+  .cluster-count { position: absolute; left: 0; top: 0; width: 100%; height: 100%;
+                   display: flex; align-items: center; justify-content: center;
+                   font: bold 11px sans-serif; color: white; }
+  .cabin-legend { background: white; padding: 6px 10px; border-radius: 5px;
+                  border: 1px solid #999; font: 13px sans-serif; line-height: 1.6; }
+</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+const CONFIG = __CONFIG__;
+
+const map = L.map("map").setView(CONFIG.center, CONFIG.zoom);
+const baseLayers = {};
+CONFIG.tiles.forEach((t, i) => {
+  const layer = L.tileLayer(t.url, {attribution: t.attribution, maxZoom: 19});
+  if (i === 0) layer.addTo(map);
+  baseLayers[t.name] = layer;
+});
+if (CONFIG.tiles.length > 1) L.control.layers(baseLayers).addTo(map);
+
+function markerSvg(color, size) {
+  return `<svg width="${size}" height="${size}" viewBox="0 0 24 24" xmlns="http://www.w3.org/2000/svg">` +
+         `<circle cx="12" cy="12" r="10" fill="${color}" fill-opacity="0.8"/>` +
+         `<circle cx="12" cy="12" r="6" fill="${color}"/></svg>`;
+}
+
+function styleFor(state) {
+  return CONFIG.styles[state] || {color: "#808080", label: state};
+}
+
+function cabinMarker(feature, latlng) {
+  const style = styleFor(feature.properties.state);
+  const size = CONFIG.markerSize;
+  const label = CONFIG.showLabels ? `<span class="cabin-label">${feature.properties.id}</span>` : "";
+  return L.marker(latlng, {
+    icon: L.divIcon({
+      className: "",
+      html: markerSvg(style.color, size) + label,
+      iconSize: [size, size],
+      iconAnchor: [size / 2, size / 2],
+    }),
+  }).bindPopup(`Hytte ${feature.properties.id}<br>${style.label}`);
+}
+
+function clusterMarker(feature, latlng) {
+  const p = feature.properties;
+  // Fargen til den største kategorien i klyngen
+  const main = Object.keys(CONFIG.styles).reduce((a, b) => (p[b] || 0) > (p[a] || 0) ? b : a);
+  const size = Math.round(24 + 8 * Math.log10(p.count));
+  const lines = Object.entries(CONFIG.styles)
+    .filter(([state]) => p[state]).map(([state, s]) => `${s.label}: ${p[state]}`);
+  return L.marker(latlng, {
+    icon: L.divIcon({
+      className: "",
+      html: markerSvg(styleFor(main).color, size) + `<span class="cluster-count">${p.count}</span>`,
+      iconSize: [size, size],
+      iconAnchor: [size / 2, size / 2],
+    }),
+  }).bindTooltip(`${p.count} hytter<br>` + lines.join("<br>"))
+    .on("click", () => map.setView(latlng, map.getZoom() + 2));
+}
+
+function show(data) {
+  const cabins = L.geoJSON(data, {pointToLayer: cabinMarker});
+  const zooms = Object.keys(data.clusters || {}).map(Number).sort((a, b) => a - b);
+  if (!data.detailZoom || !zooms.length) {
+    cabins.addTo(map);
+    return;
+  }
+
+  // Ferdige klynger per zoomnivå; enkelthytter først ved detailZoom
+  const layers = {};
+  zooms.forEach(z => {
+    layers[z] = L.geoJSON({type: "FeatureCollection", features: data.clusters[z]},
+                          {pointToLayer: clusterMarker});
+  });
+  let current = null;
+  function update() {
+    const zoom = map.getZoom();
+    let next = cabins;
+    if (zoom < data.detailZoom) {
+      const band = zooms.filter(z => z <= zoom).pop();
+      next = layers[band === undefined ? zooms[0] : band];
+    }
+    if (next !== current) {
+      if (current) map.removeLayer(current);
+      next.addTo(map);
+      current = next;
+    }
+  }
+  map.on("zoomend", update);
+  update();
+}
+
+if (CONFIG.data) {
+  show(CONFIG.data);
+} else {
+  fetch(CONFIG.url).then(r => r.json()).then(show)
+    .catch(e => console.error("Kunne ikke laste kartdata", e));
+}
+
+const legend = L.control({position: "bottomleft"});
+legend.onAdd = () => {
+  const div = L.DomUtil.create("div", "cabin-legend");
+  div.innerHTML = `<strong>${CONFIG.legendTitle}</strong><br>` + Object.values(CONFIG.styles)
+    .map(s => `<span style="color:${s.color}">●</span> ${s.label}`).join("<br>");
+  return div;
+};
+legend.addTo(map);
+</script>
+</body>
+</html>
+"""
+
+
+def render_cabin_map_html(
+    geojson: Optional[Dict] = None,
+    geojson_url: Optional[str] = None,
+    styles: Dict[str, Dict] = BOOKING_STATE_STYLES,
+    legend_title: str = "Tegnforklaring",
+    center=DEFAULT_CENTER,
+    zoom: int = 15,
+    marker_size: int = 20,
+    show_labels: bool = True,
+    tiles=None,
+) -> str:
+    """
+    Lager en selvstendig HTML-side med Leaflet-kartet.
+
+    Oppgi enten geojson (legges inline) eller geojson_url (hentes av
+    nettleseren, og kan caches der så lenge URL-en er den samme).
+    """
+    if geojson is None and geojson_url is None:
+        raise ValueError("Oppgi geojson eller geojson_url")
+
+    config = {
+        "data": geojson,
+        "url": geojson_url,
+        "styles": styles,
+        "legendTitle": legend_title,
+        "center": list(center),
+        "zoom": zoom,
+        "markerSize": marker_size,
+        "showLabels": show_labels,
+        "tiles": tiles if tiles is not None else TILE_LAYERS[:1],
+    }
+    # </ escapes slik at data ikke kan avslutte script-taggen
+    config_json = json.dumps(config, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+    return _TEMPLATE.replace("__CONFIG__", config_json)
+
+
+def display_cabin_map(height: int = 600, **kwargs) -> None:
+    """Viser hyttekartet som en Streamlit-komponent"""
+    try:
+        st.components.v1.html(render_cabin_map_html(**kwargs), height=height)
+    except Exception as e:
+        logger.error(f"Feil ved visning av hyttekart: {str(e)}")
+        st.error("Kunne ikke vise kartet")
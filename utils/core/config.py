@@ -112,7 +112,7 @@ DB_CONFIG = {
         "timeout": DB_TIMEOUT,
         "version": 1,
         "schema": {
-            "tables": ["customer"],
+            "tables": ["customer", "data_version"],
             "required_columns": {
                 "customer": [
                     "customer_id",
@@ -135,7 +135,10 @@ DB_CONFIG = {
         "path": os.path.join(DATABASE_PATH, "tunbroyting.db"),
         "timeout": DB_TIMEOUT,
         "version": 1,
-        "schema": {"tables": ["tunbroyting_bestillinger"]},
+        "schema": {"tables": [
+            "tunbroyting_bestillinger", "data_version", "occupancy_day", "occupancy_open", "booking_requests",
+            "tunbroyting_gjentakelser"
+        ]},
     },
     "feedback": {
         "path": os.path.join(DATABASE_PATH, "feedback.db"),
@@ -148,11 +151,29 @@ DB_CONFIG = {
         "timeout": DB_TIMEOUT,
         "version": "1.9.4",
         "schema": {"tables": ["schema_version", "migrations_history"]}
+    },
+    "gps": {
+        "path": os.path.join(DATABASE_PATH, "gps.db"),
+        "timeout": DB_TIMEOUT,
+        "version": 1,
+        "schema": {"tables": ["cabin_last_pass", "gps_ingest_state", "gps_points", "coverage_raster", "rode_events", "rode_state"]}
     }
 }
 
 # GPS konfigurasjon
 GPS_URL = "https://kart.irute.net/fjellbergsskardet_busses.json?_=1657373465172"
+# Delingssiden til plowman. Kan overstyres (f.eks. mot scripts/gps_replay.py serve)
+PLOWMAN_SHARE_URL = os.getenv(
+    "PLOWMAN_SHARE_URL",
+    "https://plowman-new.xn--snbryting-m8ac.net/nb/share/Y3VzdG9tZXItMTM=",
+)
+# Aktive GPS-kilder (se utils/services/gps_source_utils.py), kommaseparert.
+# irute er bussene, ikke brøytebilene; de holdes uansett utenfor brøytedataene
+GPS_SOURCES = [s.strip() for s in os.getenv("GPS_SOURCES", "plowman").split(",") if s.strip()]
+# Maks avstand (meter) mellom GPS-punkt og hytte for at hytta regnes som passert
+CABIN_PASS_RADIUS_M = 40.0
+# Hvor langt utenfor de ytterste hyttene en rode strekker seg (meter)
+RODE_MARGIN_M = 50.0
 
 # Autentisering og sesjon
 MAX_ATTEMPTS = 5
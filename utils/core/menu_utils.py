@@ -52,6 +52,7 @@ def create_menu(customer_id, user_type):
             logger.info(f"Showing admin menu for {user_type}")
             admin_options = [
                 "Tunkart",
+                "Driftskart",
                 "Varsler",
                 "Feedback Dashboard",
                 "Strøing",
@@ -64,6 +65,7 @@ def create_menu(customer_id, user_type):
 
             admin_icons = [
                 "map",
+                "layers",
                 "bell",
                 "chat-dots",
                 "snow",
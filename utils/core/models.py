@@ -1,6 +1,6 @@
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Optional, List, Dict, Any, Tuple
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple, Iterator
 
 from utils.core.config import format_date, TZ
 
@@ -90,3 +90,46 @@ class ValidationResult:
         if self.warnings is None:
             self.warnings = []
         self.warnings.append(warning)
+
+
+@dataclass
+class Gjentakelse:
+    """Gjentakende tunbrøyting, f.eks. hver fredag fra start_dato til slutt_dato"""
+    id: Optional[int]
+    customer_id: str
+    start_dato: date
+    slutt_dato: Optional[date] = None
+    ukedag: int = 4  # fredag
+    intervall_uker: int = 1
+    abonnement_type: str = "Ukentlig ved bestilling"
+
+    def forekomster(self, start: date, slutt: date) -> Iterator[date]:
+        """Gir datoene regelen slår inn i perioden, uten å lage hele serien"""
+        siste = min(slutt, self.slutt_dato) if self.slutt_dato else slutt
+        steg = 7 * self.intervall_uker
+        dag = self.start_dato + timedelta(days=(self.ukedag - self.start_dato.weekday()) % 7)
+        if dag < start:
+            # Hopp rett til første forekomst i perioden
+            dag += timedelta(days=-(-(start - dag).days // steg) * steg)
+        while dag <= siste:
+            yield dag
+            dag += timedelta(days=steg)
+
+
+@dataclass(frozen=True, slots=True)
+class BrukerBestilling:
+    """Én bestilling i brukerens egen oversikt"""
+    id: int
+    ankomst_dato: date
+    avreise_dato: Optional[date]
+    abonnement_type: str
+
+    @classmethod
+    def fra_rad(cls, rad) -> "BrukerBestilling":
+        """Fra (id, ankomst_dato, avreise_dato, abonnement_type); de ti første tegnene er dagen"""
+        return cls(
+            id=int(rad[0]),
+            ankomst_dato=date.fromisoformat(rad[1][:10]),
+            avreise_dato=date.fromisoformat(rad[2][:10]) if rad[2] else None,
+            abonnement_type=rad[3],
+        )
@@ -7,6 +7,7 @@ import streamlit as st
 from utils.core.config import normalize_datetime, TZ, format_date, get_current_time
 from utils.core.logging_config import get_logger
 from utils.services.gps_utils import get_last_gps_activity
+from utils.services.occupancy_utils import BookingIntervalIndex
 
 logger = get_logger(__name__)
 
@@ -143,41 +144,11 @@ def filter_todays_bookings(bookings: pd.DataFrame) -> pd.DataFrame:
         if bookings.empty:
             return bookings
             
-        today = get_current_time().replace(hour=0, minute=0, second=0, microsecond=0)
-        logger.info(f"Dagens dato (normalisert): {today}")
+        today = get_current_time().date()
+        logger.info(f"Dagens dato: {today}")
         
-        # Konverter datoer til datetime med tidssone
-        bookings['ankomst_dato'] = pd.to_datetime(bookings['ankomst_dato'])
-        if 'avreise_dato' in bookings.columns:
-            bookings['avreise_dato'] = pd.to_datetime(bookings['avreise_dato'])
-            
-        # Konverter til riktig tidssone hvis ikke allerede satt
-        for col in ['ankomst_dato', 'avreise_dato']:
-            if col in bookings.columns:
-                if bookings[col].dt.tz is None:
-                    bookings[col] = bookings[col].dt.tz_localize('Europe/Oslo')
-                else:
-                    bookings[col] = bookings[col].dt.tz_convert('Europe/Oslo')
-        
-        # Filtrer basert på dato og abonnement_type
-        mask = (
-            # Vanlige bestillinger som starter i perioden
-            (
-                (bookings["abonnement_type"] != "Årsabonnement") &
-                (bookings["ankomst_dato"].dt.normalize() == today)
-            ) |
-            # Årsabonnement som er aktive (ankomst passert og ikke utløpt)
-            (
-                (bookings["abonnement_type"] == "Årsabonnement") &
-                (bookings["ankomst_dato"].dt.normalize() <= today) &
-                (
-                    bookings["avreise_dato"].isna() |
-                    (bookings["avreise_dato"].dt.normalize() >= today)
-                )
-            )
-        )
-            
-        return bookings[mask].copy()
+        # Samme definisjon av aktiv som de andre oppslagene, via intervallindeksen
+        return BookingIntervalIndex(bookings).active_on(today)
         
     except Exception as e:
         logger.error(f"Feil i filter_todays_bookings: {str(e)}")
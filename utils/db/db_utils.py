@@ -4,7 +4,7 @@ import time
 from pathlib import Path
 import pandas as pd
 from functools import wraps
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
 from utils.core.config import (
     DATABASE_PATH,
@@ -55,7 +55,8 @@ def create_tables():
             "stroing": "stroing_bestillinger",
             "tunbroyting": "tunbroyting_bestillinger",
             "customer": "customer",
-            "system": "schema_version"
+            "system": "schema_version",
+            "gps": "cabin_last_pass"
         }
         
         for db_name, schema in schemas.items():
@@ -67,7 +68,8 @@ def create_tables():
                     cursor = conn.cursor()
                     
                     logger.info(f"Using schema: {schema}")
-                    cursor.execute(schema)
+                    # Skjemaet kan inneholde flere tabeller
+                    cursor.executescript(schema)
                     
                     table_name = table_mapping.get(db_name)
                     if not table_name:
@@ -288,6 +290,25 @@ def get_current_db_version(db_name: str) -> str:
         logger.error(f"Feil ved henting av databaseversjon for {db_name}: {str(e)}")
         return "0.0.0"  # Returner sikker standardversjon ved feil
 
+def get_data_version(db_name: str, table_name: str) -> Optional[int]:
+    """
+    Henter versjonstelleren triggerne i data_version holder for en tabell.
+
+    Returns:
+        Optional[int]: 0 før første endring, None hvis telleren ikke kan leses
+    """
+    try:
+        with get_db_connection(db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT version FROM data_version WHERE table_name = ?", (table_name,)
+            )
+            row = cursor.fetchone()
+            return row[0] if row else 0
+    except Exception as e:
+        logger.error(f"Feil ved henting av dataversjon for {table_name}: {str(e)}")
+        return None
+
 def get_existing_tables(db_name: str) -> list:
     """Hent liste over eksisterende tabeller i databasen"""
     try:
@@ -397,7 +418,8 @@ def verify_database_schemas() -> bool:
             "stroing": "stroing_bestillinger",
             "tunbroyting": "tunbroyting_bestillinger",
             "customer": "customer",
-            "system": "schema_version"
+            "system": "schema_version",
+            "gps": "cabin_last_pass"
         }
         
         for db_name, schema in schemas.items():
@@ -432,7 +454,8 @@ def close_all_connections():
             "tunbroyting", 
             "customer", 
             "feedback",
-            "system"
+            "system",
+            "gps"
         ]
 
         for db_name in databases:
@@ -605,6 +628,9 @@ def verify_data_persistence():
         with get_db_connection("tunbroyting") as conn:
             cursor = conn.cursor()
             
+            # Rydd bort testrader fra en avbrutt kjøring, ellers stopper den unike indeksen innsettingen
+            cursor.execute("DELETE FROM tunbroyting_bestillinger WHERE customer_id = 'TEST'")
+            
             # Sjekk antall rader før
             cursor.execute("SELECT COUNT(*) FROM tunbroyting_bestillinger")
             count_before = cursor.fetchone()[0]
@@ -4,6 +4,14 @@ from utils.core.logging_config import get_logger
 from utils.db.connection import get_db_connection   
 from utils.db.table_utils import get_existing_tables
 from utils.db.db_utils import get_current_db_version
+from utils.db.schemas import (
+    ANKOMST_DAG,
+    BOOKING_REQUESTS_SCHEMA,
+    OCCUPANCY_SCHEMA,
+    RECURRENCE_SCHEMA,
+    TUNBROYTING_DAY_INDEXES,
+    data_version_schema,
+)
 from utils.core.config import DB_CONFIG
 logger = get_logger(__name__)
 
@@ -227,8 +235,10 @@ def migrate_tunbroyting_table():
                 )
             """)
             
-            # Kopier data med eksplisitt kolonnespesifikasjon
-            cursor.execute("""
+            # Kopier data med eksplisitt kolonnespesifikasjon. Duplikater (samme hytte
+            # og ankomstdag) fjernes, så den unike indeksen kan opprettes; den første
+            # bestillingen beholdes.
+            cursor.execute(f"""
                 INSERT INTO tunbroyting_bestillinger (
                     customer_id, ankomst_dato, avreise_dato, abonnement_type
                 )
@@ -238,7 +248,18 @@ def migrate_tunbroyting_table():
                     avreise_dato,
                     abonnement_type
                 FROM tunbroyting_bestillinger_backup
+                WHERE rowid IN (
+                    SELECT MIN(rowid) FROM tunbroyting_bestillinger_backup
+                    GROUP BY customer_id, {ANKOMST_DAG}
+                )
+                ORDER BY rowid
             """)
+            fjernet = cursor.execute(
+                "SELECT (SELECT COUNT(*) FROM tunbroyting_bestillinger_backup)"
+                " - (SELECT COUNT(*) FROM tunbroyting_bestillinger)"
+            ).fetchone()[0]
+            if fjernet:
+                logger.warning(f"Fjernet {fjernet} dupliserte tunbestillinger")
             
             # Opprett indekser før commit
             cursor.execute("""
@@ -250,6 +271,16 @@ def migrate_tunbroyting_table():
                 ON tunbroyting_bestillinger(ankomst_dato, avreise_dato)
             """)
             
+            cursor.executescript(
+                TUNBROYTING_DAY_INDEXES + OCCUPANCY_SCHEMA + BOOKING_REQUESTS_SCHEMA + RECURRENCE_SCHEMA
+            )
+            cursor.execute(
+                "DELETE FROM booking_requests WHERE created_at < datetime('now', '-30 days')"
+            )
+            
+            # Triggerne forsvinner med tabellen og må opprettes på nytt
+            cursor.executescript(data_version_schema("tunbroyting_bestillinger"))
+            
             conn.commit()
             return True
             
@@ -423,6 +454,7 @@ def migrate_customer_table():
             # Opprett indekser
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_customer_id ON customer(customer_id)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_subscription ON customer(subscription)")
+            cursor.executescript(data_version_schema("customer"))
             
             # Fjern backup
             cursor.execute("DROP TABLE IF EXISTS customer_backup")
@@ -3,6 +3,93 @@ from utils.core.logging_config import get_logger
 logger = get_logger(__name__)
 
 
+def data_version_schema(table: str) -> str:
+    """
+    Versjonsteller for en tabell, oppdatert av triggere ved hver endring.
+
+    Brukes som cachenøkkel: så lenge versjonen er uendret, er innholdet det også.
+    """
+    triggers = "".join(
+        f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+            AFTER {event} ON {table}
+            BEGIN
+                INSERT INTO data_version (table_name, version) VALUES ('{table}', 1)
+                ON CONFLICT(table_name) DO UPDATE SET version = version + 1;
+            END;"""
+        for event in ("INSERT", "UPDATE", "DELETE")
+    )
+    return f"""
+            CREATE TABLE IF NOT EXISTS data_version (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            );{triggers}
+    """
+
+
+# Lokal kalenderdag for datoene i tunbroyting_bestillinger. Datoene lagres som
+# "YYYY-MM-DD" eller isoformat i norsk tid, så de ti første tegnene er dagen.
+ANKOMST_DAG = "substr(ankomst_dato, 1, 10)"
+AVREISE_DAG = "substr(avreise_dato, 1, 10)"
+
+# Indekser på dagsuttrykkene, så datofiltrene i spørringene kan bruke dem.
+# Den unike indeksen tillater én bestilling per hytte og ankomstdag.
+TUNBROYTING_DAY_INDEXES = f"""
+            CREATE INDEX IF NOT EXISTS idx_tunbroyting_ankomst_dag
+            ON tunbroyting_bestillinger({ANKOMST_DAG});
+            CREATE INDEX IF NOT EXISTS idx_tunbroyting_type_ankomst_dag
+            ON tunbroyting_bestillinger(abonnement_type, {ANKOMST_DAG}, {AVREISE_DAG});
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_tunbroyting_kunde_ankomst_dag
+            ON tunbroyting_bestillinger(customer_id, {ANKOMST_DAG});
+"""
+
+# Idempotensnøkler fra bestillingsskjemaet. En innsending som sendes på nytt
+# med samme nøkkel gir ikke en ny bestilling.
+BOOKING_REQUESTS_SCHEMA = """
+            CREATE TABLE IF NOT EXISTS booking_requests (
+                token TEXT PRIMARY KEY,
+                customer_id TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+"""
+
+# Gjentakende bestillinger, f.eks. hver fredag mellom to datoer. Regelen lagres
+# én gang og utvides til konkrete datoer bare for perioden som spørres etter.
+RECURRENCE_SCHEMA = """
+            CREATE TABLE IF NOT EXISTS tunbroyting_gjentakelser (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                customer_id TEXT NOT NULL,
+                start_dato TEXT NOT NULL,
+                slutt_dato TEXT,
+                ukedag INTEGER NOT NULL DEFAULT 4,
+                intervall_uker INTEGER NOT NULL DEFAULT 1,
+                abonnement_type TEXT NOT NULL DEFAULT 'Ukentlig ved bestilling',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_gjentakelser_periode
+            ON tunbroyting_gjentakelser(start_dato, slutt_dato);
+""" + data_version_schema("tunbroyting_gjentakelser")
+
+# Materialisert belegg per dag og rode, oppdatert i samme transaksjon som
+# bestillingene. Årsabonnement uten avreise har ingen siste dag og telles i
+# occupancy_open fra startdagen.
+OCCUPANCY_SCHEMA = """
+            CREATE TABLE IF NOT EXISTS occupancy_day (
+                date TEXT NOT NULL,
+                rode TEXT NOT NULL,
+                annual_count INTEGER NOT NULL DEFAULT 0,
+                weekly_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (date, rode)
+            );
+            CREATE TABLE IF NOT EXISTS occupancy_open (
+                start_date TEXT NOT NULL,
+                rode TEXT NOT NULL,
+                annual_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (start_date, rode)
+            );
+"""
+
+
 def get_database_schemas():
     """Returner databaseskjemaer for alle tabeller"""
     logger.info("Getting database schemas")
@@ -49,8 +136,9 @@ def get_database_schemas():
                 ankomst_dato TEXT NOT NULL,
                 avreise_dato TEXT,
                 abonnement_type TEXT NOT NULL
-            )
-        """,
+            );
+        """ + TUNBROYTING_DAY_INDEXES + OCCUPANCY_SCHEMA + BOOKING_REQUESTS_SCHEMA
+          + RECURRENCE_SCHEMA + data_version_schema("tunbroyting_bestillinger"),
         "customer": """
             CREATE TABLE IF NOT EXISTS customer (
                 customer_id TEXT PRIMARY KEY,
@@ -60,14 +148,56 @@ def get_database_schemas():
                 type TEXT DEFAULT 'Customer',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """,
+            );
+        """ + data_version_schema("customer"),
         "system": """
             CREATE TABLE IF NOT EXISTS schema_version (
                 version TEXT PRIMARY KEY,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 environment TEXT
             )
+        """,
+        "gps": """
+            CREATE TABLE IF NOT EXISTS cabin_last_pass (
+                cabin_id TEXT PRIMARY KEY,
+                ts TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS gps_ingest_state (
+                name TEXT PRIMARY KEY,
+                last_ts TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS gps_points (
+                ts TEXT NOT NULL,
+                bilnr TEXT NOT NULL,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                UNIQUE (bilnr, ts, lat, lon)
+            );
+            CREATE INDEX IF NOT EXISTS idx_gps_points_ts ON gps_points(ts);
+            CREATE TABLE IF NOT EXISTS coverage_raster (
+                bilnr TEXT NOT NULL,
+                start_ts TEXT NOT NULL,
+                end_ts TEXT NOT NULL,
+                cells BLOB NOT NULL,
+                counts BLOB NOT NULL,
+                PRIMARY KEY (bilnr, start_ts)
+            );
+            CREATE INDEX IF NOT EXISTS idx_coverage_raster_start ON coverage_raster(start_ts);
+            CREATE TABLE IF NOT EXISTS rode_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                rode TEXT NOT NULL,
+                bilnr TEXT NOT NULL,
+                event TEXT NOT NULL CHECK (event IN ('enter', 'exit')),
+                ts TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_rode_events_rode_ts ON rode_events(rode, ts);
+            CREATE INDEX IF NOT EXISTS idx_rode_events_ts ON rode_events(ts);
+            CREATE TABLE IF NOT EXISTS rode_state (
+                bilnr TEXT NOT NULL,
+                rode TEXT NOT NULL,
+                inside INTEGER NOT NULL,
+                PRIMARY KEY (bilnr, rode)
+            )
         """
     }
     logger.debug(f"Available schemas: {list(schemas.keys())}")
@@ -10,7 +10,7 @@ from utils.core.config import TZ, get_current_time, safe_to_datetime, format_dat
 from utils.core.logging_config import get_logger
 from utils.services.alert_utils import get_alerts, handle_alerts_ui
 from utils.services.feedback_utils import get_feedback
-from utils.services.tun_utils import get_bookings
+from utils.services.tun_utils import get_bookings, get_tun_statistics
 from utils.core.auth_utils import get_login_history
 from utils.services.stroing_utils import (
     get_stroing_bestillinger,
@@ -221,6 +221,27 @@ def unified_report_page(include_hidden=False):
         fig_admin_line.update_yaxes(title_text="Antall admin-varsler")
         st.plotly_chart(fig_admin_line, use_container_width=True)
 
+    if "Tunbrøyting" in data_types and not tunbroyting_data.empty:
+        st.subheader("Tunbrøyting Oversikt")
+        tun_statistikk = get_tun_statistics(start_date, end_date)
+        fig_tun_line = px.line(
+            tun_statistikk.daglig,
+            y=["ankomster", "avreiser", "aktive"],
+            title="Tunbestillinger per dag",
+        )
+        fig_tun_line.update_xaxes(title_text="Dato")
+        fig_tun_line.update_yaxes(title_text="Antall bestillinger")
+        st.plotly_chart(fig_tun_line, use_container_width=True)
+
+        if not tun_statistikk.per_rode.empty:
+            fig_tun_rode = px.bar(
+                x=tun_statistikk.per_rode.columns,
+                y=tun_statistikk.per_rode.to_numpy().max(axis=0),
+                title="Høyeste antall aktive tunbestillinger per rode",
+                labels={"x": "Rode", "y": "Antall"},
+            )
+            st.plotly_chart(fig_tun_rode, use_container_width=True)
+
     if "Bruker-feedback" in data_types and not feedback_data.empty:
         st.subheader("Brukerfeedback Oversikt")
         user_type_counts = feedback_data["type"].value_counts()
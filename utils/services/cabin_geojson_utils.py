@@ -0,0 +1,147 @@
+# cabin_geojson_utils.py
+# Hyttenes bestillingstilstand (annual, weekly, inactive) som en kompakt
+# GeoJSON FeatureCollection. Filen skrives én gang per dato og dataversjon til
+# static/map_state/ og serveres av Streamlit som statisk fil, så nettleseren
+# kan tegne kartet selv (utils/components/ui/cabin_map.py) og cache svaret.
+#
+# static/ serveres uten innlogging, så filnavnet er en HMAC over dato og
+# versjoner med en hemmelig nøkkel per prosess; navnet kan ikke gjettes.
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from utils.core.logging_config import get_logger
+from utils.db.db_utils import get_data_version
+from utils.services.map_interface import (
+    CLUSTER_CATEGORIES,
+    CLUSTER_ZOOMS,
+    build_booking_markers,
+    cluster_markers,
+    get_detail_zoom,
+)
+
+logger = get_logger(__name__)
+
+STATIC_DIR = Path(__file__).resolve().parents[2] / "static"
+MAP_STATE_DIR = STATIC_DIR / "map_state"
+# Relativ URL; Streamlit serverer static/ under app/static når
+# server.enableStaticServing er på
+MAP_STATE_URL = "app/static/map_state"
+KEEP_STATE_FILES = 10
+# Ny nøkkel ved hver oppstart; filer fra tidligere prosesser slettes ved første skriving
+_STATE_FILE_KEY = secrets.token_bytes(32)
+_PROCESS_STARTED = time.time()
+# Statisk oversiktskart fra scripts/generate_plowing_map.py
+PLOWING_MAP_FILE = STATIC_DIR / "plowing_map.html"
+
+
+def build_cabin_state_geojson(bookings: pd.DataFrame) -> Dict:
+    """
+    Lager en FeatureCollection med ett punkt per hytte.
+
+    Hver feature har bare id og state; farger og tekster legges på i
+    nettleseren. Ved mange hytter får samlingen også ferdige klynger per
+    zoomnivå ("clusters") og "detailZoom", zoomnivået der klienten bytter
+    til enkeltmarkører.
+    """
+    markers = build_booking_markers(bookings, include_idle_cabins=True)
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {"id": cabin_id, "state": state},
+        }
+        for cabin_id, lat, lon, state in zip(
+            markers["customer_id"].tolist(),
+            markers["lat"].astype(float).round(5).tolist(),
+            markers["lon"].astype(float).round(5).tolist(),
+            markers["category"].tolist(),
+        )
+    ]
+    geojson = {"type": "FeatureCollection", "features": features}
+
+    detail_zoom = get_detail_zoom(len(markers))
+    if detail_zoom:
+        geojson["detailZoom"] = detail_zoom
+        geojson["clusters"] = {
+            str(zoom): _cluster_features(cluster_markers(markers, zoom)) for zoom in CLUSTER_ZOOMS
+        }
+    return geojson
+
+
+def _cluster_features(clusters: pd.DataFrame) -> List[Dict]:
+    counts = clusters[["count", *CLUSTER_CATEGORIES]].astype(int)
+    return [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": dict(zip(counts.columns, row)),
+        }
+        for lat, lon, row in zip(
+            clusters["lat"].round(5).tolist(),
+            clusters["lon"].round(5).tolist(),
+            counts.itertuples(index=False, name=None),
+        )
+    ]
+
+
+def _state_file_name(*parts) -> str:
+    token = hmac.new(
+        _STATE_FILE_KEY, "|".join(map(str, parts)).encode("utf-8"), hashlib.sha256
+    ).hexdigest()[:32]
+    return f"cabin_state_{token}.geojson"
+
+
+def _prune_state_files(keep: int = KEEP_STATE_FILES) -> None:
+    files = sorted(MAP_STATE_DIR.glob("cabin_state_*.geojson"), key=lambda p: p.stat().st_mtime)
+    # Filer fra tidligere prosesser kan ikke lenger refereres
+    stale = [p for p in files if p.stat().st_mtime < _PROCESS_STARTED]
+    current = [p for p in files if p.stat().st_mtime >= _PROCESS_STARTED]
+    for path in stale + current[:-keep]:
+        path.unlink(missing_ok=True)
+
+
+def get_cabin_state_url(dato, get_bookings_for_day: Callable[[], pd.DataFrame]) -> Optional[str]:
+    """
+    URL til GeoJSON-filen for en dato, skrevet første gang den trengs.
+
+    Filnavnet er en HMAC over dato og versjonene for bestillinger, gjentakelser
+    og kunder, så en ny fil lages bare når dataene er endret, og navnet kan
+    ikke gjettes. get_bookings_for_day kalles bare da.
+
+    Returns:
+        Optional[str]: Relativ URL, eller None hvis filen ikke kan lages
+    """
+    try:
+        bookings_version = get_data_version("tunbroyting", "tunbroyting_bestillinger")
+        rules_version = get_data_version("tunbroyting", "tunbroyting_gjentakelser")
+        customer_version = get_data_version("customer", "customer")
+        if bookings_version is None or rules_version is None or customer_version is None:
+            return None
+
+        filename = _state_file_name(dato, bookings_version, rules_version, customer_version)
+        path = MAP_STATE_DIR / filename
+        if not path.exists():
+            MAP_STATE_DIR.mkdir(parents=True, exist_ok=True)
+            geojson = build_cabin_state_geojson(get_bookings_for_day())
+            # Skriv til midlertidig fil først, så ingen leser en halvferdig fil
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(
+                json.dumps(geojson, ensure_ascii=False, separators=(",", ":")), encoding="utf-8"
+            )
+            os.replace(tmp_path, path)
+            _prune_state_files()
+            logger.info(f"Skrev kartdata for {dato} ({path.stat().st_size} bytes)")
+
+        return f"{MAP_STATE_URL}/{filename}"
+
+    except Exception as e:
+        logger.error(f"Feil ved generering av kartdata: {str(e)}")
+        return None
@@ -0,0 +1,256 @@
+# cabin_pass_utils.py
+# Holder styr på når brøytebilen sist passerte hver enkelt hytte.
+# GPS-punktene slås opp i et uniformt rutenett over hyttekoordinatene, slik at
+# hver ny batch bare sammenlignes med hyttene i nærheten av punktet.
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.core.config import TZ, CABIN_PASS_RADIUS_M
+from utils.core.logging_config import get_logger
+from utils.db.connection import get_db_connection
+from utils.db.db_utils import get_data_version
+from utils.services.customer_utils import get_cabin_coordinates, get_rode
+from utils.services.gps_utils import GpsSnapshot, get_gps_snapshot
+
+logger = get_logger(__name__)
+
+EARTH_RADIUS_M = 6_371_000.0
+INGEST_NAME = "cabin_last_pass"
+
+# Cellenøkler pakkes i én int64: (cx + OFFSET) * SPAN + (cy + OFFSET)
+_KEY_OFFSET = 1 << 20
+_KEY_SPAN = 1 << 21
+
+
+class CabinGrid:
+    """Uniformt rutenett over hyttekoordinater for raske nabooppslag"""
+
+    def __init__(self, cabin_ids, lat, lon, cell_size_m: float = CABIN_PASS_RADIUS_M):
+        self.cabin_ids = np.asarray(cabin_ids, dtype=object)
+        self.cell_size_m = float(cell_size_m)
+
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        self.ref_lat = float(lat.mean()) if len(lat) else 0.0
+        self.ref_lon = float(lon.mean()) if len(lon) else 0.0
+
+        self.x, self.y = self._project(lat, lon)
+        keys = self._key(*self._cell(self.x, self.y))
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+
+    def __len__(self) -> int:
+        return len(self.cabin_ids)
+
+    def _project(self, lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+        """Projiserer til lokale meter rundt midtpunktet (ekvirektangulært)"""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        x = np.radians(lon - self.ref_lon) * EARTH_RADIUS_M * np.cos(np.radians(self.ref_lat))
+        y = np.radians(lat - self.ref_lat) * EARTH_RADIUS_M
+        return x, y
+
+    def _cell(self, x, y) -> Tuple[np.ndarray, np.ndarray]:
+        return (
+            np.floor(x / self.cell_size_m).astype(np.int64),
+            np.floor(y / self.cell_size_m).astype(np.int64),
+        )
+
+    @staticmethod
+    def _key(cx, cy) -> np.ndarray:
+        return (cx + _KEY_OFFSET) * _KEY_SPAN + (cy + _KEY_OFFSET)
+
+    def query_pairs(self, lat, lon, radius_m: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finner alle (punkt, hytte)-par som ligger innenfor radius_m av hverandre.
+
+        Bare de ni cellene rundt hvert punkt undersøkes, så kostnaden er
+        O(punkter × hytter i nærheten).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (punktindekser, hytteindekser)
+        """
+        radius_m = self.cell_size_m if radius_m is None else float(radius_m)
+        if radius_m > self.cell_size_m:
+            raise ValueError("Radius kan ikke være større enn cellestørrelsen")
+
+        px, py = self._project(lat, lon)
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        if len(px) == 0 or len(self) == 0:
+            return empty
+
+        pcx, pcy = self._cell(px, py)
+        point_parts, cabin_parts = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = self._key(pcx + dx, pcy + dy)
+                lo = np.searchsorted(self._sorted_keys, keys, side="left")
+                hi = np.searchsorted(self._sorted_keys, keys, side="right")
+                counts = hi - lo
+                total = int(counts.sum())
+                if total == 0:
+                    continue
+                # Utvid hvert punkt til alle hyttene i nabocellen
+                starts = np.repeat(lo, counts)
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                point_parts.append(np.repeat(np.arange(len(px)), counts))
+                cabin_parts.append(self._order[starts + offsets])
+
+        if not point_parts:
+            return empty
+
+        p_idx = np.concatenate(point_parts)
+        c_idx = np.concatenate(cabin_parts)
+        dist2 = (px[p_idx] - self.x[c_idx]) ** 2 + (py[p_idx] - self.y[c_idx]) ** 2
+        within = dist2 <= radius_m ** 2
+        return p_idx[within], c_idx[within]
+
+
+def build_cabin_grid() -> CabinGrid:
+    """
+    Bygger rutenettet over alle hytter med kjente koordinater.
+
+    Bare hytter som hører til en rode tas med, så admin-brukere med
+    plassholderkoordinater (0, 0) ikke flytter referansepunktet for projeksjonen.
+    """
+    coordinates = get_cabin_coordinates()
+    cabin_ids = [c for c in coordinates if get_rode(c) is not None]
+    lat = [coordinates[c][0] for c in cabin_ids]
+    lon = [coordinates[c][1] for c in cabin_ids]
+    logger.info(f"Bygget hytte-rutenett med {len(cabin_ids)} hytter")
+    return CabinGrid(cabin_ids, lat, lon)
+
+
+@st.cache_data(ttl=3600)
+def _cached_cabin_grid(customer_version: int) -> CabinGrid:
+    return build_cabin_grid()
+
+
+def get_cabin_grid() -> CabinGrid:
+    """Rutenettet over hyttene, cachet per versjon av customer-tabellen"""
+    customer_version = get_data_version("customer", "customer")
+    if customer_version is None:
+        return build_cabin_grid()
+    return _cached_cabin_grid(customer_version)
+
+
+def _get_watermark(cursor) -> Optional[pd.Timestamp]:
+    cursor.execute("SELECT last_ts FROM gps_ingest_state WHERE name = ?", (INGEST_NAME,))
+    row = cursor.fetchone()
+    return pd.Timestamp(row[0]) if row else None
+
+
+def update_cabin_last_pass(lat, lon, ts, grid: Optional[CabinGrid] = None) -> int:
+    """
+    Oppdaterer cabin_last_pass med en ny batch GPS-punkter.
+
+    Punkter som er eldre enn forrige batch hoppes over, og bare hyttene som
+    faktisk ble passert skrives til databasen.
+
+    Args:
+        lat, lon: Koordinater for GPS-punktene
+        ts: Tidspunkt (UTC) for hvert punkt
+        grid: Ferdig bygget rutenett, hentes fra cache hvis None
+
+    Returns:
+        int: Antall hytter som ble oppdatert
+    """
+    try:
+        grid = grid if grid is not None else get_cabin_grid()
+        ts = pd.DatetimeIndex(pd.to_datetime(ts, utc=True))
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+
+        with get_db_connection("gps") as conn:
+            cursor = conn.cursor()
+
+            watermark = _get_watermark(cursor)
+            if watermark is not None:
+                is_new = np.asarray(ts > watermark)
+                lat, lon, ts = lat[is_new], lon[is_new], ts[is_new]
+            if len(ts) == 0:
+                return 0
+
+            p_idx, c_idx = grid.query_pairs(lat, lon)
+            passes = (
+                pd.DataFrame({"cabin_id": grid.cabin_ids[c_idx], "ts": ts[p_idx]})
+                .groupby("cabin_id")["ts"]
+                .max()
+            )
+
+            cursor.execute("BEGIN")
+            cursor.executemany(
+                """
+                INSERT INTO cabin_last_pass (cabin_id, ts) VALUES (?, ?)
+                ON CONFLICT(cabin_id) DO UPDATE SET ts = excluded.ts
+                WHERE excluded.ts > cabin_last_pass.ts
+                """,
+                [(str(cabin_id), t.isoformat()) for cabin_id, t in passes.items()],
+            )
+            cursor.execute(
+                """
+                INSERT INTO gps_ingest_state (name, last_ts) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET last_ts = excluded.last_ts
+                """,
+                (INGEST_NAME, ts.max().isoformat()),
+            )
+            cursor.execute("COMMIT")
+
+        logger.info(f"Oppdaterte siste passering for {len(passes)} hytter fra {len(ts)} nye punkter")
+        return len(passes)
+
+    except Exception as e:
+        logger.error(f"Feil ved oppdatering av hyttepasseringer: {str(e)}", exc_info=True)
+        return 0
+
+
+def oppdater_hyttepasseringer(snapshot: Optional[GpsSnapshot] = None) -> int:
+    """Oppdaterer passeringstabellen fra siste GPS-data"""
+    snapshot = snapshot if snapshot is not None else get_gps_snapshot()
+    has_coords = ~np.isnan(snapshot.lat)
+    if not has_coords.any():
+        return 0
+    return update_cabin_last_pass(
+        snapshot.lat[has_coords], snapshot.lon[has_coords], snapshot.timestamps[has_coords]
+    )
+
+
+def get_cabin_last_pass(cabin_id: str) -> Optional[pd.Timestamp]:
+    """Henter siste passering for én hytte (ett oppslag på primærnøkkel)"""
+    try:
+        with get_db_connection("gps") as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT ts FROM cabin_last_pass WHERE cabin_id = ?", (str(cabin_id),)
+            )
+            row = cursor.fetchone()
+        return pd.Timestamp(row[0]).tz_convert(TZ) if row else None
+    except Exception as e:
+        logger.error(f"Feil ved henting av siste passering for hytte {cabin_id}: {str(e)}")
+        return None
+
+
+def vis_siste_passering(cabin_id: str):
+    """Viser når brøytebilen sist passerte brukerens hytte"""
+    try:
+        # Passeringene skrives av gps_ingest_utils.innles_gps_data; her leses de bare
+        last_pass = get_cabin_last_pass(cabin_id)
+        if last_pass is None:
+            tekst = "<span style='color: #6b7280;'>Ingen registrert passering</span>"
+        else:
+            tekst = last_pass.strftime('%d.%m.%Y kl. %H:%M')
+
+        st.markdown(
+            f"""
+            <div style='padding: 10px; background-color: #f0f2f6; border-radius: 10px; margin: 10px 0;'>
+                <h3 style='margin: 0; color: #1f2937;'>🏠 Sist brøytet forbi hytte {cabin_id}:</h3>
+                <p style='margin: 5px 0; color: #374151;'>{tekst}</p>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+    except Exception as e:
+        logger.error(f"Feil ved visning av siste passering: {str(e)}")
@@ -0,0 +1,219 @@
+# coverage_utils.py
+# Brøytedekning som raster: GPS-punktene telles opp i et fast rutenett over
+# hyttegrenda. Hver økt rastres én gang og lagres glissent (cellenr + antall)
+# i gps.db, slik at en dekningsvisning bare summerer ferdige arrays.
+import io
+import math
+from datetime import date, datetime, time, timedelta
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.core.config import TZ
+from utils.core.logging_config import get_logger
+from utils.db.connection import get_db_connection
+from utils.services.gps_track_utils import hent_gps_punkter, split_sessions
+
+logger = get_logger(__name__)
+
+# Rutenett rundt hyttegrenda
+GRID_CENTER = (59.391, 6.428)
+GRID_CELL_M = 10.0
+GRID_HALF_EXTENT_M = 2_000.0
+GRID_SIZE = int(2 * GRID_HALF_EXTENT_M / GRID_CELL_M)  # celler per side
+
+# Hvor langt tilbake første rastring etter innlesing starter
+DEKNING_STARTVINDU_DAGER = 7
+
+_M_PER_DEG_LAT = 111_320.0
+_M_PER_DEG_LON = _M_PER_DEG_LAT * math.cos(math.radians(GRID_CENTER[0]))
+
+
+def cell_index(lat, lon) -> np.ndarray:
+    """Cellenummer (rad * GRID_SIZE + kolonne) for hvert punkt, -1 utenfor rutenettet"""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    row = np.floor(((lat - GRID_CENTER[0]) * _M_PER_DEG_LAT + GRID_HALF_EXTENT_M) / GRID_CELL_M)
+    col = np.floor(((lon - GRID_CENTER[1]) * _M_PER_DEG_LON + GRID_HALF_EXTENT_M) / GRID_CELL_M)
+    inside = (row >= 0) & (row < GRID_SIZE) & (col >= 0) & (col < GRID_SIZE)
+    return np.where(inside, row * GRID_SIZE + col, -1).astype(np.int64)
+
+
+def cell_centers(cells) -> Tuple[np.ndarray, np.ndarray]:
+    """Senterkoordinater (lat, lon) for cellenumre"""
+    cells = np.asarray(cells, dtype=np.int64)
+    row, col = np.divmod(cells, GRID_SIZE)
+    lat = GRID_CENTER[0] + ((row + 0.5) * GRID_CELL_M - GRID_HALF_EXTENT_M) / _M_PER_DEG_LAT
+    lon = GRID_CENTER[1] + ((col + 0.5) * GRID_CELL_M - GRID_HALF_EXTENT_M) / _M_PER_DEG_LON
+    return lat, lon
+
+
+def rasterize(lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+    """Teller punkter per celle; returnerer glissen (celler, antall)"""
+    cells = cell_index(lat, lon)
+    cells, counts = np.unique(cells[cells >= 0], return_counts=True)
+    return cells.astype(np.uint32), counts.astype(np.uint32)
+
+
+def _merge(cells_a, counts_a, cells_b, counts_b) -> Tuple[np.ndarray, np.ndarray]:
+    cells = np.concatenate([cells_a, cells_b])
+    counts = np.concatenate([counts_a, counts_b])
+    merged, inverse = np.unique(cells, return_inverse=True)
+    return merged.astype(np.uint32), np.bincount(inverse, weights=counts).astype(np.uint32)
+
+
+def _to_blob(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _from_blob(blob: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(blob), allow_pickle=False)
+
+
+def oppdater_dekning(start: datetime, end: datetime) -> int:
+    """
+    Rastrer nye GPS-punkter for alle økter i tidsrommet.
+
+    Ferdig rastrede økter hoppes over; økter som har vokst siden sist får
+    bare de nye punktene lagt til.
+
+    Returns:
+        int: Antall økter som ble oppdatert
+    """
+    return _rastrer_okter(hent_gps_punkter(start, end))
+
+
+def _rastrer_okter(points: pd.DataFrame) -> int:
+    """Deler punktene (sortert på bilnr, ts) i økter og lagrer rasteret per økt"""
+    try:
+        sessions = split_sessions(points)
+        if sessions.empty:
+            return 0
+
+        updated = 0
+        with get_db_connection("gps") as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            for session in sessions.itertuples(index=False):
+                start_iso = session.start.isoformat()
+                cursor.execute(
+                    "SELECT end_ts, cells, counts FROM coverage_raster WHERE bilnr = ? AND start_ts = ?",
+                    (session.bilnr, start_iso),
+                )
+                row = cursor.fetchone()
+                if row and pd.Timestamp(row["end_ts"]) >= session.end:
+                    continue
+
+                in_session = (
+                    (points["bilnr"] == session.bilnr)
+                    & (points["ts"] >= session.start)
+                    & (points["ts"] <= session.end)
+                )
+                if row:
+                    in_session &= points["ts"] > pd.Timestamp(row["end_ts"])
+                cells, counts = rasterize(points.loc[in_session, "lat"], points.loc[in_session, "lon"])
+                if row:
+                    cells, counts = _merge(
+                        _from_blob(row["cells"]), _from_blob(row["counts"]), cells, counts
+                    )
+
+                cursor.execute(
+                    """
+                    INSERT INTO coverage_raster (bilnr, start_ts, end_ts, cells, counts)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(bilnr, start_ts) DO UPDATE SET
+                        end_ts = excluded.end_ts,
+                        cells = excluded.cells,
+                        counts = excluded.counts
+                    """,
+                    (session.bilnr, start_iso, session.end.isoformat(),
+                     _to_blob(cells), _to_blob(counts)),
+                )
+                updated += 1
+            cursor.execute("COMMIT")
+
+        if updated:
+            logger.info(f"Oppdaterte dekningsraster for {updated} økter")
+        return updated
+
+    except Exception as e:
+        logger.error(f"Feil ved oppdatering av dekningsraster: {str(e)}", exc_info=True)
+        return 0
+
+
+def oppdater_dekning_etter_innlesing() -> int:
+    """
+    Rastrer punktene fra siste GPS-innlesing; kalles etter lagre_gps_punkter.
+
+    Hver bil starter ved sin egen siste lagrede økt, så en pågående økt rastres
+    fra sin egen start og aldri deles i to, uansett hva de andre bilene gjør.
+    Biler uten lagrede økter tas fra de siste DEKNING_STARTVINDU_DAGER.
+    """
+    try:
+        end = pd.Timestamp.now(tz="UTC") + pd.Timedelta(minutes=1)
+        cutoff = end - pd.Timedelta(days=DEKNING_STARTVINDU_DAGER)
+        with get_db_connection("gps") as conn:
+            restart = {
+                bilnr: pd.Timestamp(start_ts)
+                for bilnr, start_ts in conn.execute(
+                    "SELECT bilnr, MAX(start_ts) FROM coverage_raster GROUP BY bilnr"
+                ).fetchall()
+            }
+            for (bilnr,) in conn.execute(
+                "SELECT DISTINCT bilnr FROM gps_points WHERE ts >= ?", (cutoff.isoformat(),)
+            ).fetchall():
+                restart.setdefault(bilnr, cutoff)
+        if not restart:
+            return 0
+
+        start = min(restart.values())
+        points = hent_gps_punkter(start.to_pydatetime(), end.to_pydatetime())
+        # Punkter før bilens egen omstart hører til økter som allerede er lagret
+        own_start = points["bilnr"].map(restart)
+        points = points[own_start.isna() | (points["ts"] >= own_start)].reset_index(drop=True)
+        return _rastrer_okter(points)
+    except Exception as e:
+        logger.error(f"Feil ved oppdatering av dekning etter innlesing: {str(e)}")
+        return 0
+
+
+@st.cache_data(ttl=300)
+def get_dekning(fra_dato: date, til_dato: date) -> pd.DataFrame:
+    """
+    Samlet brøytedekning for økter som startet i datoperioden (Oslo-tid).
+
+    Leser bare ferdige raster; de skrives av oppdater_dekning_etter_innlesing.
+
+    Returns:
+        pd.DataFrame: Én rad per dekket celle med lat, lon og antall punkter
+    """
+    start = datetime.combine(fra_dato, time.min, tzinfo=TZ)
+    end = datetime.combine(til_dato + timedelta(days=1), time.min, tzinfo=TZ)
+
+    try:
+        with get_db_connection("gps") as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT cells, counts FROM coverage_raster WHERE start_ts >= ? AND start_ts < ?",
+                (pd.Timestamp(start).tz_convert("UTC").isoformat(),
+                 pd.Timestamp(end).tz_convert("UTC").isoformat()),
+            )
+            rows = cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Feil ved henting av dekningsraster: {str(e)}")
+        rows = []
+
+    if not rows:
+        return pd.DataFrame(columns=["lat", "lon", "count"])
+
+    grid = np.zeros(GRID_SIZE * GRID_SIZE, dtype=np.uint32)
+    for row in rows:
+        np.add.at(grid, _from_blob(row["cells"]).astype(np.int64), _from_blob(row["counts"]))
+
+    cells = np.flatnonzero(grid)
+    lat, lon = cell_centers(cells)
+    return pd.DataFrame({"lat": lat, "lon": lon, "count": grid[cells]})
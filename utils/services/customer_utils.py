@@ -8,7 +8,7 @@ from utils.core.config import (
     TZ
 )
 from utils.core.logging_config import get_logger
-from utils.db.db_utils import get_db_connection
+from utils.db.db_utils import get_data_version, get_db_connection
 from utils.db.data_import import import_customers_from_csv
 
 logger = get_logger(__name__)
@@ -100,9 +100,9 @@ def insert_customer(
 
             cursor.execute(query, params)
             conn.commit()
-            
-            logger.info(f"{'Oppdaterte' if existing else 'La til'} kunde {customer_id}")
-            return True
+
+        logger.info(f"{'Oppdaterte' if existing else 'La til'} kunde {customer_id}")
+        return True
 
     except Exception as e:
         logger.error(f"Feil ved {'oppdatering' if existing else 'innsetting'} av kunde: {str(e)}")
@@ -137,6 +137,31 @@ def get_cabin_coordinates() -> Dict[str, Tuple[float, float]]:
         return {}
 
 
+def _build_cabin_coordinates_df() -> pd.DataFrame:
+    coordinates = get_cabin_coordinates()
+    df = pd.DataFrame.from_dict(coordinates, orient="index", columns=["lat", "lon"])
+    df.index.name = "customer_id"
+    return df
+
+
+@st.cache_data(ttl=3600)
+def _cached_cabin_coordinates_df(customer_version: int) -> pd.DataFrame:
+    return _build_cabin_coordinates_df()
+
+
+def get_cabin_coordinates_df() -> pd.DataFrame:
+    """
+    Hyttekoordinater som DataFrame med customer_id som indeks (lat, lon).
+
+    Cachet per versjon av customer-tabellen, så også import via data_import
+    (INSERT OR REPLACE) gir nye koordinater.
+    """
+    customer_version = get_data_version("customer", "customer")
+    if customer_version is None:
+        return _build_cabin_coordinates_df()
+    return _cached_cabin_coordinates_df(customer_version)
+
+
 def load_customer_database():
     """
     Laster kundedata fra databasen
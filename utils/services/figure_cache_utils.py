@@ -0,0 +1,119 @@
+# figure_cache_utils.py
+# Prosessvid cache for ferdige Plotly-figurer. Nøkkelen er (kartype, dato,
+# versjon av bestillinger, gjentakelser og kunder, token), så samme kart bygges én
+# gang og deles av alle brukere til dataene endrer seg. Versjonene kommer fra
+# data_version-tabellene som triggerne i databasene holder oppdatert.
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+import plotly.graph_objects as go
+
+from utils.core.logging_config import get_logger
+from utils.db.db_utils import get_data_version
+
+logger = get_logger(__name__)
+
+FIGURE_CACHE_SIZE = 32
+
+
+class FigureCache:
+    """LRU-cache for serialiserte figurer, med treff- og bomtellere"""
+
+    def __init__(self, maxsize: int = FIGURE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[go.Figure]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Ny figur hver gang, så kallere kan legge til lag uten å endre cachen
+        return go.Figure(entry)
+
+    def put(self, key: Hashable, fig: go.Figure) -> None:
+        entry = fig.to_dict()
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+_figure_cache = FigureCache()
+
+
+def get_figure_cache() -> FigureCache:
+    return _figure_cache
+
+
+def _token_digest(token: Optional[str]) -> str:
+    """Tokenet inngår i nøkkelen, men holdes ikke i klartekst i minnet"""
+    return hashlib.sha1((token or "").encode("utf-8")).hexdigest()[:12]
+
+
+def figure_cache_key(kind: str, dato, mapbox_token: Optional[str]) -> Optional[Tuple]:
+    """
+    Cachenøkkel for et kart, eller None hvis dataversjonene ikke kan leses.
+    """
+    bookings_version = get_data_version("tunbroyting", "tunbroyting_bestillinger")
+    rules_version = get_data_version("tunbroyting", "tunbroyting_gjentakelser")
+    customer_version = get_data_version("customer", "customer")
+    if bookings_version is None or rules_version is None or customer_version is None:
+        return None
+    return (
+        kind, str(dato), bookings_version, rules_version, customer_version,
+        _token_digest(mapbox_token),
+    )
+
+
+def get_cached_figure(
+    kind: str, dato, mapbox_token: Optional[str], build: Callable[[], Optional[go.Figure]]
+) -> Optional[go.Figure]:
+    """
+    Henter et kart fra cachen, eller bygger det med build() og lagrer det.
+
+    Args:
+        kind: Hvilket kart (f.eks. 'tunkart_i_dag')
+        dato: Datoen kartet gjelder
+        mapbox_token: Token som brukes i kartet
+        build: Bygger figuren ved bom; None lagres ikke
+
+    Returns:
+        Optional[go.Figure]: Figuren, eller None hvis den ikke kunne bygges
+    """
+    key = figure_cache_key(kind, dato, mapbox_token)
+    cache = get_figure_cache()
+    if key is not None:
+        fig = cache.get(key)
+        if fig is not None:
+            return fig
+
+    fig = build()
+    if fig is not None and key is not None:
+        cache.put(key, fig)
+        logger.debug(f"Figurcache: {cache.stats()}")
+    return fig
@@ -0,0 +1,259 @@
+# geofence_utils.py
+# Rode-polygoner og inn/ut-hendelser for brøytebilene. Polygonene er konvekse
+# hyller rundt hyttene i hver rode (gruppert med get_rode), utvidet med en
+# margin så veien utenfor de ytterste hyttene kommer med. Nye GPS-punkter
+# klassifiseres vektorisert, og overganger lagres i rode_events.
+import math
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.core.config import TZ, RODE_MARGIN_M
+from utils.core.logging_config import get_logger
+from utils.db.connection import get_db_connection
+from utils.services.customer_utils import get_cabin_coordinates, get_rode
+from utils.services.gps_utils import GpsSnapshot, get_gps_snapshot
+
+logger = get_logger(__name__)
+
+INGEST_NAME = "rode_events"
+
+# Lokal projeksjon rundt hyttegrenda
+_REF_LAT, _REF_LON = 59.391, 6.428
+_M_PER_DEG_LAT = 111_320.0
+_M_PER_DEG_LON = _M_PER_DEG_LAT * math.cos(math.radians(_REF_LAT))
+
+
+def _project(lat, lon):
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    return (lon - _REF_LON) * _M_PER_DEG_LON, (lat - _REF_LAT) * _M_PER_DEG_LAT
+
+
+def convex_hull(points: np.ndarray) -> np.ndarray:
+    """Konveks hylle (Andrews monotone chain), mot klokka, uten gjentatt startpunkt"""
+    points = np.unique(np.asarray(points, dtype=float), axis=0)
+    if len(points) < 3:
+        return points
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower, upper = [], []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in points[::-1]:
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return np.array(lower[:-1] + upper[:-1])
+
+
+def expand_polygon(polygon: np.ndarray, margin_m: float) -> np.ndarray:
+    """
+    Utvider et konvekst polygon med margin_m meter.
+
+    Færre enn tre hjørner (én hytte eller hytter på rekke) gir et
+    åttekantet område rundt punktene.
+    """
+    if len(polygon) >= 3:
+        center = polygon.mean(axis=0)
+        offset = polygon - center
+        dist = np.hypot(offset[:, 0], offset[:, 1])
+        dist[dist == 0] = 1.0
+        return polygon + offset / dist[:, None] * margin_m
+
+    angles = np.linspace(0, 2 * np.pi, 8, endpoint=False)
+    ring = np.column_stack([np.cos(angles), np.sin(angles)]) * margin_m
+    return convex_hull(np.concatenate([p + ring for p in polygon]))
+
+
+def points_in_polygon(x, y, polygon: np.ndarray) -> np.ndarray:
+    """Vektorisert ray casting: hvilke punkter ligger inne i polygonet"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    inside = np.zeros(len(x), dtype=bool)
+    xj, yj = polygon[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for xi, yi in polygon:
+            crosses = (yi > y) != (yj > y)
+            x_cross = (xj - xi) * (y - yi) / (yj - yi) + xi
+            inside ^= crosses & (x < x_cross)
+            xj, yj = xi, yi
+    return inside
+
+
+def build_rode_polygons(coordinates: Dict[str, tuple], margin_m: float = RODE_MARGIN_M) -> Dict[str, np.ndarray]:
+    """Lager ett polygon (i lokale meter) per rode fra hyttekoordinatene"""
+    per_rode = {}
+    for cabin_id, (lat, lon) in coordinates.items():
+        rode = get_rode(cabin_id)
+        if rode is not None:
+            per_rode.setdefault(rode, []).append(_project(lat, lon))
+
+    return {
+        rode: expand_polygon(convex_hull(np.array(points)), margin_m)
+        for rode, points in sorted(per_rode.items())
+    }
+
+
+@st.cache_data(ttl=3600)
+def get_rode_polygons() -> Dict[str, np.ndarray]:
+    """Rode-polygoner for alle hytter med kjente koordinater"""
+    return build_rode_polygons(get_cabin_coordinates())
+
+
+def classify_points(lat, lon, polygons: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Boolsk tabell (punkt × rode) over hvilke roder hvert punkt ligger i"""
+    x, y = _project(lat, lon)
+    return pd.DataFrame({rode: points_in_polygon(x, y, poly) for rode, poly in polygons.items()})
+
+
+def detect_events(points: pd.DataFrame, inside: pd.DataFrame, previous: Dict[tuple, bool]) -> pd.DataFrame:
+    """
+    Finner inn/ut-overganger per (bil, rode).
+
+    Args:
+        points: GPS-punkter (bilnr, ts) sortert på bilnr og ts
+        inside: Resultatet fra classify_points for de samme punktene
+        previous: Siste kjente tilstand per (bilnr, rode) fra forrige batch
+
+    Returns:
+        pd.DataFrame: rode, bilnr, event ('enter'/'exit') og ts
+    """
+    bilnr = points["bilnr"].to_numpy()
+    ts = points["ts"].to_numpy()
+    first_of_vehicle = np.r_[True, bilnr[1:] != bilnr[:-1]]
+
+    events = []
+    for rode in inside.columns:
+        state = inside[rode].to_numpy()
+        prev_state = np.r_[False, state[:-1]]
+        # Første punkt per bil sammenlignes med lagret tilstand
+        starts = np.flatnonzero(first_of_vehicle)
+        prev_state[starts] = [previous.get((bilnr[i], rode), False) for i in starts]
+
+        changed = np.flatnonzero(state != prev_state)
+        if len(changed):
+            events.append(pd.DataFrame({
+                "rode": rode,
+                "bilnr": bilnr[changed],
+                "event": np.where(state[changed], "enter", "exit"),
+                "ts": ts[changed],
+            }))
+
+    if not events:
+        return pd.DataFrame(columns=["rode", "bilnr", "event", "ts"])
+    return pd.concat(events, ignore_index=True).sort_values("ts", kind="stable")
+
+
+def oppdater_rodehendelser(snapshot: Optional[GpsSnapshot] = None, polygons: Optional[Dict] = None) -> int:
+    """
+    Klassifiserer nye GPS-punkter og lagrer inn/ut-hendelser for rodene.
+
+    Returns:
+        int: Antall nye hendelser
+    """
+    try:
+        snapshot = snapshot if snapshot is not None else get_gps_snapshot()
+        polygons = polygons if polygons is not None else get_rode_polygons()
+        points = snapshot.to_frame().dropna(subset=["lat", "lon"])
+        if points.empty or not polygons:
+            return 0
+
+        with get_db_connection("gps") as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT last_ts FROM gps_ingest_state WHERE name = ?", (INGEST_NAME,))
+            row = cursor.fetchone()
+            if row:
+                points = points[points["ts"] > pd.Timestamp(row[0])]
+            if points.empty:
+                return 0
+            points = points.sort_values(["bilnr", "ts"], kind="stable").reset_index(drop=True)
+
+            cursor.execute("SELECT bilnr, rode, inside FROM rode_state")
+            previous = {(r["bilnr"], r["rode"]): bool(r["inside"]) for r in cursor.fetchall()}
+
+            inside = classify_points(points["lat"], points["lon"], polygons)
+            events = detect_events(points, inside, previous)
+
+            # Siste tilstand per (bil, rode) til neste batch
+            last_rows = points.groupby("bilnr").tail(1).index
+            state_rows = [
+                (points.at[i, "bilnr"], rode, int(inside.at[i, rode]))
+                for i in last_rows for rode in inside.columns
+            ]
+
+            cursor.execute("BEGIN")
+            cursor.executemany(
+                "INSERT INTO rode_events (rode, bilnr, event, ts) VALUES (?, ?, ?, ?)",
+                [(r.rode, r.bilnr, r.event, pd.Timestamp(r.ts).isoformat())
+                 for r in events.itertuples(index=False)],
+            )
+            cursor.executemany(
+                """
+                INSERT INTO rode_state (bilnr, rode, inside) VALUES (?, ?, ?)
+                ON CONFLICT(bilnr, rode) DO UPDATE SET inside = excluded.inside
+                """,
+                state_rows,
+            )
+            cursor.execute(
+                """
+                INSERT INTO gps_ingest_state (name, last_ts) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET last_ts = excluded.last_ts
+                """,
+                (INGEST_NAME, points["ts"].max().isoformat()),
+            )
+            cursor.execute("COMMIT")
+
+        if len(events):
+            logger.info(f"Registrerte {len(events)} rodehendelser")
+        return len(events)
+
+    except Exception as e:
+        logger.error(f"Feil ved oppdatering av rodehendelser: {str(e)}", exc_info=True)
+        return 0
+
+
+def get_siste_rodebesok(rode: str) -> Optional[pd.Timestamp]:
+    """Når brøytebilen sist kjørte inn i en rode (oppslag i indeksen på rode, ts)"""
+    try:
+        with get_db_connection("gps") as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT ts FROM rode_events
+                WHERE rode = ? AND event = 'enter'
+                ORDER BY ts DESC LIMIT 1
+                """,
+                (str(rode),),
+            )
+            row = cursor.fetchone()
+        return pd.Timestamp(row[0]).tz_convert(TZ) if row else None
+    except Exception as e:
+        logger.error(f"Feil ved henting av siste besøk i rode {rode}: {str(e)}")
+        return None
+
+
+def hent_rodehendelser(rode: Optional[str] = None, limit: int = 100) -> pd.DataFrame:
+    """Henter de siste inn/ut-hendelsene, eventuelt for én rode"""
+    try:
+        query = "SELECT rode, bilnr, event, ts FROM rode_events"
+        params = []
+        if rode is not None:
+            query += " WHERE rode = ?"
+            params.append(str(rode))
+        query += " ORDER BY ts DESC LIMIT ?"
+        params.append(limit)
+
+        with get_db_connection("gps") as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+        df["ts"] = pd.to_datetime(df["ts"], utc=True, format="ISO8601").dt.tz_convert(TZ)
+        return df
+    except Exception as e:
+        logger.error(f"Feil ved henting av rodehendelser: {str(e)}")
+        return pd.DataFrame(columns=["rode", "bilnr", "event", "ts"])
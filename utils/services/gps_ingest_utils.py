@@ -0,0 +1,62 @@
+# gps_ingest_utils.py
+# Innlesing av GPS-data i gps.db: punkter, dekningsraster, rodehendelser og
+# hyttepasseringer. Alt skrives i ett steg per snapshot, høyst én gang per
+# INNLESING_INTERVALL_S i prosessen, så visning av sidene bare leser.
+import threading
+import time
+from typing import Optional
+
+import pandas as pd
+
+from utils.core.logging_config import get_logger
+from utils.services.cabin_pass_utils import oppdater_hyttepasseringer
+from utils.services.coverage_utils import oppdater_dekning_etter_innlesing
+from utils.services.geofence_utils import oppdater_rodehendelser
+from utils.services.gps_track_utils import lagre_gps_punkter
+from utils.services.gps_utils import get_gps_snapshot
+
+logger = get_logger(__name__)
+
+# Samme som TTL-en til get_gps_snapshot; oftere gir uansett ikke nye data
+INNLESING_INTERVALL_S = 60.0
+
+_lock = threading.Lock()
+_sist_forsokt: Optional[float] = None
+_sist_innlest: Optional[pd.Timestamp] = None
+
+
+def innles_gps_data() -> bool:
+    """
+    Skriver siste GPS-snapshot til gps.db hvis det er tid for det.
+
+    Samtidige kall fra andre sesjoner venter ikke, men hopper over; et
+    snapshot med samme nyeste tidspunkt som forrige leses ikke inn på nytt.
+
+    Returns:
+        bool: True hvis et nytt snapshot ble lest inn
+    """
+    global _sist_forsokt, _sist_innlest
+    if not _lock.acquire(blocking=False):
+        return False
+    try:
+        naa = time.monotonic()
+        if _sist_forsokt is not None and naa - _sist_forsokt < INNLESING_INTERVALL_S:
+            return False
+        _sist_forsokt = naa
+
+        snapshot = get_gps_snapshot()
+        if snapshot.empty or snapshot.latest == _sist_innlest:
+            return False
+
+        if lagre_gps_punkter(snapshot):
+            oppdater_dekning_etter_innlesing()
+        oppdater_rodehendelser(snapshot)
+        oppdater_hyttepasseringer(snapshot)
+        _sist_innlest = snapshot.latest
+        return True
+
+    except Exception as e:
+        logger.error(f"Feil ved innlesing av GPS-data: {str(e)}", exc_info=True)
+        return False
+    finally:
+        _lock.release()
@@ -0,0 +1,253 @@
+# gps_replay_utils.py
+# Opptak og avspilling av plowman-delingssiden, slik at GPS-løypa (henting,
+# parsing og alt som bygger på GpsSnapshot) kan testes og tidsmåles uten å
+# treffe den levende siden. CLI-en ligger i scripts/gps_replay.py.
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+from utils.core.config import PLOWMAN_SHARE_URL
+from utils.core.logging_config import get_logger
+from utils.services.gps_source_utils import SHARE_SCRIPT_INDEX
+
+logger = get_logger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+# Standardrute for syntetisk kjøring: en sløyfe gjennom hyttefeltet (lat, lon)
+DEFAULT_ROUTE = [
+    (59.38900, 6.42300),
+    (59.39111, 6.42755),
+    (59.39350, 6.43200),
+    (59.39550, 6.43500),
+    (59.39300, 6.43800),
+    (59.39000, 6.43300),
+    (59.38900, 6.42300),
+]
+
+_LAST_UPDATED_RE = re.compile(
+    r'(lastUpdated\\?"\s*:\s*\\?"(?:\$D)?)(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?Z)'
+)
+
+
+def _format_ts(dt: datetime) -> str:
+    """Samme tidsformat som plowman bruker (UTC, millisekunder)"""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _parse_ts(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def render_share_page(geojson: Dict) -> str:
+    """Lager en minimal delingsside som extract_geojson_from_share_page kan parse"""
+    payload = "7:" + json.dumps({"geojson": geojson}, separators=(",", ":")) + "\n"
+    filler = "<script></script>" * SHARE_SCRIPT_INDEX
+    return (
+        "<!DOCTYPE html><html><head></head><body>"
+        f"{filler}<script>self.__next_f.push([1,{json.dumps(payload)}])</script>"
+        "</body></html>"
+    )
+
+
+def shift_timestamps(page: str, offset: timedelta) -> str:
+    """Forskyver alle lastUpdated-verdier i en lagret side"""
+    if not offset:
+        return page
+    return _LAST_UPDATED_RE.sub(
+        lambda m: m.group(1) + _format_ts(_parse_ts(m.group(2)) + offset), page
+    )
+
+
+def record_share_pages(
+    output_dir, url: str = PLOWMAN_SHARE_URL, count: int = 1, interval: float = 60.0
+) -> int:
+    """
+    Lagrer svar fra delingssiden til output_dir med en manifest-fil.
+
+    Args:
+        output_dir: Mappe for opptaket
+        url: Siden som skal tas opp
+        count: Antall henting
+        interval: Sekunder mellom hver henting
+
+    Returns:
+        int: Antall lagrede sider
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else []
+
+    saved = 0
+    for i in range(count):
+        if i:
+            time.sleep(interval)
+        try:
+            response = requests.get(url, timeout=10)
+        except requests.RequestException as e:
+            logger.error(f"Feil ved opptak av delingsside: {str(e)}")
+            continue
+        if not response.ok:
+            logger.warning(f"Hoppet over svar med status {response.status_code}")
+            continue
+
+        captured_at = datetime.now(timezone.utc)
+        filename = f"page_{captured_at.strftime('%Y%m%dT%H%M%S')}_{len(manifest):04d}.html"
+        (output_dir / filename).write_text(response.text, encoding="utf-8")
+        manifest.append({"file": filename, "captured_at": captured_at.isoformat()})
+        manifest_path.write_text(json.dumps(manifest, indent=2))
+        saved += 1
+        logger.info(f"Lagret {filename} ({len(response.text)} tegn)")
+
+    return saved
+
+
+class RecordedSource:
+    """Spiller av et opptak; sidene byttes i takt med (akselerert) tid"""
+
+    def __init__(self, recording_dir, speed: float = 1.0, shift_to_now: bool = False):
+        recording_dir = Path(recording_dir)
+        manifest = json.loads((recording_dir / MANIFEST_FILE).read_text())
+        if not manifest:
+            raise ValueError(f"Opptaket i {recording_dir} er tomt")
+
+        manifest.sort(key=lambda entry: entry["captured_at"])
+        self.pages = [(recording_dir / e["file"]).read_text(encoding="utf-8") for e in manifest]
+        self.captured = [datetime.fromisoformat(e["captured_at"]) for e in manifest]
+        self.speed = float(speed)
+        self.shift_to_now = shift_to_now
+        self.started = time.monotonic()
+
+    def _virtual_elapsed(self) -> float:
+        return (time.monotonic() - self.started) * self.speed
+
+    def current_page(self) -> str:
+        elapsed = self._virtual_elapsed()
+        span = (self.captured[-1] - self.captured[0]).total_seconds()
+        if span > 0:
+            # Start på nytt når opptaket er spilt ferdig
+            elapsed %= span + 1
+        offsets = [(c - self.captured[0]).total_seconds() for c in self.captured]
+        index = max(i for i, offset in enumerate(offsets) if offset <= elapsed)
+
+        page = self.pages[index]
+        if self.shift_to_now:
+            virtual_now = self.captured[0] + timedelta(seconds=elapsed)
+            page = shift_timestamps(page, datetime.now(timezone.utc) - virtual_now)
+        return page
+
+
+class SyntheticSource:
+    """Syntetisk brøytebil som kjører langs en rute i akselerert tid"""
+
+    def __init__(
+        self,
+        route: Sequence[Tuple[float, float]] = DEFAULT_ROUTE,
+        speed_mps: float = 8.0,
+        speed: float = 1.0,
+        sample_every: float = 10.0,
+        max_points: int = 500,
+        vehicles: int = 1,
+    ):
+        self.route = list(route)
+        self.speed_mps = float(speed_mps)
+        self.speed = float(speed)
+        self.sample_every = float(sample_every)
+        self.max_points = int(max_points)
+        self.vehicles = int(vehicles)
+        self.started_wall = datetime.now(timezone.utc)
+        self.started = time.monotonic()
+
+        # Kumulativ lengde langs ruta i meter
+        self._cumulative = [0.0]
+        for (lat1, lon1), (lat2, lon2) in zip(self.route, self.route[1:]):
+            dx = math.radians(lon2 - lon1) * 6_371_000.0 * math.cos(math.radians(lat1))
+            dy = math.radians(lat2 - lat1) * 6_371_000.0
+            self._cumulative.append(self._cumulative[-1] + math.hypot(dx, dy))
+
+    def position_at(self, distance_m: float) -> Tuple[float, float]:
+        """Posisjon (lat, lon) etter distance_m meter langs ruta"""
+        total = self._cumulative[-1]
+        if total <= 0:
+            return self.route[0]
+        distance_m %= total
+        for i in range(1, len(self._cumulative)):
+            if distance_m <= self._cumulative[i]:
+                seg = self._cumulative[i] - self._cumulative[i - 1]
+                frac = (distance_m - self._cumulative[i - 1]) / seg if seg else 0.0
+                (lat1, lon1), (lat2, lon2) = self.route[i - 1], self.route[i]
+                return lat1 + (lat2 - lat1) * frac, lon1 + (lon2 - lon1) * frac
+        return self.route[-1]
+
+    def geojson(self, elapsed: Optional[float] = None) -> Dict:
+        """Punkt-features for sporet fram til virtuell tid elapsed (sekunder)"""
+        if elapsed is None:
+            elapsed = (time.monotonic() - self.started) * self.speed
+        samples = int(elapsed // self.sample_every) + 1
+        first = max(0, samples - self.max_points)
+
+        features: List[Dict] = []
+        offset_m = self._cumulative[-1] / max(self.vehicles, 1)
+        for vehicle in range(self.vehicles):
+            for k in range(first, samples):
+                t = k * self.sample_every
+                lat, lon = self.position_at(t * self.speed_mps + vehicle * offset_m)
+                features.append({
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                    "properties": {
+                        "BILNR": f"SIM{vehicle + 1}",
+                        "lastUpdated": "$D" + _format_ts(self.started_wall + timedelta(seconds=t)),
+                    },
+                })
+        return {"type": "FeatureCollection", "features": features}
+
+    def current_page(self) -> str:
+        return render_share_page(self.geojson())
+
+
+def _make_handler(source):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = source.current_page().encode("utf-8")
+            etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("replay: " + format % args)
+
+    return ReplayHandler
+
+
+def start_replay_server(source, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Starter en lokal stand-in for delingssiden i en bakgrunnstråd.
+
+    Bruk port=0 for en ledig port; adressen finnes i server.server_address.
+    Stopp med server.shutdown().
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(source))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logger.info(f"GPS-replay kjører på http://{host}:{server.server_address[1]}/")
+    return server
@@ -0,0 +1,280 @@
+# gps_source_utils.py
+# GPS-kilder for brøytebilene. Hver kilde henter sine data og normaliserer dem
+# til GeoJSON-features (lastUpdated, BILNR, koordinater som [lon, lat]).
+# Kildene hentes parallelt med egne tidsgrenser og slås sammen til én
+# FeatureCollection, slik at en treg eller nede kilde ikke forsinker resten.
+import hashlib
+import json
+from abc import ABC, abstractmethod
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import requests
+
+from utils.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Delingssiden legger GeoJSON i script nr. 29 (indeks 28)
+SHARE_SCRIPT_INDEX = 28
+
+# Kjøretøytype for brøytebilene; features av annen type (f.eks. busser) er
+# ikke brøyting og holdes utenfor brøytedataene
+PLOW_KIND = "plog"
+
+# Delt trådpool; avbrutte hentinger får fullføre i bakgrunnen uten å blokkere
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="gps-source")
+
+
+_SCRIPT_RE = re.compile(r"<script[^>]*>(.*?)</script>", re.S)
+_PUSH_RE = re.compile(r'self\.__next_f\.push\(\[1,\s*("(?:[^"\\]|\\.)*")\s*\]\)', re.S)
+_GEOJSON_KEY = '"geojson":'
+_decoder = json.JSONDecoder()
+
+
+def _decode_geojson(script: str) -> Dict:
+    """Dekoder geojson-objektet fra én self.__next_f.push-script"""
+    match = _PUSH_RE.search(script)
+    if not match:
+        return {}
+    # Argumentet er en JS-strengliteral; JSON-dekoding gir den rå RSC-teksten
+    payload = json.loads(match.group(1))
+    start = payload.find(_GEOJSON_KEY)
+    if start < 0:
+        return {}
+    data, _ = _decoder.raw_decode(payload, start + len(_GEOJSON_KEY))
+    if isinstance(data, dict) and 'type' in data and 'features' in data:
+        return data
+    return {}
+
+
+def extract_geojson_from_share_page(html: str) -> Dict:
+    """
+    Finner GeoJSON-objektet i plowman-delingssiden.
+
+    Script nr. 29 prøves først; hvis sidelayouten har endret seg, søkes de
+    øvrige scriptene som inneholder geojson.
+    """
+    scripts = _SCRIPT_RE.findall(html)
+    logger.debug(f"Fant {len(scripts)} script-tagger")
+
+    candidates = []
+    if len(scripts) > SHARE_SCRIPT_INDEX:
+        candidates.append(scripts[SHARE_SCRIPT_INDEX])
+    candidates.extend(s for s in scripts if 'geojson' in s)
+
+    for script in candidates:
+        try:
+            data = _decode_geojson(script)
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.error(f"JSON parsing feilet: {str(e)}")
+            continue
+        if data:
+            logger.debug(f"Fant {len(data['features'])} features")
+            return data
+    return {}
+
+
+class GpsSource(ABC):
+    """
+    Grensesnitt for en GPS-kilde.
+
+    Kilden husker ETag/Last-Modified og en hash av forrige svar, slik at en
+    uendret side verken lastes ned på nytt (304) eller parses på nytt.
+    Kildene deles mellom sesjoner og trådene i _executor, så hentingen og
+    oppdateringen av denne tilstanden skjer under kildens lås.
+    """
+
+    name = "ukjent"
+    kind = PLOW_KIND
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.digest: Optional[str] = None
+        self.changed = False
+        self._features: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def fetch(self) -> List[Dict]:
+        """Henter og returnerer normaliserte GeoJSON-features"""
+        with self._lock:
+            headers = {}
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+
+            response = requests.get(self.url, timeout=self.timeout, headers=headers)
+            self.changed = False
+            if response.status_code == 304:
+                return self._copy_features()
+            if not response.ok:
+                logger.warning(f"{self.name}: feil ved henting av data. Status: {response.status_code}")
+                return []
+
+            self.etag = response.headers.get("ETag")
+            self.last_modified = response.headers.get("Last-Modified")
+            digest = hashlib.sha1(response.content).hexdigest()
+            if digest != self.digest:
+                self._features = self.parse(response.text)
+                self.digest = digest
+                self.changed = True
+            return self._copy_features()
+
+    def export_state(self) -> Dict:
+        """Tilstanden som trengs for å fortsette med betingede hentinger etter omstart"""
+        with self._lock:
+            return {
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "digest": self.digest,
+                "features": self._copy_features(),
+            }
+
+    def restore_state(self, state: Dict) -> None:
+        """
+        Gjenoppretter tilstand fra export_state.
+
+        Uten lagrede features ignoreres ETag og Last-Modified, så kilden hentes
+        i sin helhet i stedet for å gi et tomt svar på 304.
+        """
+        if not isinstance(state.get("features"), list):
+            return
+        with self._lock:
+            self.etag = state.get("etag")
+            self.last_modified = state.get("last_modified")
+            self.digest = state.get("digest")
+            self._features = state["features"]
+
+    def _copy_features(self) -> List[Dict]:
+        # Kopier properties så kallere kan merke featurene uten å endre cachen
+        return [dict(f, properties=dict(f.get("properties") or {})) for f in self._features]
+
+    @abstractmethod
+    def parse(self, text: str) -> List[Dict]:
+        """Gjør svarteksten om til normaliserte GeoJSON-features"""
+
+
+class PlowmanShareSource(GpsSource):
+    """Plowman-delingssiden (HTML med innebygd GeoJSON)"""
+
+    name = "plowman"
+
+    def parse(self, text: str) -> List[Dict]:
+        return extract_geojson_from_share_page(text).get("features", [])
+
+
+class IruteJsonSource(GpsSource):
+    """
+    irute-feeden (config.GPS_URL).
+
+    Feeden er enten GeoJSON eller en liste med kjøretøy; begge normaliseres
+    til Point-features.
+    """
+
+    name = "irute"
+    kind = "buss"
+
+    _LAT_KEYS = ("lat", "latitude", "Lat", "Latitude")
+    _LON_KEYS = ("lon", "lng", "longitude", "Lon", "Lng", "Longitude")
+    _TS_KEYS = ("lastUpdated", "timestamp", "time", "updated", "date", "Date")
+    _ID_KEYS = ("BILNR", "id", "name", "vehicle", "bus", "busId")
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        super().__init__(url, timeout)
+
+    @staticmethod
+    def _first(record: Dict, keys: Sequence[str]):
+        for key in keys:
+            if record.get(key) not in (None, ""):
+                return record[key]
+        return None
+
+    @staticmethod
+    def _to_iso(value) -> Optional[str]:
+        if isinstance(value, (int, float)):
+            # Epoch i sekunder eller millisekunder
+            seconds = value / 1000 if value > 1e11 else value
+            return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat()
+        return str(value) if value else None
+
+    def parse(self, text: str) -> List[Dict]:
+        data = json.loads(text)
+        if isinstance(data, dict) and "features" in data:
+            return data["features"]
+
+        if isinstance(data, dict):
+            records = next(
+                (v for v in data.values() if isinstance(v, list)),
+                list(data.values()),
+            )
+        else:
+            records = data
+
+        features = []
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            lat = self._first(record, self._LAT_KEYS)
+            lon = self._first(record, self._LON_KEYS)
+            ts = self._to_iso(self._first(record, self._TS_KEYS))
+            if lat is None or lon is None or not ts:
+                continue
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [float(lon), float(lat)]},
+                "properties": {
+                    "lastUpdated": ts,
+                    "BILNR": str(self._first(record, self._ID_KEYS) or "Ukjent"),
+                },
+            })
+        return features
+
+
+def _fetch_source(source: GpsSource) -> List[Dict]:
+    features = source.fetch()
+    for feature in features:
+        properties = feature.setdefault("properties", {})
+        properties["source"] = source.name
+        properties["kind"] = source.kind
+    return features
+
+
+def fetch_gps_sources(sources: Sequence[GpsSource]) -> Dict:
+    """
+    Henter alle kilder parallelt og slår sammen resultatet.
+
+    Hver kilde har sin egen tidsgrense regnet fra start; kilder som ikke har
+    svart innen da utelates fra denne hentingen.
+
+    Returns:
+        Dict: GeoJSON FeatureCollection (tom hvis ingen kilder svarte)
+    """
+    if not sources:
+        return {}
+
+    started = time.monotonic()
+    futures = [(source, _executor.submit(_fetch_source, source)) for source in sources]
+
+    features, answered = [], 0
+    for source, future in sorted(futures, key=lambda item: item[0].timeout):
+        remaining = max(0.0, started + source.timeout - time.monotonic())
+        try:
+            features.extend(future.result(timeout=remaining))
+            answered += 1
+        except FutureTimeoutError:
+            logger.warning(f"GPS-kilden {source.name} svarte ikke innen {source.timeout} s")
+        except Exception as e:
+            logger.warning(f"GPS-kilden {source.name} feilet: {str(e)}")
+
+    if not answered:
+        return {}
+    return {"type": "FeatureCollection", "features": features}
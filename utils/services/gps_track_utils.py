@@ -0,0 +1,235 @@
+# gps_track_utils.py
+# Lagrer GPS-punkter fra brøytebilene, deler dem opp i økter (sammenhengende
+# kjøring per bil) og forenkler sporene før de tegnes på kart. Forenklede
+# spor caches per (økt, toleranse), så gjentatte visninger er gratis.
+import math
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.core.config import TZ
+from utils.core.logging_config import get_logger
+from utils.db.connection import get_db_connection
+from utils.services.gps_utils import GpsSnapshot, get_gps_snapshot
+
+logger = get_logger(__name__)
+
+INGEST_NAME = "gps_points"
+EARTH_RADIUS_M = 6_371_000.0
+
+# Ny økt når samme bil har vært stille lenger enn dette
+SESSION_GAP = timedelta(minutes=10)
+
+# Meter per skjermpiksel ved zoom 0 på ekvator (Web Mercator, 256 px fliser)
+_METERS_PER_PIXEL_Z0 = 156_543.03
+
+
+def lagre_gps_punkter(snapshot: Optional[GpsSnapshot] = None) -> int:
+    """
+    Lagrer nye GPS-punkter fra siste henting i gps_points.
+
+    Punkter eldre enn forrige henting hoppes over; duplikater ignoreres av
+    UNIQUE-indeksen.
+
+    Returns:
+        int: Antall nye punkter
+    """
+    try:
+        snapshot = snapshot if snapshot is not None else get_gps_snapshot()
+        has_coords = ~np.isnan(snapshot.lat)
+        ts = snapshot.timestamps[has_coords]
+        if len(ts) == 0:
+            return 0
+
+        with get_db_connection("gps") as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT last_ts FROM gps_ingest_state WHERE name = ?", (INGEST_NAME,))
+            row = cursor.fetchone()
+            # >= fordi punktene i en LineString deler samme tidsstempel
+            is_new = np.asarray(ts >= pd.Timestamp(row[0])) if row else np.ones(len(ts), dtype=bool)
+            if not is_new.any():
+                return 0
+
+            rows = list(zip(
+                ts[is_new].map(lambda t: t.isoformat()),
+                snapshot.bilnr[has_coords][is_new],
+                snapshot.lat[has_coords][is_new].tolist(),
+                snapshot.lon[has_coords][is_new].tolist(),
+            ))
+
+            cursor.execute("BEGIN")
+            before = conn.total_changes
+            cursor.executemany(
+                "INSERT OR IGNORE INTO gps_points (ts, bilnr, lat, lon) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            inserted = conn.total_changes - before
+            cursor.execute(
+                """
+                INSERT INTO gps_ingest_state (name, last_ts) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET last_ts = excluded.last_ts
+                """,
+                (INGEST_NAME, ts.max().isoformat()),
+            )
+            cursor.execute("COMMIT")
+
+        if inserted:
+            logger.info(f"Lagret {inserted} nye GPS-punkter")
+        return inserted
+
+    except Exception as e:
+        logger.error(f"Feil ved lagring av GPS-punkter: {str(e)}", exc_info=True)
+        return 0
+
+
+def hent_gps_punkter(
+    start: datetime, end: datetime, bilnr: Optional[str] = None
+) -> pd.DataFrame:
+    """Henter lagrede GPS-punkter (ts i UTC) i et tidsrom, sortert på bil og tid"""
+    try:
+        query = "SELECT ts, bilnr, lat, lon FROM gps_points WHERE ts >= ? AND ts <= ?"
+        params = [pd.Timestamp(start).tz_convert("UTC").isoformat(),
+                  pd.Timestamp(end).tz_convert("UTC").isoformat()]
+        if bilnr is not None:
+            query += " AND bilnr = ?"
+            params.append(bilnr)
+        query += " ORDER BY bilnr, ts"
+
+        with get_db_connection("gps") as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+        df["ts"] = pd.to_datetime(df["ts"], utc=True, format="ISO8601")
+        return df
+
+    except Exception as e:
+        logger.error(f"Feil ved henting av GPS-punkter: {str(e)}")
+        return pd.DataFrame(columns=["ts", "bilnr", "lat", "lon"])
+
+
+def split_sessions(points: pd.DataFrame, gap: timedelta = SESSION_GAP) -> pd.DataFrame:
+    """
+    Deler punkter (sortert på bilnr, ts) inn i økter.
+
+    Returns:
+        pd.DataFrame: Én rad per økt med session_id, bilnr, start, end og antall punkter
+    """
+    columns = ["session_id", "bilnr", "start", "end", "points"]
+    if points.empty:
+        return pd.DataFrame(columns=columns)
+
+    new_vehicle = points["bilnr"].ne(points["bilnr"].shift())
+    new_gap = points["ts"].diff() > pd.Timedelta(gap)
+    session_no = (new_vehicle | new_gap).cumsum()
+
+    sessions = points.groupby(session_no).agg(
+        bilnr=("bilnr", "first"),
+        start=("ts", "min"),
+        end=("ts", "max"),
+        points=("ts", "size"),
+    ).reset_index(drop=True)
+    # Avsluttede økter endrer seg ikke, så id-en kan brukes som cache-nøkkel
+    sessions["session_id"] = (
+        sessions["bilnr"] + "|" + sessions["start"].map(pd.Timestamp.isoformat)
+        + "|" + sessions["end"].map(pd.Timestamp.isoformat)
+    )
+    return sessions[columns]
+
+
+def _parse_session_id(session_id: str) -> Tuple[str, pd.Timestamp, pd.Timestamp]:
+    bilnr, start, end = session_id.rsplit("|", 2)
+    return bilnr, pd.Timestamp(start), pd.Timestamp(end)
+
+
+@st.cache_data(ttl=60)
+def get_track_sessions(dato: date) -> pd.DataFrame:
+    """Henter alle økter som startet på en gitt dato (Oslo-tid)"""
+    start = datetime.combine(dato, time.min, tzinfo=TZ)
+    points = hent_gps_punkter(start, start + timedelta(days=1))
+    return split_sessions(points)
+
+
+def tolerance_for_zoom(zoom: float, pixels: float = 1.5, lat: float = 59.391) -> float:
+    """Toleranse i meter som tilsvarer `pixels` skjermpiksler på gitt zoomnivå"""
+    meters_per_pixel = _METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** round(zoom))
+    return round(meters_per_pixel * pixels, 2)
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Douglas–Peucker-forenkling av en linje i planet.
+
+    Returns:
+        np.ndarray: Boolsk maske over punktene som beholdes
+    """
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    if n < 3:
+        return keep
+
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        seg_len = math.hypot(dx, dy)
+        if seg_len == 0:
+            dist = np.hypot(px, py)
+        else:
+            dist = np.abs(dx * py - dy * px) / seg_len
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+
+def simplify_track(lat, lon, tolerance_m: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Forenkler et spor med toleranse i meter"""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if len(lat) < 3 or tolerance_m <= 0:
+        return lat, lon
+
+    ref_lat = math.radians(float(lat.mean()))
+    x = np.radians(lon) * EARTH_RADIUS_M * math.cos(ref_lat)
+    y = np.radians(lat) * EARTH_RADIUS_M
+    keep = douglas_peucker(x, y, tolerance_m)
+    return lat[keep], lon[keep]
+
+
+@st.cache_data(ttl=3600, max_entries=500)
+def get_simplified_track(session_id: str, tolerance_m: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Henter og forenkler sporet til én økt"""
+    bilnr, start, end = _parse_session_id(session_id)
+    points = hent_gps_punkter(start, end, bilnr=bilnr)
+    return simplify_track(points["lat"].to_numpy(), points["lon"].to_numpy(), tolerance_m)
+
+
+def get_simplified_tracks(dato: date, zoom: float) -> List[Dict]:
+    """
+    Forenklede spor for alle økter på en dato, klare for kartbyggerne i map_utils.
+
+    Returns:
+        List[Dict]: Én dict per økt med bilnr, start, end, lat og lon
+    """
+    tolerance_m = tolerance_for_zoom(zoom)
+    tracks = []
+    for session in get_track_sessions(dato).itertuples(index=False):
+        lat, lon = get_simplified_track(session.session_id, tolerance_m)
+        tracks.append({
+            "bilnr": session.bilnr,
+            "start": session.start.tz_convert(TZ),
+            "end": session.end.tz_convert(TZ),
+            "lat": lat,
+            "lon": lon,
+        })
+    return tracks
@@ -4,18 +4,27 @@
 import json
 import logging
 import re
+import threading
 import traceback
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
 from typing import Dict, List, Optional, Union
 
+import numpy as np
 import pandas as pd
 import requests
 import streamlit as st
 from bs4 import BeautifulSoup, Tag
 
-from utils.core.config import TZ
+from utils.core.config import GPS_SOURCES, GPS_URL, PLOWMAN_SHARE_URL, TZ
 from utils.core.logging_config import get_logger
+from utils.services.gps_source_utils import (
+    PLOW_KIND,
+    GpsSource,
+    IruteJsonSource,
+    PlowmanShareSource,
+    fetch_gps_sources,
+)
 
 logger = get_logger(__name__)
 
@@ -88,102 +97,143 @@ def debug_date_data():
         logger.error(f"Feil i debug_date_data: {e}")
         logger.error(traceback.format_exc())
 
+# Kildene gjenbrukes mellom hentinger, så uendrede sider ikke parses på nytt
+_gps_sources: Dict[tuple, GpsSource] = {}
+_gps_sources_lock = threading.Lock()
+
+
+def get_gps_sources() -> List[GpsSource]:
+    """Returnerer de konfigurerte GPS-kildene"""
+    factories = {
+        "plowman": (PLOWMAN_SHARE_URL, lambda: PlowmanShareSource(PLOWMAN_SHARE_URL, timeout=10)),
+        "irute": (GPS_URL, lambda: IruteJsonSource(GPS_URL, timeout=5)),
+    }
+    sources = []
+    for name in GPS_SOURCES:
+        if name not in factories:
+            continue
+        url, factory = factories[name]
+        with _gps_sources_lock:
+            if (name, url) not in _gps_sources:
+                _gps_sources[(name, url)] = factory()
+            sources.append(_gps_sources[(name, url)])
+    return sources
+
+
+@st.cache_data(ttl=60)  # GPS-signalet er uansett forsinket, del svaret mellom visninger
 def get_geojson_data() -> Dict:
-    """Henter GeoJSON-data fra den eksterne nettsiden."""
+    """Henter GeoJSON-data fra alle GPS-kildene parallelt og slår dem sammen."""
     try:
-        url = "https://plowman-new.xn--snbryting-m8ac.net/nb/share/Y3VzdG9tZXItMTM="
-        response = requests.get(url, timeout=10)
-        
-        if not response.ok:
-            logger.warning(f"Feil ved henting av data. Status: {response.status_code}")
-            return {}
-            
-        soup = BeautifulSoup(response.text, 'html.parser')
-        scripts = soup.find_all('script')
-        
-        logger.debug(f"Fant {len(scripts)} script-tagger")
-        
-        # Bruk spesifikt script 29 (indeks 28)
-        if len(scripts) > 28:
-            script = scripts[28]
-            if script.string:
-                content = script.string.strip()
-                
-                if 'self.__next_f.push' in content:
-                    # Fjern JavaScript wrapper
-                    content = content.replace('self.__next_f.push([1,"', '')
-                    content = content.replace('"])', '')
-                    content = content.replace('\\"', '"')
-                    
-                    if '"geojson":' in content:
-                        start = content.find('"geojson":') + len('"geojson":')
-                        
-                        # Tell krøllparenteser for å finne slutten
-                        brace_count = 0
-                        in_string = False
-                        escape_next = False
-                        end_idx = start
-                        
-                        for idx, char in enumerate(content[start:], start=start):
-                            if escape_next:
-                                escape_next = False
-                                continue
-                            if char == '\\':
-                                escape_next = True
-                                continue
-                            if char == '"' and not escape_next:
-                                in_string = not in_string
-                                continue
-                            if not in_string:
-                                if char == '{':
-                                    brace_count += 1
-                                elif char == '}':
-                                    brace_count -= 1
-                                    if brace_count == 0:
-                                        end_idx = idx + 1
-                                        break
-                        
-                        json_str = content[start:end_idx]
-                        try:
-                            data = json.loads(json_str)
-                            if 'type' in data and 'features' in data:
-                                logger.debug(f"Fant {len(data['features'])} features")
-                                return data
-                        except json.JSONDecodeError as e:
-                            logger.error(f"JSON parsing feilet: {str(e)}")
-        
-        logger.warning("Ingen gyldig GPS-data funnet")
-        return {}
-        
+        data = fetch_gps_sources(get_gps_sources())
+        if not data:
+            logger.warning("Ingen gyldig GPS-data funnet")
+        return data
+
     except Exception as e:
         logger.error(f"Feil ved henting av GeoJSON-data: {str(e)}")
         logger.error(traceback.format_exc())
         return {}
 
+@dataclass(frozen=True)
+class GpsSnapshot:
+    """
+    Parset GPS-data fra én henting, lagret kolonnevis.
+
+    Hver rad er ett koordinatpunkt; LineString-features gir én rad per punkt
+    med featurens tidspunkt og BILNR. Features uten geometri beholdes med NaN
+    som koordinat slik at tidspunktet fortsatt teller.
+    """
+    timestamps: pd.DatetimeIndex  # UTC
+    lat: np.ndarray
+    lon: np.ndarray
+    bilnr: np.ndarray
+    earliest: Optional[pd.Timestamp] = None
+    latest: Optional[pd.Timestamp] = None
+
+    @property
+    def empty(self) -> bool:
+        return len(self.timestamps) == 0
+
+    def latest_local(self) -> Optional[datetime]:
+        """Nyeste tidspunkt i Oslo-tid"""
+        return self.latest.tz_convert(TZ).to_pydatetime() if self.latest is not None else None
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "ts": self.timestamps,
+            "lat": self.lat,
+            "lon": self.lon,
+            "bilnr": self.bilnr,
+        })
+
+
+def is_plow_feature(feature: Dict) -> bool:
+    """Sann for brøytebiler; features uten kind regnes som brøyting"""
+    return (feature.get("properties") or {}).get("kind", PLOW_KIND) == PLOW_KIND
+
+
+def build_gps_snapshot(geojson_data: Dict) -> GpsSnapshot:
+    """
+    Bygger en GpsSnapshot fra GeoJSON med én vektorisert tidsparsing.
+
+    Bare brøytebilene tas med; andre kjøretøy (irute-bussene) hoppes over.
+    """
+    raw_ts, bilnr, lat, lon = [], [], [], []
+    for feature in (geojson_data or {}).get("features", []):
+        if not is_plow_feature(feature):
+            continue
+        properties = feature.get("properties") or {}
+        ts = properties.get("lastUpdated")
+        if not ts:
+            continue
+        geometry = feature.get("geometry") or {}
+        coords = geometry.get("coordinates") or []
+        if geometry.get("type") == "Point":
+            coords = [coords]
+        points = [c for c in coords if isinstance(c, (list, tuple)) and len(c) >= 2]
+        if not points:
+            points = [(np.nan, np.nan)]
+
+        clean_ts = str(ts).replace("$D", "")
+        vehicle = str(properties.get("BILNR", "Ukjent"))
+        for point in points:
+            raw_ts.append(clean_ts)
+            bilnr.append(vehicle)
+            # GeoJSON lagrer koordinater som [lon, lat]
+            lon.append(point[0])
+            lat.append(point[1])
+
+    timestamps = pd.DatetimeIndex(
+        pd.to_datetime(pd.Series(raw_ts, dtype=object), utc=True, format="ISO8601", errors="coerce")
+    )
+    valid = ~timestamps.isna()
+    timestamps = timestamps[valid]
+
+    return GpsSnapshot(
+        timestamps=timestamps,
+        lat=np.asarray(lat, dtype=float)[valid],
+        lon=np.asarray(lon, dtype=float)[valid],
+        bilnr=np.asarray(bilnr, dtype=object)[valid],
+        earliest=timestamps.min() if len(timestamps) else None,
+        latest=timestamps.max() if len(timestamps) else None,
+    )
+
+
+@st.cache_data(ttl=60)
+def get_gps_snapshot() -> GpsSnapshot:
+    """Henter og parser GPS-data én gang per henting"""
+    return build_gps_snapshot(get_geojson_data())
+
+
 def fetch_gps_data() -> Optional[datetime]:
     """Henter siste brøytetidspunkt fra GeoJSON-data."""
     try:
-        # Hent GeoJSON-data
-        geojson_data = get_geojson_data()
-        
-        if not geojson_data or "features" not in geojson_data:
+        snapshot = get_gps_snapshot()
+        if snapshot.empty:
             logger.warning("Ingen gyldige GeoJSON-data funnet")
             return None
-            
-        # Finn nyeste tidspunkt
-        latest_timestamp = None
-        for feature in geojson_data["features"]:
-            if "properties" in feature and "lastUpdated" in feature["properties"]:
-                timestamp = feature["properties"]["lastUpdated"]
-                if timestamp:  # Sjekk at datoen ikke er None
-                    clean_timestamp = timestamp.replace('$D', '')
-                    if not latest_timestamp or clean_timestamp > latest_timestamp:
-                        latest_timestamp = clean_timestamp
-        
-        if latest_timestamp:
-            return datetime.strptime(latest_timestamp, '%Y-%m-%dT%H:%M:%S.%fZ')
-        return None
-        
+        return snapshot.latest_local()
+
     except Exception as e:
         logger.error(f"Feil ved henting av GPS-data: {e}")
         return None
@@ -191,32 +241,12 @@ def fetch_gps_data() -> Optional[datetime]:
 def get_last_gps_activity() -> Optional[datetime]:
     """Henter tidspunktet for siste GPS-aktivitet (brøyting)."""
     try:
-        # Hent GeoJSON data ved hjelp av eksisterende funksjon
-        geojson_data = get_geojson_data()
-        
-        if not geojson_data or "features" not in geojson_data:
+        snapshot = get_gps_snapshot()
+        if snapshot.empty:
             logger.warning("Ingen GPS-data funnet")
             return None
-            
-        # Finn nyeste tidspunkt
-        latest_timestamp = None
-        for feature in geojson_data.get("features", []):
-            ts = feature.get("properties", {}).get("lastUpdated")
-            if ts:
-                clean_ts = ts.replace('$D', '')
-                try:
-                    # Parse til UTC først
-                    dt = datetime.strptime(clean_ts, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=ZoneInfo('UTC'))
-                    # Konverter til Oslo-tid
-                    dt = dt.astimezone(TZ)
-                    logger.info(f"Converted time: {dt}")
-                    if not latest_timestamp or dt > latest_timestamp:
-                        latest_timestamp = dt
-                except ValueError:
-                    continue
-        
-        return latest_timestamp
-        
+        return snapshot.latest_local()
+
     except Exception as e:
         logger.error(f"Feil ved henting av siste GPS-aktivitet: {e}")
         logger.error(traceback.format_exc())
@@ -235,7 +265,7 @@ def get_gps_coordinates():
                 geometry = feature.get("geometry", {})
                 properties = feature.get("properties", {})
                 
-                if not geometry or not properties:
+                if not geometry or not properties or not is_plow_feature(feature):
                     continue
                     
                 coords = geometry.get("coordinates", [])
@@ -263,78 +293,45 @@ def get_gps_coordinates():
 
 def display_gps_data(start_date, end_date):
     """Viser siste GPS-aktivitet for brøyting."""
-    geojson_data = get_geojson_data()
+    snapshot = get_gps_snapshot()
 
     with st.expander("Siste brøyteaktivitet"):
-        if geojson_data and "features" in geojson_data:
+        if not snapshot.empty:
             try:
-                # Samle alle tidspunkt og grupper etter kjøretøy
-                vehicle_data = {}
-                for f in geojson_data.get("features", []):
-                    props = f.get("properties", {})
-                    ts = props.get("lastUpdated")
-                    coords = f.get("geometry", {}).get("coordinates", [])
-                    
-                    if coords and len(coords) >= 2:
-                        lat = coords[0] if isinstance(coords[0], (int, float)) else coords[0][0]
-                        lon = coords[1] if isinstance(coords[1], (int, float)) else coords[0][1]
-                        vehicle_id = f"Kjøretøy {round(lat, 2)}_{round(lon, 2)}"
-                    else:
-                        continue
-                    
-                    if ts:
-                        clean_ts = ts.replace('$D', '')
-                        try:
-                            dt = datetime.strptime(clean_ts, '%Y-%m-%dT%H:%M:%S.%fZ')
-                            if vehicle_id not in vehicle_data:
-                                vehicle_data[vehicle_id] = []
-                            vehicle_data[vehicle_id].append(dt)
-                        except ValueError:
-                            continue
-
-                if vehicle_data:
+                # Første og siste tidspunkt per kjøretøy
+                okter = (
+                    snapshot.to_frame()
+                    .groupby("bilnr")["ts"]
+                    .agg(["min", "max"])
+                )
+                okter["duration"] = okter["max"] - okter["min"]
+                okter = okter[okter["duration"] > pd.Timedelta(minutes=10)]
+
+                if not okter.empty:
                     # Finn den mest aktive økten
-                    longest_duration = timedelta(0)
-                    most_active = None
-                    
-                    for vehicle, timestamps in vehicle_data.items():
-                        timestamps.sort()
-                        last = timestamps[-1]
-                        first = timestamps[0]
-                        duration = last - first
-                        
-                        if duration > longest_duration and duration.seconds > 600:  # Minst 10 minutter
-                            longest_duration = duration
-                            most_active = {
-                                'vehicle': vehicle,
-                                'first': first,
-                                'last': last,
-                                'duration': duration
-                            }
-                    
-                    if most_active:
-                        hours = most_active['duration'].seconds // 3600
-                        minutes = (most_active['duration'].seconds % 3600) // 60
-                        
-                        st.markdown(
-                            f"""
-                            <div style='padding: 10px; background-color: #f0f2f6; border-radius: 10px; margin: 10px 0;'>
-                                <h3 style='margin: 0; color: #1f2937;'>🚜 Siste brøyteøkt:</h3>
-                                <p style='margin: 5px 0; color: #374151;'>
-                                    Fra: {most_active['first'].strftime('%d.%m.%Y kl. %H:%M')}<br>
-                                    Til: {most_active['last'].strftime('%d.%m.%Y kl. %H:%M')}<br>
-                                    Varighet: {hours:02d}:{minutes:02d}<br>
-                                    Rode: Hauge - Fjellbs
-                                </p>
-                            </div>
-                            """,
-                            unsafe_allow_html=True
-                        )
-                    else:
-                        st.info("Ingen aktiv brøyting funnet i perioden.")
+                    most_active = okter.loc[okter["duration"].idxmax()]
+                    first = most_active["min"].tz_convert(TZ)
+                    last = most_active["max"].tz_convert(TZ)
+                    total_minutes = int(most_active["duration"].total_seconds() // 60)
+                    hours, minutes = divmod(total_minutes, 60)
+
+                    st.markdown(
+                        f"""
+                        <div style='padding: 10px; background-color: #f0f2f6; border-radius: 10px; margin: 10px 0;'>
+                            <h3 style='margin: 0; color: #1f2937;'>🚜 Siste brøyteøkt:</h3>
+                            <p style='margin: 5px 0; color: #374151;'>
+                                Fra: {first.strftime('%d.%m.%Y kl. %H:%M')}<br>
+                                Til: {last.strftime('%d.%m.%Y kl. %H:%M')}<br>
+                                Varighet: {hours:02d}:{minutes:02d}<br>
+                                Rode: Hauge - Fjellbs
+                            </p>
+                        </div>
+                        """,
+                        unsafe_allow_html=True
+                    )
                 else:
-                    st.info("Ingen brøyteaktivitet registrert.")
-                    
+                    st.info("Ingen aktiv brøyting funnet i perioden.")
+
             except Exception as e:
                 logger.error(f"Feil ved visning av brøytedata: {e}")
                 st.error("Kunne ikke vise brøytedata.")
@@ -344,26 +341,9 @@ def display_gps_data(start_date, end_date):
 def display_last_activity():
     """Viser siste brøyteaktivitet."""
     try:
-        geojson_data = get_geojson_data()
-        if not geojson_data or "features" not in geojson_data:
-            return None
-            
-        # Finn bare siste tidspunkt
-        latest_timestamp = None
-        for feature in geojson_data.get("features", []):
-            ts = feature.get("properties", {}).get("lastUpdated")
-            if ts:
-                clean_ts = ts.replace('$D', '')
-                try:
-                    # Parse til UTC først
-                    dt = datetime.strptime(clean_ts, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=ZoneInfo('UTC'))
-                    # Konverter til Oslo-tid
-                    dt = dt.astimezone(TZ)
-                    if not latest_timestamp or dt > latest_timestamp:
-                        latest_timestamp = dt
-                except ValueError:
-                    continue
-        
+        snapshot = get_gps_snapshot()
+        latest_timestamp = snapshot.latest_local()
+
         if latest_timestamp:
             st.markdown(
                 f"""
@@ -405,7 +385,7 @@ def print_gps_debug():
     print("\n=== GPS DATA DEBUG ===")
     
     try:
-        url = "https://plowman-new.xn--snbryting-m8ac.net/nb/share/Y3VzdG9tZXItMTM="
+        url = PLOWMAN_SHARE_URL
         print(f"\nHenter data fra: {url}")
         
         response = requests.get(url)
@@ -468,14 +448,8 @@ def parse_geojson(data: Dict) -> List[Dict]:
     return løyper
 
 def get_latest_plowing_time(geojson_data):
-    latest_timestamp = None
-    for feature in geojson_data.get('features', []):
-        timestamp = feature.get('properties', {}).get('lastUpdated')
-        print(f"Fant tidspunkt: {timestamp}")  # Debug print
-        if timestamp:
-            clean_timestamp = timestamp.replace('$D', '')
-            print(f"Renset tidspunkt: {clean_timestamp}")  # Debug print
-            if not latest_timestamp or clean_timestamp > latest_timestamp:
-                latest_timestamp = clean_timestamp
-                print(f"Nytt siste tidspunkt: {latest_timestamp}")  # Debug print
-    return latest_timestamp
+    """Returnerer nyeste lastUpdated (UTC) i GeoJSON-dataene som ISO-streng."""
+    latest = build_gps_snapshot(geojson_data).latest
+    if latest is None:
+        return None
+    return latest.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
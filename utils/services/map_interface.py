@@ -2,21 +2,33 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from typing import List, Optional, Dict, Tuple
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+import streamlit as st
 
 from utils.core.config import (
+    DATE_FORMATS,
     safe_to_datetime,
     format_date,
     get_current_time,
     TZ
 )
 from utils.core.logging_config import get_logger
-from utils.services.customer_utils import get_cabin_coordinates
+from utils.db.db_utils import get_data_version
+from utils.services.customer_utils import get_cabin_coordinates, get_cabin_coordinates_df, get_rode
+from utils.services.occupancy_utils import BookingIntervalIndex
 from utils.core.models import MapBooking, GREEN, RED, GRAY
 
 logger = get_logger(__name__)
 
+# Kartstørrelse i piksler som zoom for et utsnitt beregnes for
+VIEWPORT_WIDTH_PX = 700
+VIEWPORT_HEIGHT_PX = 600
+VIEWPORT_PADDING_ZOOM = 0.3
+VIEWPORT_MIN_ZOOM = 10
+VIEWPORT_MAX_ZOOM = 17
+
 @dataclass
 class MapConfig:
     """Konfigurasjon for kartvisning"""
@@ -61,6 +73,249 @@ class MapConfig:
             "height": 600
         }
 
+# Markørstiler per kategori for tunkartene (rekkefølgen er tegnerekkefølgen)
+TUNKART_STYLES = {
+    "annual": {"name": "Årsabonnement", "color": "blue", "size": 15, "opacity": 0.8},
+    "weekly": {"name": "Ukentlig ved bestilling", "color": "red", "size": 15, "opacity": 0.8},
+    "inactive": {"name": "Ingen bestilling", "color": "gray", "size": 15, "opacity": 0.5},
+}
+
+# Samme kategorier med fargene fra MapBooking.get_marker_style
+MAPBOOKING_STYLES = {
+    "inactive": {"name": "Ingen aktiv bestilling", "color": GRAY, "size": 8, "opacity": 0.8},
+    "annual": {"name": "Årsabonnement", "color": GREEN, "size": 12, "opacity": 0.8},
+    "weekly": {"name": "Ukentlig ved bestilling", "color": RED, "size": 12, "opacity": 0.8},
+}
+
+MARKER_COLUMNS = ["customer_id", "lat", "lon", "category", "color", "size", "text", "hover"]
+
+
+def _format_date_column(series: pd.Series) -> pd.Series:
+    """Formaterer en datokolonne til dd.mm.YYYY (Oslo-tid) uten radvise kall"""
+    dates = pd.to_datetime(series, utc=True, errors="coerce").dt.tz_convert(TZ)
+    return dates.dt.strftime(DATE_FORMATS["display"]["date"])
+
+
+def build_booking_markers(
+    bookings: pd.DataFrame,
+    styles: Dict[str, dict] = TUNKART_STYLES,
+    include_idle_cabins: bool = False,
+) -> pd.DataFrame:
+    """
+    Gjør bestillinger om til kolonnevise markørdata for kartene.
+
+    Bestillingene kobles mot de cachede hyttekoordinatene, kategori (annual,
+    weekly, inactive) velges med np.select og popup-teksten bygges med
+    vektoriserte strengoperasjoner. Siste bestilling per hytte gjelder.
+
+    Args:
+        bookings: Bestillinger med customer_id, abonnement_type og eventuelt
+            ankomst_dato, avreise_dato og is_active
+        styles: Farge og størrelse per kategori
+        include_idle_cabins: Ta med hytter med rode uten bestilling som 'inactive'
+
+    Returns:
+        pd.DataFrame: Én rad per markør med kolonnene i MARKER_COLUMNS
+    """
+    coordinates = get_cabin_coordinates_df()
+    markers = pd.DataFrame(columns=MARKER_COLUMNS)
+
+    if bookings is not None and not bookings.empty:
+        df = bookings.assign(customer_id=bookings["customer_id"].astype(str))
+        df = df.drop_duplicates("customer_id", keep="last")
+        df = df.join(coordinates, on="customer_id", how="inner")
+
+        is_active = (
+            df["is_active"].fillna(True).astype(bool).to_numpy()
+            if "is_active" in df else np.ones(len(df), dtype=bool)
+        )
+        is_annual = (df["abonnement_type"] == "Årsabonnement").to_numpy()
+        category = np.select([~is_active, is_annual], ["inactive", "annual"], default="weekly")
+
+        hover = "Hytte " + df["customer_id"] + "<br>Type: " + df["abonnement_type"].astype(str)
+        for col, label in (("ankomst_dato", "Ankomst"), ("avreise_dato", "Avreise")):
+            if col in df:
+                hover = hover + ("<br>" + label + ": " + _format_date_column(df[col])).fillna("")
+
+        markers = pd.DataFrame({
+            "customer_id": df["customer_id"].to_numpy(),
+            "lat": df["lat"].to_numpy(),
+            "lon": df["lon"].to_numpy(),
+            "category": category,
+            "text": df["customer_id"].to_numpy(),
+            "hover": hover.to_numpy(),
+        })
+
+    if include_idle_cabins:
+        # Bare ekte hytter; admin-oppføringer (999, 1111-1115) står på (0, 0)
+        has_rode = coordinates.index.to_series().map(get_rode).notna().to_numpy()
+        idle = coordinates[has_rode & ~coordinates.index.isin(markers["customer_id"])]
+        ids = idle.index.to_series()
+        idle_markers = pd.DataFrame({
+            "customer_id": ids.to_numpy(),
+            "lat": idle["lat"].to_numpy(),
+            "lon": idle["lon"].to_numpy(),
+            "category": "inactive",
+            "text": ids.to_numpy(),
+            "hover": ("Hytte " + ids + "<br>Status: Ingen aktiv bestilling").to_numpy(),
+        })
+        if markers.empty:
+            markers = idle_markers
+        elif not idle_markers.empty:
+            markers = pd.concat([markers, idle_markers], ignore_index=True)
+
+    # Farge og størrelse slås opp fra stiltabellen i én operasjon per kolonne
+    categories = list(styles)
+    conditions = [markers["category"].to_numpy() == c for c in categories]
+    markers["color"] = np.select(conditions, [styles[c]["color"] for c in categories], default="gray")
+    markers["size"] = np.select(conditions, [styles[c]["size"] for c in categories], default=10)
+    return markers[MARKER_COLUMNS]
+
+
+@dataclass(frozen=True)
+class MapViewport:
+    """Avgrensning (bounding box) for et kartutsnitt"""
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+
+    @property
+    def center(self) -> Dict[str, float]:
+        return {"lat": (self.min_lat + self.max_lat) / 2, "lon": (self.min_lon + self.max_lon) / 2}
+
+    def zoom(self, width_px: int = VIEWPORT_WIDTH_PX, height_px: int = VIEWPORT_HEIGHT_PX) -> float:
+        """Største zoom (Web Mercator) der hele avgrensningen får plass"""
+        def merc_y(lat):
+            return np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+
+        lon_span = max(self.max_lon - self.min_lon, 1e-6)
+        y_span = max(merc_y(self.max_lat) - merc_y(self.min_lat), 1e-8)
+        zoom_lon = np.log2(width_px * 360.0 / (256 * lon_span))
+        zoom_lat = np.log2(height_px * 2 * np.pi / (256 * y_span))
+        zoom = min(zoom_lon, zoom_lat) - VIEWPORT_PADDING_ZOOM
+        return float(round(min(max(zoom, VIEWPORT_MIN_ZOOM), VIEWPORT_MAX_ZOOM), 2))
+
+    def to_mapbox(self) -> Dict:
+        """center og zoom til mapbox-layouten i Plotly"""
+        return {"center": self.center, "zoom": self.zoom()}
+
+
+# Standardutsnitt for Gullingen når ingen koordinater er tilgjengelige
+DEFAULT_VIEWPORT = MapViewport(59.38611, 6.41755, 59.39611, 6.43755)
+ALL_RODER = "alle"
+
+
+def compute_viewports(coordinates: pd.DataFrame) -> Dict[str, MapViewport]:
+    """
+    Avgrensning per rode og for alle hytter (nøkkel ALL_RODER).
+
+    Bare hytter som hører til en rode tas med, så admin-brukere med
+    plassholderkoordinater (0, 0) ikke drar utsnittet ut av kartet.
+
+    Args:
+        coordinates: Hyttekoordinater med customer_id som indeks (lat, lon)
+    """
+    roder = coordinates.index.to_series().map(get_rode)
+    cabins = coordinates[roder.notna().to_numpy()]
+    if cabins.empty:
+        return {ALL_RODER: DEFAULT_VIEWPORT}
+
+    bounds = cabins.groupby(roder.dropna().to_numpy()).agg(
+        min_lat=("lat", "min"), min_lon=("lon", "min"), max_lat=("lat", "max"), max_lon=("lon", "max")
+    )
+    viewports = {str(rode): MapViewport(**row) for rode, row in bounds.to_dict("index").items()}
+    viewports[ALL_RODER] = MapViewport(
+        bounds["min_lat"].min(), bounds["min_lon"].min(), bounds["max_lat"].max(), bounds["max_lon"].max()
+    )
+    return viewports
+
+
+def _coordinates_frame() -> pd.DataFrame:
+    # Leses direkte fra databasen, så utsnittet følger versjonen den caches på
+    return pd.DataFrame.from_dict(get_cabin_coordinates(), orient="index", columns=["lat", "lon"])
+
+
+@st.cache_data(ttl=3600)
+def _cached_viewports(customer_version: int) -> Dict[str, MapViewport]:
+    return compute_viewports(_coordinates_frame())
+
+
+def get_map_viewports() -> Dict[str, MapViewport]:
+    """
+    Avgrensninger per rode og totalt, cachet per versjon av customer-tabellen.
+
+    Ny versjon (enhver endring i kundene) gir ny beregning.
+    """
+    customer_version = get_data_version("customer", "customer")
+    if customer_version is None:
+        return compute_viewports(_coordinates_frame())
+    return _cached_viewports(customer_version)
+
+
+def get_map_viewport(rode: Optional[str] = None) -> MapViewport:
+    """Utsnittet for en rode, eller for alle hytter når rode er None"""
+    viewports = get_map_viewports()
+    key = ALL_RODER if rode is None else str(rode)
+    return viewports.get(key, viewports.get(ALL_RODER, DEFAULT_VIEWPORT))
+
+
+# Klynger per zoomnivå: rutenett med celler på CLUSTER_CELL_PX skjermpiksler
+CLUSTER_ZOOMS = (11, 12, 13, 14, 15, 16)
+CLUSTER_CELL_PX = 60
+# Flere markører enn dette tegnes som klynger under DETAIL_ZOOM
+MAX_INDIVIDUAL_MARKERS = 300
+DETAIL_ZOOM = CLUSTER_ZOOMS[-1] + 1
+CLUSTER_CATEGORIES = ("annual", "weekly", "inactive")
+
+
+def get_detail_zoom(n_markers: int) -> int:
+    """Laveste zoom der hver hytte tegnes for seg (0 = alltid)"""
+    return 0 if n_markers <= MAX_INDIVIDUAL_MARKERS else DETAIL_ZOOM
+
+
+def cluster_markers(markers: pd.DataFrame, zoom: int, cell_px: int = CLUSTER_CELL_PX) -> pd.DataFrame:
+    """
+    Slår sammen markører i et rutenett tilpasset zoomnivået.
+
+    Cellestørrelsen er cell_px piksler i Web Mercator ved zoom, så antall
+    klynger i et kartutsnitt holder seg omtrent konstant uansett antall hytter.
+
+    Args:
+        markers: Resultatet fra build_booking_markers
+        zoom: Zoomnivået klyngene skal gjelde for
+
+    Returns:
+        pd.DataFrame: lat, lon (snitt i klyngen), count og ett antall per
+        kategori i CLUSTER_CATEGORIES
+    """
+    columns = ["lat", "lon", "count", *CLUSTER_CATEGORIES]
+    if markers.empty:
+        return pd.DataFrame(columns=columns)
+
+    lat = markers["lat"].to_numpy(dtype=float)
+    lon = markers["lon"].to_numpy(dtype=float)
+    cell_lon = cell_px * 360.0 / (256 * 2 ** zoom)
+    cell_lat = cell_lon * np.cos(np.radians(np.nanmean(lat)))
+
+    df = pd.DataFrame({
+        "ix": np.floor(lon / cell_lon).astype(np.int64),
+        "iy": np.floor(lat / cell_lat).astype(np.int64),
+        "lat": lat,
+        "lon": lon,
+        "category": markers["category"].to_numpy(),
+    })
+    grouped = df.groupby(["ix", "iy"], sort=True)
+    clusters = grouped[["lat", "lon"]].mean()
+    clusters["count"] = grouped.size()
+    per_category = (
+        pd.crosstab([df["ix"], df["iy"]], df["category"])
+        .reindex(columns=list(CLUSTER_CATEGORIES), fill_value=0)
+    )
+    clusters = clusters.join(per_category)
+    return clusters.reset_index(drop=True)[columns]
+
+
 def prepare_bookings_for_map(bookings: pd.DataFrame) -> List[MapBooking]:
     """
     Konverterer rådata fra database til MapBooking objekter
@@ -76,28 +331,20 @@ def prepare_bookings_for_map(bookings: pd.DataFrame) -> List[MapBooking]:
             logger.info("Ingen bestillinger å forberede for kart")
             return []
             
-        map_bookings = []
-        current_time = get_current_time()
+        # Aktiv i dag etter samme definisjon som de andre oppslagene
+        index = BookingIntervalIndex(bookings)
+        active = np.zeros(len(index), dtype=bool)
+        active[index.positions_on(get_current_time().date())] = True
         
-        for _, booking in bookings.iterrows():
+        map_bookings = []
+        for booking, is_active in zip(index.bookings.to_dict("records"), active):
             try:
-                # Konverter datoer
-                arrival = safe_to_datetime(booking['ankomst_dato'])
-                departure = safe_to_datetime(booking['avreise_dato']) if pd.notna(booking['avreise_dato']) else None
-                
-                # Sjekk om bestillingen er aktiv
-                is_active = True
-                if arrival and arrival.date() > current_time.date():
-                    is_active = False
-                elif departure and departure.date() < current_time.date():
-                    is_active = False
-                
                 map_booking = MapBooking(
                     customer_id=str(booking['customer_id']),
-                    ankomst_dato=arrival,
-                    avreise_dato=departure,
+                    ankomst_dato=None if pd.isna(booking['ankomst_dato']) else booking['ankomst_dato'],
+                    avreise_dato=None if pd.isna(booking.get('avreise_dato')) else booking['avreise_dato'],
                     abonnement_type=booking['abonnement_type'],
-                    is_active=is_active
+                    is_active=bool(is_active)
                 )
                 map_bookings.append(map_booking)
                 
@@ -207,10 +454,11 @@ def create_empty_map(mapbox_token: str, title: str = None) -> go.Figure:
     """Oppretter et tomt kart med standardkonfigurasjon"""
     logger.info("Oppretter tomt kart")
     
+    viewport = get_map_viewport()
     fig = go.Figure()
     fig.add_trace(go.Scattermapbox(
-        lat=[59.39111],  # Standard breddegrad for Gullingen
-        lon=[6.42755],   # Standard lengdegrad for Gullingen
+        lat=[viewport.center["lat"]],
+        lon=[viewport.center["lon"]],
         mode='markers',
         marker=dict(size=0),
         showlegend=False
@@ -220,8 +468,7 @@ def create_empty_map(mapbox_token: str, title: str = None) -> go.Figure:
         mapbox=dict(
             accesstoken=mapbox_token,
             style='streets',
-            zoom=14,
-            center=dict(lat=59.39111, lon=6.42755)
+            **viewport.to_mapbox()
         ),
         margin=dict(l=0, r=0, t=30, b=0),
         title=title or "Tunbrøytingskart",
@@ -4,6 +4,7 @@ from datetime import datetime
 from typing import List
 
 # Third-party imports
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
@@ -17,22 +18,72 @@ from utils.core.config import (
 )
 from utils.core.logging_config import get_logger
 from utils.core.util_functions import filter_todays_bookings
-from utils.services.customer_utils import get_cabin_coordinates
-from utils.core.models import MapBooking, GREEN, RED, GRAY
+from utils.services.customer_utils import get_cabin_coordinates, get_cabin_coordinates_df
+from utils.core.models import MapBooking
 from utils.services.map_interface import (
     MapConfig,
     prepare_map_data,
     create_empty_map,
-    get_map_popup_text,
     create_default_map_config,
     debug_map_data,
-    prepare_bookings_for_map
+    prepare_bookings_for_map,
+    build_booking_markers,
+    TUNKART_STYLES,
+    MAPBOOKING_STYLES,
+    CLUSTER_CATEGORIES,
+    CLUSTER_ZOOMS,
+    cluster_markers,
+    get_detail_zoom,
+    get_map_viewport,
 )
 from utils.core.validation_utils import validate_map_data
 
 # Set up logging
 logger = get_logger(__name__)
 
+def _per_point(group: pd.DataFrame, column: str, default):
+    """Kolonneverdier per punkt, eller én verdi hvis alle er like"""
+    if column not in group:
+        return default
+    values = group[column].to_numpy()
+    return values[0] if (values == values[0]).all() else values
+
+
+def add_marker_traces(fig, markers: pd.DataFrame, styles: dict, mode: str = "markers+text"):
+    """
+    Legger til én Scattermapbox-trace per kategori i stedet for én per hytte.
+
+    Args:
+        fig: Figuren det skal tegnes i
+        markers: Markørdata fra build_booking_markers (lat, lon, category,
+            hover og eventuelt text, color og size per punkt)
+        styles: {kategori: dict(name, color, size, opacity)} i tegnerekkefølge;
+            legendgroup samler kategorier til ett lag i tegnforklaringen
+        mode: Scattermapbox-modus
+    """
+    for category, style in styles.items():
+        group = markers[markers["category"] == category]
+        if group.empty:
+            continue
+        color = _per_point(group, "color", style.get("color"))
+        size = _per_point(group, "size", style.get("size", 15))
+        fig.add_trace(go.Scattermapbox(
+            lat=group["lat"].to_numpy(),
+            lon=group["lon"].to_numpy(),
+            mode=mode,
+            marker=dict(size=size, color=color, opacity=style.get("opacity", 0.8)),
+            text=group["text"].to_numpy() if "text" in group else None,
+            textposition="top center",
+            hoverinfo="text",
+            hovertext=group["hover"].to_numpy(),
+            name=style.get("name", category),
+            showlegend=style.get("showlegend", True),
+            legendgroup=style.get("legendgroup"),
+            legendgrouptitle_text=style.get("legendgroup"),
+        ))
+    return fig
+
+
 def vis_dagens_tunkart(bestillinger, mapbox_token, title):
     """Viser kart over dagens tunbrøytinger."""
     logger.info(f"=== STARTER VIS_DAGENS_TUNKART ===")
@@ -44,18 +95,7 @@ def vis_dagens_tunkart(bestillinger, mapbox_token, title):
         if bestillinger.empty:
             return create_empty_map(mapbox_token, title)
             
-        # Konverter tuple-koordinater til dict-format
-        cabin_coordinates = get_cabin_coordinates()
-        formatted_coordinates = {}
-        for cabin_id, coords in cabin_coordinates.items():
-            formatted_coordinates[cabin_id] = {
-                'lat': coords[0],
-                'lon': coords[1]
-            }
-        
-        cabin_coordinates = formatted_coordinates
-        
-        if not cabin_coordinates:
+        if get_cabin_coordinates_df().empty:
             logger.error("Ingen koordinater funnet")
             st.error("Kunne ikke laste koordinater for hyttene")
             return None
@@ -63,48 +103,15 @@ def vis_dagens_tunkart(bestillinger, mapbox_token, title):
         # Opprett basisfigur
         fig = go.Figure()
         
-        # Legg til markører for hver hytte
-        for _, booking in bestillinger.iterrows():
-            customer_id = str(booking['customer_id'])
-            if customer_id in cabin_coordinates:
-                coords = cabin_coordinates[customer_id]
-                
-                # Bestem farge basert på abonnement_type
-                color = 'blue' if booking['abonnement_type'] == 'Årsabonnement' else 'red'
-                
-                # Lag popup-tekst
-                popup_text = f"Hytte {customer_id}<br>"
-                popup_text += f"Type: {booking['abonnement_type']}<br>"
-                if pd.notnull(booking['ankomst_dato']):
-                    popup_text += f"Ankomst: {booking['ankomst_dato'].strftime('%d.%m.%Y')}<br>"
-                if pd.notnull(booking['avreise_dato']):
-                    popup_text += f"Avreise: {booking['avreise_dato'].strftime('%d.%m.%Y')}"
-                
-                # Legg til markør på kartet
-                fig.add_trace(go.Scattermapbox(
-                    lat=[coords['lat']],
-                    lon=[coords['lon']],
-                    mode='markers+text',
-                    marker=dict(
-                        size=15,
-                        color=color,
-                        opacity=0.8
-                    ),
-                    text=[customer_id],
-                    textposition="top center",
-                    name=booking['abonnement_type'],
-                    hoverinfo='text',
-                    hovertext=[popup_text],
-                    showlegend=True
-                ))
+        # Én trace per abonnementstype
+        add_marker_traces(fig, build_booking_markers(bestillinger), TUNKART_STYLES)
         
         # Oppdater layout
         fig.update_layout(
             mapbox=dict(
                 accesstoken=mapbox_token,
                 style='streets',
-                zoom=14,
-                center=dict(lat=59.39111, lon=6.42755)
+                **get_map_viewport().to_mapbox()
             ),
             margin=dict(l=0, r=0, t=30, b=0),
             title=title or "Tunbrøytingskart",
@@ -137,58 +144,37 @@ def vis_stroingskart_kommende(bestillinger, mapbox_token, title):
         if valid_bestillinger.empty:
             raise ValueError("Ingen gyldige bestillinger med koordinater funnet")
 
-        # Konverter 'Latitude' og 'Longitude' til float
-        valid_bestillinger["Latitude"] = valid_bestillinger["Latitude"].astype(float)
-        valid_bestillinger["Longitude"] = valid_bestillinger["Longitude"].astype(float)
-
-        # Sorter bestillingene slik at dagens bestillinger kommer sist (for å være på toppen av kartet)
-        valid_bestillinger = valid_bestillinger.sort_values(
-            "dager_til", ascending=False
+        markers = pd.DataFrame({
+            "lat": valid_bestillinger["Latitude"].astype(float),
+            "lon": valid_bestillinger["Longitude"].astype(float),
+        })
+        dager_til = valid_bestillinger["dager_til"]
+        hytte = valid_bestillinger["customer_id" if "customer_id" in valid_bestillinger else "bruker"]
+        markers["category"] = np.where(dager_til == 0, "today", "upcoming")
+        markers["hover"] = (
+            "Hytte: " + hytte.astype(str)
+            + "<br>Dato: " + valid_bestillinger["onske_dato"].map(lambda d: format_date(d, 'display', 'date')).astype(str)
+            + "<br>Dager til: " + dager_til.astype(str)
         )
 
-        for _, row in valid_bestillinger.iterrows():
-            if row["dager_til"] == 0:
-                color = "red"
-                size = 12  # Litt større markør for dagens bestillinger
-            else:
-                # Beregn en gulfargetone som blir lysere jo lengre fram i tid
-                intensity = max(0, min(1, 1 - (row["dager_til"] - 1) / 6))
-                color = f"rgba(255, 255, 0, {intensity})"
-                size = 10
-
-            fig.add_trace(
-                go.Scattermapbox(
-                    lat=[row["Latitude"]],
-                    lon=[row["Longitude"]],
-                    mode="markers",
-                    marker=go.scattermapbox.Marker(size=size, color=color, opacity=0.7),
-                    text=f"Hytte: {row['bruker']}<br>Dato: {format_date(row['onske_dato'], 'display', 'date')}<br>Dager til: {row['dager_til']}",
-                    hoverinfo="text",
-                )
-            )
+        # Gulfargetone som blir lysere jo lengre fram i tid
+        upcoming = markers["category"] == "upcoming"
+        intensity = (1 - (dager_til[upcoming] - 1) / 6).clip(0, 1)
+        markers["color"] = "red"
+        markers.loc[upcoming, "color"] = "rgba(255, 255, 0, " + intensity.astype(str) + ")"
 
-        # Beregn zoom-nivå basert på spredningen av punkter
-        lat_range = (
-            valid_bestillinger["Latitude"].max() - valid_bestillinger["Latitude"].min()
-        )
-        lon_range = (
-            valid_bestillinger["Longitude"].max()
-            - valid_bestillinger["Longitude"].min()
-        )
-        zoom = min(
-            13.7, max(10, 12 - max(lat_range, lon_range) * 100)
-        )  # Juster faktorene etter behov
+        # Dagens bestillinger tegnes sist, så de ligger øverst
+        add_marker_traces(fig, markers, {
+            "upcoming": dict(name="Kommende", size=10, opacity=0.7),
+            "today": dict(name="I dag", size=12, opacity=0.7),
+        }, mode="markers")
 
         fig.update_layout(
             title=title,
             mapbox_style="streets",
             mapbox=dict(
                 accesstoken=mapbox_token,
-                center=dict(
-                    lat=valid_bestillinger["Latitude"].mean(),
-                    lon=valid_bestillinger["Longitude"].mean(),
-                ),
-                zoom=zoom,
+                **get_map_viewport().to_mapbox(),
             ),
             showlegend=False,
             height=600,
@@ -207,49 +193,24 @@ def create_map(bestillinger: pd.DataFrame, mapbox_token: str = None, title: str
         if config is None:
             config = create_default_map_config(mapbox_token)
 
-        # Hent koordinater
-        cabin_coordinates = get_cabin_coordinates()
-        if not cabin_coordinates:
+        if get_cabin_coordinates_df().empty:
             logger.error("Ingen koordinater funnet")
             return None
 
         # Opprett kart
         fig = go.Figure()
         
-        # Legg til markører for hver bestilling
-        for _, booking in bestillinger.iterrows():
-            coords = cabin_coordinates.get(str(booking['customer_id']))
-            if not coords:
-                continue
-                
-            # Bruk config.py for å generere popup tekst
-            map_booking = MapBooking(
-                customer_id=str(booking['customer_id']),
-                ankomst_dato=booking.get('ankomst_dato'),
-                avreise_dato=booking.get('avreise_dato'),
-                abonnement_type=booking['abonnement_type'],
-                is_active=booking.get('is_active', True)
-            )
-            popup_text = get_map_popup_text(map_booking)
-            
-            marker_style = map_booking.get_marker_style(config)
-            fig.add_trace(
-                go.Scattermapbox(
-                    lat=[coords['lat']],
-                    lon=[coords['lon']],
-                    mode='markers',
-                    marker=marker_style,
-                    text=[popup_text],
-                    hoverinfo='text'
-                )
-            )
+        # Markørstil som i MapBooking.get_marker_style: inaktiv, årsabonnement, ukentlig
+        add_marker_traces(
+            fig, build_booking_markers(bestillinger, MAPBOOKING_STYLES), MAPBOOKING_STYLES, mode="markers"
+        )
 
         # Konfigurer kartvisning
         fig.update_layout(
             mapbox=dict(
                 accesstoken=mapbox_token,
                 style='outdoors',
-                zoom=14
+                **get_map_viewport().to_mapbox()
             ),
             title=title,
             showlegend=False,
@@ -295,29 +256,49 @@ def display_map(bookings: List[MapBooking], config: MapConfig):
         st.error("Kunne ikke vise kart")
         return None
     
-def vis_alle_hytter_tunkart(bestillinger, mapbox_token, title):
+def add_cluster_trace(fig, clusters: pd.DataFrame, styles: dict, name: str = "Hytter (samlet)"):
+    """Tegner ferdige klynger som én trace, farget etter største kategori"""
+    counts = clusters[list(CLUSTER_CATEGORIES)].to_numpy()
+    colors = np.array([styles[c]["color"] for c in CLUSTER_CATEGORIES])[counts.argmax(axis=1)]
+    hover = clusters["count"].astype(str) + " hytter"
+    for category in CLUSTER_CATEGORIES:
+        label = styles[category]["name"]
+        hover = hover + np.where(clusters[category] > 0, f"<br>{label}: " + clusters[category].astype(str), "")
+
+    fig.add_trace(go.Scattermapbox(
+        lat=clusters["lat"],
+        lon=clusters["lon"],
+        mode="markers+text",
+        marker=dict(
+            size=(14 + 6 * np.log2(clusters["count"].to_numpy(dtype=float))).round(1),
+            color=colors,
+            opacity=0.8,
+        ),
+        text=clusters["count"].astype(str),
+        textfont=dict(color="white"),
+        hovertext=hover,
+        hoverinfo="text",
+        name=name,
+    ))
+    return fig
+
+
+def vis_alle_hytter_tunkart(bestillinger, mapbox_token, title, zoom=None, rode=None):
     """
     Viser kart over alle hytter, med fargekoding for aktive bestillinger.
     Blå: Årsabonnement
     Rød: Ukentlig ved bestilling
     Grå: Ingen aktiv bestilling
+
+    Med flere hytter enn MAX_INDIVIDUAL_MARKERS tegnes ferdige klynger for
+    zoomnivået i stedet for én markør med tekst per hytte. Med rode åpnes
+    kartet over den roden; zoom overstyrer zoomnivået i utsnittet.
     """
     logger.info(f"=== STARTER VIS_ALLE_HYTTER_TUNKART ===")
     logger.info(f"Input bestillinger: {len(bestillinger)} rader")
     
     try:
-        # Konverter tuple-koordinater til dict-format
-        cabin_coordinates = get_cabin_coordinates()
-        formatted_coordinates = {}
-        for cabin_id, coords in cabin_coordinates.items():
-            formatted_coordinates[cabin_id] = {
-                'lat': coords[0],
-                'lon': coords[1]
-            }
-        
-        cabin_coordinates = formatted_coordinates
-        
-        if not cabin_coordinates:
+        if get_cabin_coordinates_df().empty:
             logger.error("Ingen koordinater funnet")
             st.error("Kunne ikke laste koordinater for hyttene")
             return None
@@ -325,77 +306,25 @@ def vis_alle_hytter_tunkart(bestillinger, mapbox_token, title):
         # Opprett basisfigur
         fig = go.Figure()
         
-        # Lag en dict for å holde styr på hvilke hytter som er aktive
-        aktive_hytter = {}
-        
-        # Legg til markører for aktive bestillinger først
-        if not bestillinger.empty:
-            for _, booking in bestillinger.iterrows():
-                customer_id = str(booking['customer_id'])
-                if customer_id in cabin_coordinates:
-                    coords = cabin_coordinates[customer_id]
-                    
-                    # Bestem farge basert på abonnement_type
-                    color = 'blue' if booking['abonnement_type'] == 'Årsabonnement' else 'red'
-                    aktive_hytter[customer_id] = color
-                    
-                    # Lag popup-tekst
-                    popup_text = f"Hytte {customer_id}<br>"
-                    popup_text += f"Type: {booking['abonnement_type']}<br>"
-                    if pd.notnull(booking['ankomst_dato']):
-                        popup_text += f"Ankomst: {booking['ankomst_dato'].strftime('%d.%m.%Y')}<br>"
-                    if pd.notnull(booking['avreise_dato']):
-                        popup_text += f"Avreise: {booking['avreise_dato'].strftime('%d.%m.%Y')}"
-                    
-                    # Legg til markør på kartet
-                    fig.add_trace(go.Scattermapbox(
-                        lat=[coords['lat']],
-                        lon=[coords['lon']],
-                        mode='markers+text',
-                        marker=dict(
-                            size=15,
-                            color=color,
-                            opacity=0.8
-                        ),
-                        text=[customer_id],
-                        textposition="top center",
-                        name=booking['abonnement_type'],
-                        hoverinfo='text',
-                        hovertext=[popup_text],
-                        showlegend=True
-                    ))
-        
-        # Legg til inaktive hytter som grå markører
-        for cabin_id, coords in cabin_coordinates.items():
-            if cabin_id not in aktive_hytter:
-                # Lag popup-tekst for inaktiv hytte
-                popup_text = f"Hytte {cabin_id}<br>Status: Ingen aktiv bestilling"
-                
-                # Legg til markør på kartet
-                fig.add_trace(go.Scattermapbox(
-                    lat=[coords['lat']],
-                    lon=[coords['lon']],
-                    mode='markers+text',
-                    marker=dict(
-                        size=15,
-                        color='gray',
-                        opacity=0.5
-                    ),
-                    text=[cabin_id],
-                    textposition="top center",
-                    name='Ingen bestilling',
-                    hoverinfo='text',
-                    hovertext=[popup_text],
-                    showlegend=True
-                ))
+        # Aktive bestillinger (siste per hytte) og grå markører for resten
+        viewport = get_map_viewport(rode).to_mapbox()
+        if zoom is not None:
+            viewport["zoom"] = zoom
+        zoom = viewport["zoom"]
+
+        markers = build_booking_markers(bestillinger, include_idle_cabins=True)
+        if zoom < get_detail_zoom(len(markers)):
+            band = max([z for z in CLUSTER_ZOOMS if z <= zoom], default=CLUSTER_ZOOMS[0])
+            add_cluster_trace(fig, cluster_markers(markers, band), TUNKART_STYLES)
+        else:
+            add_marker_traces(fig, markers, TUNKART_STYLES)
         
         # Oppdater layout
         fig.update_layout(
             mapbox=dict(
                 accesstoken=mapbox_token,
                 style='streets',
-                zoom=14,
-                center=dict(lat=59.39111, lon=6.42755)
+                **viewport
             ),
             margin=dict(l=0, r=0, t=30, b=0),
             title=title or "Tunbrøytingskart - Alle hytter",
@@ -435,68 +364,15 @@ def ny_dagens_tunkart(bookings, mapbox_token, title="Tunbrøyting"):
         # Opprett grunnkartet
         fig = go.Figure()
         
-        # Hent koordinater for alle hytter
-        coordinates = get_cabin_coordinates()
-        
-        # Legg til markører for årsabonnement først
-        arsabo_filter = bookings["abonnement_type"] == "Årsabonnement"
-        seen_annual = False
-        for _, booking in bookings[arsabo_filter].iterrows():
-            customer_id = booking["customer_id"]
-            if customer_id in coordinates:
-                lat, lon = coordinates[customer_id]
-                
-                # Lag popup tekst
-                popup_text = f"Hytte {customer_id}<br>"
-                popup_text += f"Type: {booking['abonnement_type']}<br>"
-                
-                fig.add_trace(go.Scattermapbox(
-                    lat=[lat],
-                    lon=[lon],
-                    mode="markers+text",
-                    marker=dict(size=15, color="blue"),
-                    text=[customer_id],
-                    textposition="top center",
-                    hoverinfo="text",
-                    hovertext=[popup_text],
-                    showlegend=not seen_annual,
-                    name="Årsabonnement"
-                ))
-                seen_annual = True
-                
-        # Legg til markører for ukentlige bestillinger
-        ukentlig_filter = bookings["abonnement_type"] == "Ukentlig ved bestilling"
-        seen_weekly = False
-        for _, booking in bookings[ukentlig_filter].iterrows():
-            customer_id = booking["customer_id"]
-            if customer_id in coordinates:
-                lat, lon = coordinates[customer_id]
-                
-                # Lag popup tekst
-                popup_text = f"Hytte {customer_id}<br>"
-                popup_text += f"Type: {booking['abonnement_type']}<br>"
-                
-                fig.add_trace(go.Scattermapbox(
-                    lat=[lat],
-                    lon=[lon],
-                    mode="markers+text",
-                    marker=dict(size=15, color="red"),
-                    text=[customer_id],
-                    textposition="top center",
-                    hoverinfo="text",
-                    hovertext=[popup_text],
-                    showlegend=not seen_weekly,
-                    name="Ukentlig bestilling"
-                ))
-                seen_weekly = True
+        # Årsabonnement og ukentlige bestillinger, én trace hver
+        add_marker_traces(fig, build_booking_markers(bookings), TUNKART_STYLES)
                     
         # Konfigurer kartvisning
         fig.update_layout(
             mapbox=dict(
                 accesstoken=mapbox_token,
                 style="streets",
-                zoom=13,
-                center=dict(lat=59.389, lon=6.427)
+                **get_map_viewport().to_mapbox()
             ),
             margin=dict(l=0, r=0, t=30, b=0),
             title=title,
@@ -517,4 +393,80 @@ def ny_dagens_tunkart(bookings, mapbox_token, title="Tunbrøyting"):
     except Exception as e:
         logger.error(f"Feil i vis_dagens_tunkart: {str(e)}")
         return None
-    
\ No newline at end of file
+    
+
+def vis_broytespor_kart(tracks, mapbox_token, title="Brøytespor", zoom=14):
+    """
+    Viser brøytespor (allerede forenklet i gps_track_utils) med én linje per bil.
+
+    Args:
+        tracks: Liste med dicts (bilnr, start, end, lat, lon), én per økt
+        mapbox_token: Mapbox token
+        title: Karttittel
+        zoom: Zoomnivå sporene er forenklet for
+    """
+    try:
+        if not tracks:
+            return create_empty_map(mapbox_token, title)
+
+        fig = go.Figure()
+
+        # Slå sammen øktene per bil; None gir brudd i linja mellom øktene
+        per_vehicle = {}
+        for track in tracks:
+            lats, lons, texts = per_vehicle.setdefault(track["bilnr"], ([], [], []))
+            label = (f"{track['bilnr']}<br>{track['start'].strftime('%H:%M')}"
+                     f"–{track['end'].strftime('%H:%M')}")
+            lats.extend(list(track["lat"]) + [None])
+            lons.extend(list(track["lon"]) + [None])
+            texts.extend([label] * len(track["lat"]) + [None])
+
+        for bilnr, (lats, lons, texts) in per_vehicle.items():
+            fig.add_trace(go.Scattermapbox(
+                lat=lats,
+                lon=lons,
+                mode="lines",
+                line=dict(width=3),
+                hoverinfo="text",
+                hovertext=texts,
+                name=f"Kjøretøy {bilnr}",
+            ))
+
+        fig.update_layout(
+            mapbox=dict(
+                accesstoken=mapbox_token,
+                style="streets",
+                zoom=zoom,
+                center=get_map_viewport().center
+            ),
+            margin=dict(l=0, r=0, t=30, b=0),
+            title=title,
+            showlegend=True,
+            height=600
+        )
+
+        return fig
+
+    except Exception as e:
+        logger.error(f"Feil i vis_broytespor_kart: {str(e)}")
+        return None
+
+
+def legg_til_dekningslag(fig, dekning, name="Brøytedekning"):
+    """Legger brøytedekning (celler med antall punkter) til et kart som ett tetthetslag"""
+    if fig is None or dekning is None or dekning.empty:
+        return fig
+    fig.add_trace(go.Densitymapbox(
+        lat=dekning["lat"],
+        lon=dekning["lon"],
+        z=np.log1p(dekning["count"]),
+        radius=8,
+        colorscale="YlOrRd",
+        opacity=0.6,
+        showscale=False,
+        hoverinfo="skip",
+        name=name,
+    ))
+    # Legg dekningslaget under markørene
+    fig.data = (fig.data[-1],) + fig.data[:-1]
+    return fig
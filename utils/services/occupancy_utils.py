@@ -0,0 +1,524 @@
+# occupancy_utils.py
+# Daglig belegg av tunbestillinger. Hver bestilling blir en start- og en
+# slutthendelse på en dagsakse. Antallet aktive per dag er den kumulative
+# summen av hendelsene, så hele perioden regnes ut i ett sveip i stedet for
+# én filtrering av alle bestillinger per dag.
+#
+# BookingIntervalIndex svarer på "hvilke bestillinger er aktive på dag D /
+# i perioden A-B" med binærsøk i sorterte start- og sluttdager.
+#
+# occupancy_day er det samme belegget materialisert per dag og rode. Tabellen
+# oppdateres av skrivefunksjonene for bestillinger i samme transaksjon, og
+# bygges på nytt fra bestillingene én gang per prosess ved oppstart.
+# Gjentakende bestillinger (recurrence_utils) legges til ved lesing, bare for
+# perioden det spørres om.
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.core.config import TZ, get_date_format
+from utils.core.logging_config import get_logger
+from utils.db.db_utils import get_db_connection
+from utils.services.customer_utils import get_rode
+from utils.services.recurrence_utils import gjentakende_bestillinger
+
+logger = get_logger(__name__)
+
+ANNUAL = "Årsabonnement"
+UKJENT_RODE = "ukjent"
+
+# Klokkeslett etterfulgt av Z eller UTC-forskyvning, f.eks. 00:00:00+01:00
+AWARE_PATTERN = r"\d{2}:\d{2}(?::[\d.]+)?\s*(?:Z|[+-]\d{2}:?\d{2})$"
+
+DateLike = Union[date, datetime, pd.Timestamp]
+
+
+def to_local_timestamps(values: pd.Series) -> pd.Series:
+    """
+    Gjør datoverdier om til tidspunkter i norsk tid.
+
+    Tar imot strenger, naive og tidssonebevisste tidspunkter. Naive verdier
+    tolkes som norsk tid, slik safe_to_datetime gjør.
+
+    Returns:
+        pd.Series: datetime64 med tidssone TZ, NaT for manglende eller ugyldige verdier
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        parsed = values if values.dt.tz is not None else _localize_naive(values)
+    else:
+        # Verdier med tidssone og naive verdier tolkes hver for seg
+        text = values.astype("string")
+        aware = text.str.contains(AWARE_PATTERN, na=False).to_numpy(dtype=bool)
+        parsed = pd.Series(pd.NaT, index=values.index, dtype=f"datetime64[ns, {TZ.key}]")
+        if aware.any():
+            parsed[aware] = pd.to_datetime(
+                text[aware], utc=True, errors="coerce", format="mixed"
+            ).dt.tz_convert(TZ)
+        if (~aware).any():
+            parsed[~aware] = _localize_naive(
+                pd.to_datetime(text[~aware], errors="coerce", format="mixed")
+            )
+    return parsed.dt.tz_convert(TZ)
+
+
+def to_local_days(values: pd.Series) -> np.ndarray:
+    """
+    Gjør datoverdier om til lokale kalenderdager.
+
+    Returns:
+        np.ndarray: datetime64[D], NaT for manglende eller ugyldige verdier
+    """
+    local = to_local_timestamps(values).dt.tz_localize(None)
+    return local.to_numpy(dtype="datetime64[D]")
+
+
+def _localize_naive(values: pd.Series) -> pd.Series:
+    return values.dt.tz_localize(TZ, ambiguous="NaT", nonexistent="shift_forward")
+
+
+def _day(value: DateLike) -> np.datetime64:
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(TZ)
+        value = value.date()
+    return np.datetime64(value, "D")
+
+
+def compute_daily_occupancy(
+    bookings: pd.DataFrame, start_date: DateLike, end_date: DateLike
+) -> pd.DataFrame:
+    """
+    Antall aktive tunbestillinger per dag, fordelt på årsabonnement og ukentlig.
+
+    Ukentlige bestillinger er aktive på ankomstdagen. Årsabonnement er aktive
+    fra ankomst til og med avreise, eller ut perioden uten avreise.
+
+    Returns:
+        pd.DataFrame: df_aktivitet med én rad per dag og kolonnene
+        dato_str, årsabonnement og ukentlig
+    """
+    start, end = _day(start_date), _day(end_date)
+    dato_range = pd.date_range(start=pd.Timestamp(start), end=pd.Timestamp(end), freq="D")
+    n_days = len(dato_range)
+
+    annual_counts = np.zeros(n_days, dtype=np.int64)
+    weekly_counts = np.zeros(n_days, dtype=np.int64)
+
+    if n_days and bookings is not None and not bookings.empty:
+        ankomst = to_local_days(bookings["ankomst_dato"])
+        valid = ~np.isnat(ankomst)
+        first = (ankomst - start).astype("timedelta64[D]").astype(np.int64)
+        is_annual = (bookings["abonnement_type"] == ANNUAL).to_numpy()
+
+        # Ukentlige: ett punkt på ankomstdagen
+        weekly = valid & ~is_annual & (first >= 0) & (first < n_days)
+        weekly_counts = np.bincount(first[weekly], minlength=n_days)
+
+        # Årsabonnement: +1 første dag, -1 dagen etter siste dag, så kumulativ sum
+        if "avreise_dato" in bookings.columns:
+            avreise = to_local_days(bookings["avreise_dato"])
+        else:
+            avreise = np.full(len(bookings), np.datetime64("NaT"), dtype="datetime64[D]")
+        open_ended = np.isnat(avreise)
+        last = np.where(
+            open_ended,
+            n_days - 1,
+            (np.where(open_ended, start, avreise) - start).astype("timedelta64[D]").astype(np.int64),
+        )
+        begin = np.maximum(first, 0)
+        stop = np.minimum(last, n_days - 1)
+        annual = valid & is_annual & (begin <= stop) & (begin < n_days) & (stop >= 0)
+
+        events = np.zeros(n_days + 1, dtype=np.int64)
+        np.add.at(events, begin[annual], 1)
+        np.add.at(events, stop[annual] + 1, -1)
+        annual_counts = np.cumsum(events[:-1])
+
+    return _activity_frame(dato_range, annual_counts, weekly_counts)
+
+
+@dataclass
+class TunStatistikk:
+    """Resultatet av compute_tun_statistics; kan caches med st.cache_data"""
+    totalt: int
+    per_abonnement: Dict[str, int]
+    daglig: pd.DataFrame
+    per_rode: pd.DataFrame
+
+
+def compute_tun_statistics(
+    bookings: pd.DataFrame, start_date: DateLike, end_date: DateLike
+) -> TunStatistikk:
+    """
+    Statistikk for tunbestillingene i perioden, regnet ut i ett sveip.
+
+    Datoene gjøres om til dagnummer én gang. Ankomster og avreiser telles med
+    bincount, og aktive bestillinger per rode med en kumulativ sum over
+    start- og slutthendelser per rode. Aktiv betyr det samme som i
+    compute_daily_occupancy.
+
+    Returns:
+        TunStatistikk: daglig har kolonnene dato_str, ankomster, avreiser,
+        årsabonnement, ukentlig og aktive; per_rode har aktive per dag og rode
+    """
+    start, end = _day(start_date), _day(end_date)
+    dato_range = pd.date_range(start=pd.Timestamp(start), end=pd.Timestamp(end), freq="D")
+    n_days = len(dato_range)
+
+    if bookings is None or bookings.empty:
+        bookings = pd.DataFrame(columns=["customer_id", "ankomst_dato", "avreise_dato", "abonnement_type"])
+    ankomst = to_local_days(bookings["ankomst_dato"])
+    if "avreise_dato" in bookings.columns:
+        avreise = to_local_days(bookings["avreise_dato"])
+    else:
+        avreise = np.full(len(bookings), np.datetime64("NaT"), dtype="datetime64[D]")
+    is_annual = (bookings["abonnement_type"] == ANNUAL).to_numpy(dtype=bool)
+    rode_codes, roder = pd.factorize(
+        bookings["customer_id"].map(get_rode).fillna(UKJENT_RODE), sort=True
+    )
+    n_roder = len(roder)
+
+    valid = ~np.isnat(ankomst)
+    has_end = valid & ~np.isnat(avreise)
+    has_end[has_end] = avreise[has_end] >= ankomst[has_end]
+    first = np.where(valid, _offsets(np.where(valid, ankomst, start), start), -1)
+    last = np.where(has_end, _offsets(np.where(has_end, avreise, start), start), n_days - 1)
+
+    def per_day(offsets: np.ndarray) -> np.ndarray:
+        inside = (offsets >= 0) & (offsets < n_days)
+        return np.bincount(offsets[inside], minlength=n_days)
+
+    ankomster = per_day(first[valid])
+    avreiser = per_day(last[has_end])
+
+    # Ukentlige: ett punkt på ankomstdagen, per rode
+    weekly = valid & ~is_annual & (first >= 0) & (first < n_days)
+    weekly_rode = np.bincount(
+        rode_codes[weekly] * n_days + first[weekly], minlength=n_roder * n_days
+    ).reshape(n_roder, n_days)
+
+    # Årsabonnement: +1 første dag og -1 dagen etter siste, per rode
+    begin = np.maximum(first, 0)
+    stop = np.minimum(last, n_days - 1)
+    annual = (
+        valid & is_annual & (np.isnat(avreise) | has_end)
+        & (begin <= stop) & (begin < n_days) & (stop >= 0)
+    )
+    events = np.zeros((n_roder, n_days + 1), dtype=np.int64)
+    np.add.at(events, (rode_codes[annual], begin[annual]), 1)
+    np.add.at(events, (rode_codes[annual], stop[annual] + 1), -1)
+    annual_rode = np.cumsum(events[:, :-1], axis=1)
+
+    annual_counts = annual_rode.sum(axis=0)
+    weekly_counts = weekly_rode.sum(axis=0)
+    daglig = _activity_frame(dato_range, annual_counts, weekly_counts)
+    daglig.insert(1, "ankomster", ankomster)
+    daglig.insert(2, "avreiser", avreiser)
+    daglig["aktive"] = annual_counts + weekly_counts
+
+    return TunStatistikk(
+        totalt=len(bookings),
+        per_abonnement={k: int(v) for k, v in bookings["abonnement_type"].value_counts().items()},
+        daglig=daglig,
+        per_rode=pd.DataFrame(
+            (annual_rode + weekly_rode).T, index=dato_range, columns=list(roder)
+        ),
+    )
+
+
+def _activity_frame(dato_range: pd.DatetimeIndex, annual_counts, weekly_counts) -> pd.DataFrame:
+    df_aktivitet = pd.DataFrame(
+        {"årsabonnement": annual_counts, "ukentlig": weekly_counts}, index=dato_range
+    )
+    df_aktivitet.insert(0, "dato_str", dato_range.strftime(get_date_format("display", "short_date")))
+    return df_aktivitet
+
+
+def _offsets(days: np.ndarray, origin: np.datetime64) -> np.ndarray:
+    return (days - origin).astype("timedelta64[D]").astype(np.int64)
+
+
+class BookingIntervalIndex:
+    """
+    Intervallindeks over tunbestillinger for oppslag på aktive bestillinger.
+
+    Ukentlige bestillinger er aktive på ankomstdagen, årsabonnement fra ankomst
+    til og med avreise, eller uten slutt når avreise mangler. Bestillingene
+    deles i enkeltdager, åpne årsabonnement og årsabonnement med avreise, hver
+    sortert på startdag. Et oppslag er binærsøk i hver gruppe pluss treffene;
+    for årsabonnement med avreise søkes det bakover med lengste varighet.
+
+    Datokolonnene i `bookings` er gjort om til norsk tid. Rammen deles mellom
+    oppslag og skal ikke endres; oppslagene returnerer kopier.
+    """
+
+    def __init__(self, bookings: pd.DataFrame):
+        self.bookings = bookings.copy()
+        n = len(self.bookings)
+        if n and "ankomst_dato" in self.bookings.columns:
+            for col in ["ankomst_dato", "avreise_dato"]:
+                if col in self.bookings.columns:
+                    self.bookings[col] = to_local_timestamps(self.bookings[col])
+            start = to_local_days(self.bookings["ankomst_dato"])
+            if "avreise_dato" in self.bookings.columns:
+                end = to_local_days(self.bookings["avreise_dato"])
+            else:
+                end = np.full(n, np.datetime64("NaT"), dtype="datetime64[D]")
+            is_annual = (self.bookings["abonnement_type"] == ANNUAL).to_numpy()
+        else:
+            start = end = np.array([], dtype="datetime64[D]")
+            is_annual = np.array([], dtype=bool)
+
+        valid = ~np.isnat(start)
+        open_ended = np.isnat(end)
+        groups = {
+            "single": (valid & ~is_annual, start),
+            "open": (valid & is_annual & open_ended, start),
+            "closed": (valid & is_annual & ~open_ended & (end >= start), end),
+        }
+        self._groups = {}
+        for name, (mask, last) in groups.items():
+            positions = np.flatnonzero(mask)
+            order = np.argsort(start[positions], kind="stable")
+            positions = positions[order]
+            self._groups[name] = (start[positions], last[positions], positions)
+
+        closed_start, closed_end, _ = self._groups["closed"]
+        self._max_span = (
+            (closed_end - closed_start).max() if len(closed_start) else np.timedelta64(0, "D")
+        )
+
+    def __len__(self) -> int:
+        return len(self.bookings)
+
+    def positions_between(self, start_date: DateLike, end_date: DateLike) -> np.ndarray:
+        """Radposisjoner for bestillinger aktive minst én dag i perioden, i opprinnelig rekkefølge"""
+        first, last = _day(start_date), _day(end_date)
+        hits = []
+
+        starts, _, positions = self._groups["single"]
+        lo = np.searchsorted(starts, first, side="left")
+        hi = np.searchsorted(starts, last, side="right")
+        hits.append(positions[lo:hi])
+
+        starts, _, positions = self._groups["open"]
+        hits.append(positions[:np.searchsorted(starts, last, side="right")])
+
+        starts, ends, positions = self._groups["closed"]
+        lo = np.searchsorted(starts, first - self._max_span, side="left")
+        hi = np.searchsorted(starts, last, side="right")
+        hits.append(positions[lo:hi][ends[lo:hi] >= first])
+
+        return np.sort(np.concatenate(hits))
+
+    def positions_on(self, day: DateLike) -> np.ndarray:
+        return self.positions_between(day, day)
+
+    def active_on(self, day: DateLike) -> pd.DataFrame:
+        """Bestillinger som er aktive på dagen"""
+        return self.bookings.iloc[self.positions_on(day)].copy()
+
+    def active_between(self, start_date: DateLike, end_date: DateLike) -> pd.DataFrame:
+        """Bestillinger som er aktive minst én dag i perioden"""
+        return self.bookings.iloc[self.positions_between(start_date, end_date)].copy()
+
+
+# --- Materialisert belegg (occupancy_day / occupancy_open) ---
+
+UPSERT_OCCUPANCY_DAY = """
+    INSERT INTO occupancy_day (date, rode, annual_count, weekly_count) VALUES (?, ?, ?, ?)
+    ON CONFLICT(date, rode) DO UPDATE SET
+        annual_count = annual_count + excluded.annual_count,
+        weekly_count = weekly_count + excluded.weekly_count
+"""
+UPSERT_OCCUPANCY_OPEN = """
+    INSERT INTO occupancy_open (start_date, rode, annual_count) VALUES (?, ?, ?)
+    ON CONFLICT(start_date, rode) DO UPDATE SET
+        annual_count = annual_count + excluded.annual_count
+"""
+
+
+def occupancy_rows(bookings: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Bestillingenes bidrag til belegget, per dag og rode.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: (dager, åpne) der dager har kolonnene
+        date, rode, annual_count, weekly_count og åpne har start_date, rode,
+        annual_count for årsabonnement uten avreise
+    """
+    start = to_local_days(bookings["ankomst_dato"])
+    if "avreise_dato" in bookings.columns:
+        end = to_local_days(bookings["avreise_dato"])
+    else:
+        end = np.full(len(bookings), np.datetime64("NaT"), dtype="datetime64[D]")
+    annual = (bookings["abonnement_type"] == ANNUAL).to_numpy()
+    rode = bookings["customer_id"].map(get_rode).fillna(UKJENT_RODE).to_numpy(dtype=object)
+
+    valid = ~np.isnat(start)
+    open_ended = valid & annual & np.isnat(end)
+    closed = valid & annual & ~np.isnat(end)
+    closed[closed] = end[closed] >= start[closed]
+    spans = np.flatnonzero(closed | (valid & ~annual))
+
+    # Én rad per dag bestillingen er aktiv: ukentlige én dag, årsabonnement ankomst til avreise
+    lengths = np.where(closed[spans], _offsets(end[spans], start[spans]), 0) + 1
+    owner = np.repeat(spans, lengths)
+    offsets = np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    days = pd.DataFrame({
+        "date": (start[owner] + offsets.astype("timedelta64[D]")).astype(str),
+        "rode": rode[owner],
+        "annual_count": annual[owner].astype(np.int64),
+        "weekly_count": (~annual[owner]).astype(np.int64),
+    }).groupby(["date", "rode"], as_index=False).sum()
+
+    open_rows = pd.DataFrame({
+        "start_date": start[open_ended].astype(str),
+        "rode": rode[open_ended],
+        "annual_count": np.ones(int(open_ended.sum()), dtype=np.int64),
+    }).groupby(["start_date", "rode"], as_index=False).sum()
+    return days, open_rows
+
+
+def apply_occupancy(cursor, bookings: pd.DataFrame, sign: int) -> None:
+    """
+    Legger til (sign=1) eller trekker fra (sign=-1) bestillingene i belegget.
+
+    Kalles med samme cursor som endrer bestillingene, inne i transaksjonen.
+    """
+    if bookings.empty:
+        return
+    days, open_rows = occupancy_rows(bookings)
+    if not days.empty:
+        cursor.executemany(UPSERT_OCCUPANCY_DAY, [
+            (row.date, row.rode, sign * int(row.annual_count), sign * int(row.weekly_count))
+            for row in days.itertuples(index=False)
+        ])
+        cursor.execute(
+            "DELETE FROM occupancy_day WHERE date BETWEEN ? AND ? "
+            "AND annual_count = 0 AND weekly_count = 0",
+            (days["date"].min(), days["date"].max()),
+        )
+    if not open_rows.empty:
+        cursor.executemany(UPSERT_OCCUPANCY_OPEN, [
+            (row.start_date, row.rode, sign * int(row.annual_count))
+            for row in open_rows.itertuples(index=False)
+        ])
+        cursor.execute("DELETE FROM occupancy_open WHERE annual_count = 0")
+
+
+def apply_booking_occupancy(cursor, booking: Dict[str, Any], sign: int) -> None:
+    """Legger til eller trekker fra én bestilling i belegget, se apply_occupancy"""
+    apply_occupancy(cursor, pd.DataFrame([booking]), sign)
+
+
+def rebuild_occupancy() -> bool:
+    """
+    Bygger belegget på nytt fra alle bestillinger, i én transaksjon.
+
+    Bestillingene leses etter BEGIN IMMEDIATE, så ingen skriving kan komme
+    mellom lesingen og det nye belegget.
+    """
+    try:
+        with get_db_connection("tunbroyting") as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            bookings = pd.read_sql_query(
+                "SELECT customer_id, ankomst_dato, avreise_dato, abonnement_type "
+                "FROM tunbroyting_bestillinger",
+                conn,
+            )
+            days, open_rows = occupancy_rows(bookings)
+            cursor.execute("DELETE FROM occupancy_day")
+            cursor.execute("DELETE FROM occupancy_open")
+            cursor.executemany(UPSERT_OCCUPANCY_DAY, days.itertuples(index=False, name=None))
+            cursor.executemany(UPSERT_OCCUPANCY_OPEN, open_rows.itertuples(index=False, name=None))
+            cursor.execute("COMMIT")
+        logger.info(f"Belegg bygget på nytt: {len(days)} dager per rode, {len(open_rows)} åpne")
+        return True
+    except Exception as e:
+        logger.error(f"Feil ved oppbygging av belegg: {str(e)}", exc_info=True)
+        return False
+
+
+@st.cache_resource
+def _rebuild_occupancy_once() -> bool:
+    if not rebuild_occupancy():
+        # Unntak caches ikke, så neste sesjon prøver igjen
+        raise RuntimeError("Kunne ikke bygge belegget på nytt")
+    return True
+
+
+def rebuild_occupancy_once() -> bool:
+    """Bygger belegget på nytt ved første kall i prosessen, ikke per sesjon"""
+    try:
+        return _rebuild_occupancy_once()
+    except RuntimeError as e:
+        logger.warning(str(e))
+        return False
+
+
+def get_occupancy(start_date: DateLike, end_date: DateLike) -> pd.DataFrame:
+    """
+    Belegg per dag og rode i perioden, lest fra de materialiserte tabellene
+    og forekomstene av gjentakende bestillinger.
+
+    Returns:
+        pd.DataFrame: date (datetime64), rode, annual_count og weekly_count,
+        én rad per dag og rode med minst én aktiv bestilling
+    """
+    columns = ["date", "rode", "annual_count", "weekly_count"]
+    try:
+        start, end = _day(start_date), _day(end_date)
+        with get_db_connection("tunbroyting") as conn:
+            days = pd.read_sql_query(
+                "SELECT date, rode, annual_count, weekly_count FROM occupancy_day "
+                "WHERE date BETWEEN ? AND ?",
+                conn,
+                params=(str(start), str(end)),
+            )
+            open_rows = pd.read_sql_query(
+                "SELECT start_date, rode, annual_count FROM occupancy_open "
+                "WHERE start_date <= ? ORDER BY start_date",
+                conn,
+                params=(str(end),),
+            )
+
+        # Gjentakende bestillinger er ikke materialisert; utvides bare for perioden
+        gjentakende = gjentakende_bestillinger(start.item(), end.item())
+        frames = [days, occupancy_rows(gjentakende)[0]] if not gjentakende.empty else [days]
+        if not open_rows.empty:
+            # Åpne årsabonnement teller fra startdagen og utover
+            dates = np.arange(start, end + np.timedelta64(1, "D"))
+            for rode, group in open_rows.groupby("rode"):
+                starts = group["start_date"].to_numpy(dtype="datetime64[D]")
+                active = np.concatenate([[0], np.cumsum(group["annual_count"].to_numpy())])
+                counts = active[np.searchsorted(starts, dates, side="right")]
+                frames.append(pd.DataFrame({
+                    "date": dates.astype(str), "rode": rode, "annual_count": counts, "weekly_count": 0,
+                }))
+        occupancy = pd.concat(frames, ignore_index=True).groupby(["date", "rode"], as_index=False).sum()
+        occupancy = occupancy[(occupancy["annual_count"] > 0) | (occupancy["weekly_count"] > 0)]
+        occupancy["date"] = pd.to_datetime(occupancy["date"])
+        return occupancy.reset_index(drop=True)[columns]
+
+    except Exception as e:
+        logger.error(f"Feil ved henting av belegg: {str(e)}", exc_info=True)
+        return pd.DataFrame(columns=columns)
+
+
+def get_daily_occupancy(start_date: DateLike, end_date: DateLike) -> pd.DataFrame:
+    """Aktivitetsgrafens df_aktivitet, summert over rodene i occupancy_day"""
+    start, end = _day(start_date), _day(end_date)
+    dato_range = pd.date_range(start=pd.Timestamp(start), end=pd.Timestamp(end), freq="D")
+    totals = (
+        get_occupancy(start, end)
+        .groupby("date")[["annual_count", "weekly_count"]].sum()
+        .reindex(dato_range, fill_value=0)
+    )
+    return _activity_frame(dato_range, totals["annual_count"].to_numpy(), totals["weekly_count"].to_numpy())
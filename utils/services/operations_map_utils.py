@@ -0,0 +1,172 @@
+# operations_map_utils.py
+# Driftskart for administratorer. Tunbestillinger, kommende strøingsbestillinger
+# og siste GPS-snapshot hentes samtidig. Hyttene fra begge bestillingstypene
+# kobles mot koordinatene i én operasjon, og alt tegnes som lag i én figur.
+# Lagene kan slås av og på i tegnforklaringen.
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from utils.core.config import format_date, get_current_time
+from utils.core.logging_config import get_logger
+from utils.core.util_functions import filter_todays_bookings
+from utils.services.customer_utils import get_cabin_coordinates_df
+from utils.services.gps_utils import GpsSnapshot, get_gps_snapshot
+from utils.services.map_interface import TUNKART_STYLES, get_map_viewport
+from utils.services.map_utils import add_marker_traces
+from utils.services.stroing_utils import hent_stroing_bestillinger
+from utils.services.tun_utils import hent_aktive_bestillinger_for_dag
+
+logger = get_logger(__name__)
+
+STROING_DAYS_AHEAD = 7
+
+# Lagnavn i tegnforklaringen
+LAYER_TUN = "Tunbrøyting i dag"
+LAYER_STROING = "Strøing kommende uke"
+LAYER_GPS = "Brøytespor (siste GPS)"
+
+STROING_STYLES = {
+    "stroing_today": {"name": "Strøing i dag", "color": "orange", "size": 13, "opacity": 0.8,
+                      "legendgroup": LAYER_STROING},
+    "stroing_upcoming": {"name": "Strøing kommende", "color": "gold", "size": 11, "opacity": 0.7,
+                         "legendgroup": LAYER_STROING},
+}
+TUN_STYLES = {
+    category: {**TUNKART_STYLES[category], "legendgroup": LAYER_TUN}
+    for category in ("annual", "weekly")
+}
+
+
+@dataclass
+class OperationsData:
+    """Rådata for driftskartet, hentet samtidig"""
+    bookings: pd.DataFrame
+    stroing: pd.DataFrame
+    gps: GpsSnapshot
+
+
+def fetch_operations_data() -> OperationsData:
+    """Henter dagens tunbestillinger, strøingsbestillinger og GPS-snapshot parallelt"""
+    ctx = get_script_run_ctx()
+
+    def attach_ctx():
+        # Gir trådene Streamlit-konteksten, så st.cache_data virker som vanlig
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+
+    with ThreadPoolExecutor(max_workers=3, initializer=attach_ctx) as executor:
+        bookings = executor.submit(hent_aktive_bestillinger_for_dag, get_current_time().date())
+        stroing = executor.submit(hent_stroing_bestillinger)
+        gps = executor.submit(get_gps_snapshot)
+        return OperationsData(bookings.result(), stroing.result(), gps.result())
+
+
+def _upcoming_stroing(stroing: pd.DataFrame, days: int = STROING_DAYS_AHEAD) -> pd.DataFrame:
+    if stroing.empty:
+        return stroing
+    today = get_current_time().date()
+    onske = pd.to_datetime(stroing["onske_dato"]).dt.date
+    mask = (onske >= today) & (onske <= today + timedelta(days=days))
+    return stroing[mask].assign(dager_til=(pd.to_datetime(onske[mask]) - pd.Timestamp(today)).dt.days)
+
+
+def build_operations_points(data: OperationsData) -> pd.DataFrame:
+    """
+    Tun- og strøingspunkter med koordinater fra én felles kobling.
+
+    Returns:
+        pd.DataFrame: customer_id, lat, lon, category, text og hover
+    """
+    tun = filter_todays_bookings(data.bookings)
+    stroing = _upcoming_stroing(data.stroing)
+
+    frames = []
+    if not tun.empty:
+        frames.append(pd.DataFrame({
+            "customer_id": tun["customer_id"].astype(str).to_numpy(),
+            "category": np.where(tun["abonnement_type"] == "Årsabonnement", "annual", "weekly"),
+            "detail": ("Type: " + tun["abonnement_type"].astype(str)).to_numpy(),
+        }))
+    if not stroing.empty:
+        frames.append(pd.DataFrame({
+            "customer_id": stroing["customer_id"].astype(str).to_numpy(),
+            "category": np.where(stroing["dager_til"] == 0, "stroing_today", "stroing_upcoming"),
+            "detail": ("Strøing: " + pd.to_datetime(stroing["onske_dato"]).dt.strftime("%d.%m.%Y")).to_numpy(),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=["customer_id", "category", "lat", "lon", "text", "hover"])
+
+    points = pd.concat(frames, ignore_index=True)
+    # Én kobling mot hyttekoordinatene for alle lagene
+    points = points.join(get_cabin_coordinates_df(), on="customer_id", how="inner")
+    points["text"] = points["customer_id"]
+    points["hover"] = "Hytte " + points["customer_id"] + "<br>" + points["detail"]
+    return points.drop(columns="detail").reset_index(drop=True)
+
+
+def _add_gps_layer(fig: go.Figure, snapshot: GpsSnapshot) -> None:
+    """Siste GPS-punkter som én linje-trace, brutt mellom bilene"""
+    points = snapshot.to_frame().dropna(subset=["lat", "lon"])
+    if points.empty:
+        return
+    points = points.sort_values(["bilnr", "ts"], kind="stable")
+    # NaN mellom bilene gir brudd i linjen
+    breaks = np.flatnonzero(points["bilnr"].to_numpy()[1:] != points["bilnr"].to_numpy()[:-1]) + 1
+    lat = np.insert(points["lat"].to_numpy(dtype=float), breaks, np.nan)
+    lon = np.insert(points["lon"].to_numpy(dtype=float), breaks, np.nan)
+    fig.add_trace(go.Scattermapbox(
+        lat=lat,
+        lon=lon,
+        mode="lines",
+        line=dict(width=3, color="rgba(0, 120, 0, 0.8)"),
+        hoverinfo="skip",
+        name=LAYER_GPS,
+        legendgroup=LAYER_GPS,
+    ))
+
+
+def build_operations_map(data: OperationsData, mapbox_token: str, title: str = "Driftskart") -> go.Figure:
+    """Tegner tun, strøing og brøytespor som lag i én figur"""
+    fig = go.Figure()
+    _add_gps_layer(fig, data.gps)
+
+    points = build_operations_points(data)
+    # Lagene grupperes i tegnforklaringen, så ett klikk skjuler hele laget
+    add_marker_traces(fig, points, STROING_STYLES, mode="markers")
+    add_marker_traces(fig, points, TUN_STYLES)
+
+    fig.update_layout(
+        mapbox=dict(accesstoken=mapbox_token, style="streets", **get_map_viewport().to_mapbox()),
+        margin=dict(l=0, r=0, t=30, b=0),
+        title=title,
+        showlegend=True,
+        legend=dict(
+            yanchor="top", y=0.99, xanchor="left", x=0.01,
+            bgcolor="rgba(255, 255, 255, 0.9)", groupclick="togglegroup",
+        ),
+        height=650,
+    )
+    return fig
+
+
+def vis_driftskart():
+    """Admin-side med tun, strøing og brøytespor i ett kart"""
+    st.title("Driftskart")
+    try:
+        mapbox_token = st.secrets["mapbox"]["access_token"]
+        data = fetch_operations_data()
+        title = f"Drift {format_date(get_current_time(), 'display', 'date')}"
+        fig = build_operations_map(data, mapbox_token, title)
+        st.plotly_chart(fig, use_container_width=True, key="fig_drift")
+        st.caption("Klikk på et lag i tegnforklaringen for å skjule eller vise det.")
+    except Exception as e:
+        logger.error(f"Feil i vis_driftskart: {str(e)}", exc_info=True)
+        st.error("Kunne ikke vise driftskartet")
@@ -0,0 +1,211 @@
+"""
+Gjentakende tunbestillinger (f.eks. hver fredag mellom to datoer).
+
+En regel lagres som én rad i tunbroyting_gjentakelser og utvides til konkrete
+bestillinger bare for perioden som spørres etter, så lange serier verken fyller
+bestillingstabellen eller DataFrames.
+"""
+
+from datetime import date
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+from utils.core.logging_config import get_logger
+from utils.core.models import Gjentakelse
+from utils.db.db_utils import get_db_connection
+from utils.db.schemas import ANKOMST_DAG
+
+logger = get_logger(__name__)
+
+BESTILLING_KOLONNER = [
+    "id", "customer_id", "ankomst_dato", "avreise_dato", "abonnement_type", "gjentakelse_id"
+]
+
+REGEL_KOLONNER = "id, customer_id, start_dato, slutt_dato, ukedag, intervall_uker, abonnement_type"
+
+
+def _til_dato(verdi) -> Optional[date]:
+    if verdi is None or (isinstance(verdi, float) and pd.isna(verdi)):
+        return None
+    if isinstance(verdi, date):
+        return verdi
+    return date.fromisoformat(str(verdi)[:10])
+
+
+def _til_regel(rad) -> Gjentakelse:
+    return Gjentakelse(
+        id=rad["id"],
+        customer_id=str(rad["customer_id"]),
+        start_dato=_til_dato(rad["start_dato"]),
+        slutt_dato=_til_dato(rad["slutt_dato"]),
+        ukedag=int(rad["ukedag"]),
+        intervall_uker=int(rad["intervall_uker"]),
+        abonnement_type=rad["abonnement_type"],
+    )
+
+
+def hent_gjentakelser(start: date, slutt: date, customer_id: Optional[str] = None) -> List[Gjentakelse]:
+    """Henter reglene som kan slå inn i perioden"""
+    query = (
+        f"SELECT {REGEL_KOLONNER} FROM tunbroyting_gjentakelser "
+        "WHERE start_dato <= ? AND (slutt_dato IS NULL OR slutt_dato >= ?)"
+    )
+    params = [slutt.isoformat(), start.isoformat()]
+    if customer_id is not None:
+        query += " AND customer_id = ?"
+        params.append(str(customer_id))
+    with get_db_connection("tunbroyting") as conn:
+        rader = conn.execute(query + " ORDER BY id", params).fetchall()
+    return [_til_regel(rad) for rad in rader]
+
+
+def hent_kundens_gjentakelser(customer_id: str) -> List[Gjentakelse]:
+    """Alle regler for en hytte"""
+    try:
+        with get_db_connection("tunbroyting") as conn:
+            rader = conn.execute(
+                f"SELECT {REGEL_KOLONNER} FROM tunbroyting_gjentakelser "
+                "WHERE customer_id = ? ORDER BY start_dato",
+                (str(customer_id),),
+            ).fetchall()
+        return [_til_regel(rad) for rad in rader]
+    except Exception as e:
+        logger.error(f"Feil ved henting av gjentakelser for {customer_id}: {str(e)}")
+        return []
+
+
+def utvid_gjentakelser(regler: List[Gjentakelse], start: date, slutt: date) -> Iterator[dict]:
+    """Gir én bestilling per forekomst i perioden"""
+    for regel in regler:
+        for dag in regel.forekomster(start, slutt):
+            yield {
+                "id": None,
+                "customer_id": regel.customer_id,
+                "ankomst_dato": dag.isoformat(),
+                "avreise_dato": None,
+                "abonnement_type": regel.abonnement_type,
+                "gjentakelse_id": regel.id,
+            }
+
+
+def gjentakende_bestillinger(start: date, slutt: date) -> pd.DataFrame:
+    """
+    Forekomstene av alle regler i perioden som bestillinger.
+
+    En lagret bestilling for samme hytte og dag går foran forekomsten.
+
+    Returns:
+        pd.DataFrame: Kolonnene i BESTILLING_KOLONNER, datoene som YYYY-MM-DD
+    """
+    try:
+        regler = hent_gjentakelser(start, slutt)
+        if not regler:
+            return pd.DataFrame(columns=BESTILLING_KOLONNER)
+
+        forekomster = pd.DataFrame(
+            utvid_gjentakelser(regler, start, slutt), columns=BESTILLING_KOLONNER
+        ).drop_duplicates(subset=["customer_id", "ankomst_dato"])
+        if forekomster.empty:
+            return forekomster
+
+        with get_db_connection("tunbroyting") as conn:
+            lagret = pd.read_sql_query(
+                f"SELECT customer_id, {ANKOMST_DAG} AS ankomst_dato FROM tunbroyting_bestillinger "
+                f"WHERE {ANKOMST_DAG} BETWEEN ? AND ?",
+                conn,
+                params=(start.isoformat(), slutt.isoformat()),
+            )
+        koblet = forekomster.merge(
+            lagret.drop_duplicates(), on=["customer_id", "ankomst_dato"], how="left", indicator=True
+        )
+        return koblet[koblet["_merge"] == "left_only"][BESTILLING_KOLONNER].reset_index(drop=True)
+
+    except Exception as e:
+        logger.error(f"Feil ved utvidelse av gjentakelser: {str(e)}", exc_info=True)
+        return pd.DataFrame(columns=BESTILLING_KOLONNER)
+
+
+def lagre_gjentakelse(
+    customer_id: str,
+    start_dato: date,
+    slutt_dato: Optional[date] = None,
+    ukedag: int = 4,
+    intervall_uker: int = 1,
+    abonnement_type: str = "Ukentlig ved bestilling",
+) -> bool:
+    """Lagrer en regel, f.eks. hver fredag fra start_dato til slutt_dato"""
+    try:
+        if not customer_id or start_dato is None:
+            logger.error("Manglende påkrevde felter i gjentakelse")
+            return False
+        if slutt_dato is not None and slutt_dato < start_dato:
+            logger.error("Sluttdato for gjentakelse er før startdato")
+            return False
+        if not 0 <= ukedag <= 6 or intervall_uker < 1:
+            logger.error(f"Ugyldig gjentakelse: ukedag={ukedag}, intervall_uker={intervall_uker}")
+            return False
+
+        with get_db_connection("tunbroyting") as conn:
+            conn.execute(
+                """
+                INSERT INTO tunbroyting_gjentakelser
+                (customer_id, start_dato, slutt_dato, ukedag, intervall_uker, abonnement_type)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    str(customer_id),
+                    start_dato.isoformat(),
+                    slutt_dato.isoformat() if slutt_dato else None,
+                    ukedag,
+                    intervall_uker,
+                    abonnement_type,
+                ),
+            )
+        return True
+    except Exception as e:
+        logger.error(f"Feil ved lagring av gjentakelse: {str(e)}")
+        return False
+
+
+def avslutt_gjentakelse(
+    gjentakelse_id: int, slutt_dato: date, customer_id: Optional[str] = None
+) -> bool:
+    """
+    Avslutter en regel etter slutt_dato; med customer_id bare hvis den tilhører hytta.
+
+    Regelen beholdes, så forekomster som allerede har vært blir stående i
+    statistikk, belegg og historikk. En regel som ikke har startet ennå slettes.
+    """
+    try:
+        eier = " AND customer_id = ?" if customer_id is not None else ""
+        eier_param = [str(customer_id)] if customer_id is not None else []
+        with get_db_connection("tunbroyting") as conn:
+            if conn.execute(
+                f"DELETE FROM tunbroyting_gjentakelser WHERE id = ?{eier} AND start_dato > ?",
+                [int(gjentakelse_id), *eier_param, slutt_dato.isoformat()],
+            ).rowcount:
+                return True
+            return conn.execute(
+                f"UPDATE tunbroyting_gjentakelser SET slutt_dato = ? WHERE id = ?{eier} "
+                "AND (slutt_dato IS NULL OR slutt_dato > ?)",
+                [slutt_dato.isoformat(), int(gjentakelse_id), *eier_param, slutt_dato.isoformat()],
+            ).rowcount > 0
+    except Exception as e:
+        logger.error(f"Feil ved avslutning av gjentakelse {gjentakelse_id}: {str(e)}")
+        return False
+
+
+def slett_gjentakelse(gjentakelse_id: int, customer_id: Optional[str] = None) -> bool:
+    """Sletter en regel; med customer_id bare hvis den tilhører hytta"""
+    try:
+        query = "DELETE FROM tunbroyting_gjentakelser WHERE id = ?"
+        params = [int(gjentakelse_id)]
+        if customer_id is not None:
+            query += " AND customer_id = ?"
+            params.append(str(customer_id))
+        with get_db_connection("tunbroyting") as conn:
+            return conn.execute(query, params).rowcount > 0
+    except Exception as e:
+        logger.error(f"Feil ved sletting av gjentakelse {gjentakelse_id}: {str(e)}")
+        return False
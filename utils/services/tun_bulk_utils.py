@@ -0,0 +1,328 @@
+"""
+Masseimport, masseredigering og eksport av tunbrøytingsbestillinger.
+
+Reglene fra validere_bestilling brukes på hele kolonner, og alle skrivinger skjer
+med executemany i én transaksjon sammen med oppdateringen av belegget.
+"""
+
+import io
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.core.logging_config import get_logger
+from utils.core.validation_utils import validate_customer_id
+from utils.db.db_utils import get_db_connection
+from utils.db.schemas import ANKOMST_DAG
+from utils.services.occupancy_utils import apply_occupancy, to_local_days, to_local_timestamps
+
+logger = get_logger(__name__)
+
+ABONNEMENT_TYPER = ("Ukentlig ved bestilling", "Årsabonnement")
+KOLONNER = ["customer_id", "ankomst_dato", "avreise_dato", "abonnement_type"]
+PAKREVDE_KOLONNER = ["customer_id", "ankomst_dato", "abonnement_type"]
+
+INSERT_BESTILLING = """
+    INSERT INTO tunbroyting_bestillinger
+    (customer_id, ankomst_dato, avreise_dato, abonnement_type)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+"""
+UPDATE_BESTILLING = """
+    UPDATE tunbroyting_bestillinger
+    SET customer_id = ?, ankomst_dato = ?, avreise_dato = ?, abonnement_type = ?
+    WHERE id = ?
+"""
+
+
+def les_bestillingsfil(fil) -> pd.DataFrame:
+    """
+    Leser bestillinger fra CSV eller Parquet.
+
+    Raises:
+        ValueError: Ukjent filtype eller manglende kolonner
+    """
+    navn = Path(getattr(fil, "name", str(fil))).suffix.lower()
+    if navn == ".csv":
+        df = pd.read_csv(fil, dtype=str, keep_default_na=False)
+    elif navn == ".parquet":
+        # Krever pyarrow eller fastparquet
+        df = pd.read_parquet(fil)
+    else:
+        raise ValueError(f"Ukjent filtype: {navn or 'ingen'}")
+
+    df.columns = [str(c).strip() for c in df.columns]
+    mangler = [c for c in PAKREVDE_KOLONNER if c not in df.columns]
+    if mangler:
+        raise ValueError(f"Mangler kolonner: {', '.join(mangler)}")
+    if "avreise_dato" not in df.columns:
+        df["avreise_dato"] = None
+    return df[KOLONNER]
+
+
+def valider_bestillinger(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Validerer bestillinger kolonnevis med reglene fra validere_bestilling.
+
+    Returns:
+        pd.DataFrame: Bestillingene med datoer som YYYY-MM-DD og kolonnen feil,
+        som er tom for gyldige rader
+    """
+    df = df.reset_index(drop=True).copy()
+    feil = pd.Series("", index=df.index, dtype=object)
+
+    def merk(maske, melding):
+        maske = np.asarray(maske, dtype=bool) & (feil == "").to_numpy()
+        feil[maske] = melding
+
+    tom = lambda s: s.isna() | (s.astype(str).str.strip() == "")  # noqa: E731
+
+    kunder = df["customer_id"].where(~tom(df["customer_id"]), None).astype(object)
+    kunder = kunder.map(lambda v: str(v).strip() if v is not None else None)
+    gyldige_kunder = {k: validate_customer_id(k) for k in kunder.dropna().unique()}
+    merk(kunder.isna(), "Mangler hytte")
+    merk(~kunder.map(gyldige_kunder).fillna(False).astype(bool), "Ukjent hytte")
+
+    merk(~df["abonnement_type"].isin(ABONNEMENT_TYPER), "Ugyldig abonnementstype")
+
+    avreise_tom = tom(df["avreise_dato"]).to_numpy()
+    ankomst = to_local_timestamps(df["ankomst_dato"].where(~tom(df["ankomst_dato"]), None))
+    avreise = to_local_timestamps(df["avreise_dato"].where(~avreise_tom, None))
+    merk(ankomst.isna(), "Ugyldig ankomstdato")
+    merk(~avreise_tom & avreise.isna().to_numpy(), "Ugyldig avreisedato")
+    # Som i validere_bestilling: avreise må være etter ankomst
+    merk(avreise.notna() & (avreise <= ankomst), "Avreise må være etter ankomst")
+
+    df["customer_id"] = kunder
+    df["ankomst_dato"] = ankomst.dt.strftime("%Y-%m-%d")
+    df["avreise_dato"] = avreise.dt.strftime("%Y-%m-%d").where(avreise.notna(), None)
+
+    # Samme hytte og ankomstdag flere ganger i filen
+    gyldig = (feil == "").to_numpy()
+    dupl = np.zeros(len(df), dtype=bool)
+    dupl[gyldig] = df[gyldig].duplicated(subset=["customer_id", "ankomst_dato"]).to_numpy()
+    merk(dupl, "Duplikat i filen")
+
+    df["feil"] = feil
+    return df
+
+
+def importer_bestillinger(bestillinger: pd.DataFrame) -> Tuple[int, int]:
+    """
+    Lagrer validerte bestillinger i én transaksjon.
+
+    Bestillinger som allerede finnes (samme hytte og ankomstdag) hoppes over.
+
+    Returns:
+        Tuple[int, int]: (antall lagret, antall som fantes fra før)
+    """
+    if bestillinger.empty:
+        return 0, 0
+    rader = list(bestillinger[KOLONNER].astype(object).where(bestillinger[KOLONNER].notna(), None)
+                 .itertuples(index=False, name=None))
+    with get_db_connection("tunbroyting") as conn:
+        cursor = conn.cursor()
+        # IMMEDIATE tar skrivelåsen før MAX(id) og belegget leses
+        cursor.execute("BEGIN IMMEDIATE")
+        siste_id = cursor.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM tunbroyting_bestillinger"
+        ).fetchone()[0]
+        cursor.executemany(INSERT_BESTILLING, rader)
+        # AUTOINCREMENT gir nye rader høyere id enn alle eksisterende
+        lagret = pd.read_sql_query(
+            "SELECT customer_id, ankomst_dato, avreise_dato, abonnement_type "
+            "FROM tunbroyting_bestillinger WHERE id > ?",
+            conn,
+            params=(siste_id,),
+        )
+        apply_occupancy(cursor, lagret, 1)
+        cursor.execute("COMMIT")
+    logger.info(f"Importerte {len(lagret)} av {len(rader)} tunbestillinger")
+    return len(lagret), len(rader) - len(lagret)
+
+
+def finn_batchendringer(original: pd.DataFrame, redigert: pd.DataFrame) -> Tuple[pd.DataFrame, List[int]]:
+    """
+    Sammenligner tabellen før og etter redigering.
+
+    Returns:
+        Tuple[pd.DataFrame, List[int]]: (endrede rader med id, slettede id-er)
+    """
+    original = original.set_index("id")[KOLONNER]
+    redigert = redigert.dropna(subset=["id"]).astype({"id": int}).set_index("id")[KOLONNER]
+    slettet = sorted(set(original.index) - set(redigert.index))
+
+    felles = original.index.intersection(redigert.index)
+    før, etter = original.loc[felles], redigert.loc[felles]
+    endret = pd.Series(False, index=felles)
+    for kolonne in ("customer_id", "abonnement_type"):
+        endret |= før[kolonne].astype(str) != etter[kolonne].astype(str)
+    for kolonne in ("ankomst_dato", "avreise_dato"):
+        endret |= (
+            pd.Series(to_local_days(før[kolonne]).astype(str), index=felles)
+            != pd.Series(to_local_days(etter[kolonne]).astype(str), index=felles)
+        )
+    return etter[endret.to_numpy()].reset_index(), slettet
+
+
+def lagre_batchendringer(endrede: pd.DataFrame, slettede: List[int]) -> bool:
+    """
+    Oppdaterer og sletter bestillinger i én transaksjon, sammen med belegget.
+
+    endrede må være validert med valider_bestillinger. Ved konflikt mot den
+    unike indeksen rulles alt tilbake.
+    """
+    berort = [int(i) for i in endrede["id"]] + [int(i) for i in slettede]
+    if not berort:
+        return True
+    try:
+        with get_db_connection("tunbroyting") as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            plassholdere = ",".join("?" * len(berort))
+            gamle = pd.read_sql_query(
+                "SELECT customer_id, ankomst_dato, avreise_dato, abonnement_type "
+                f"FROM tunbroyting_bestillinger WHERE id IN ({plassholdere})",
+                conn,
+                params=berort,
+            )
+            apply_occupancy(cursor, gamle, -1)
+            cursor.executemany(
+                "DELETE FROM tunbroyting_bestillinger WHERE id = ?", [(i,) for i in slettede]
+            )
+            nye = endrede[KOLONNER].astype(object).where(endrede[KOLONNER].notna(), None)
+            cursor.executemany(UPDATE_BESTILLING, [
+                (*rad, int(bestilling_id))
+                for rad, bestilling_id in zip(nye.itertuples(index=False, name=None), endrede["id"])
+            ])
+            apply_occupancy(cursor, nye, 1)
+            cursor.execute("COMMIT")
+        logger.info(f"Batchendring: {len(endrede)} oppdatert, {len(slettede)} slettet")
+        return True
+    except Exception as e:
+        logger.error(f"Feil ved batchendring av bestillinger: {str(e)}")
+        return False
+
+
+def eksporter_bestillinger_csv(chunksize: int = 5000) -> Iterator[str]:
+    """Strømmer alle bestillinger som CSV, chunksize rader om gangen"""
+    with get_db_connection("tunbroyting") as conn:
+        biter = pd.read_sql_query(
+            "SELECT id, customer_id, ankomst_dato, avreise_dato, abonnement_type "
+            f"FROM tunbroyting_bestillinger ORDER BY {ANKOMST_DAG}, id",
+            conn,
+            chunksize=chunksize,
+        )
+        for nummer, bit in enumerate(biter):
+            yield bit.to_csv(index=False, header=nummer == 0)
+
+
+def _hent_redigerbare_bestillinger() -> pd.DataFrame:
+    with get_db_connection("tunbroyting") as conn:
+        df = pd.read_sql_query(
+            "SELECT id, customer_id, ankomst_dato, avreise_dato, abonnement_type "
+            f"FROM tunbroyting_bestillinger ORDER BY {ANKOMST_DAG} DESC, id",
+            conn,
+        )
+    for kolonne in ("ankomst_dato", "avreise_dato"):
+        df[kolonne] = to_local_timestamps(df[kolonne]).dt.date
+    return df
+
+
+def vis_masseimport():
+    """Import av bestillinger fra CSV eller Parquet"""
+    st.subheader("Importer bestillinger")
+    st.caption("Kolonner: customer_id, ankomst_dato, avreise_dato (valgfri), abonnement_type")
+    fil = st.file_uploader("Velg fil", type=["csv", "parquet"], key="tun_import_fil")
+    if fil is None:
+        return
+    try:
+        validert = valider_bestillinger(les_bestillingsfil(fil))
+    except ImportError:
+        st.error("Parquet-import krever pyarrow eller fastparquet")
+        return
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    ugyldige = validert[validert["feil"] != ""]
+    gyldige = validert[validert["feil"] == ""]
+    st.write(f"{len(gyldige)} gyldige og {len(ugyldige)} ugyldige rader")
+    if not ugyldige.empty:
+        st.dataframe(ugyldige, use_container_width=True)
+    if not gyldige.empty and st.button(f"Importer {len(gyldige)} bestillinger", key="tun_import"):
+        try:
+            lagret, fantes = importer_bestillinger(gyldige)
+            st.success(f"{lagret} bestillinger importert, {fantes} fantes fra før")
+        except Exception as e:
+            logger.error(f"Feil ved import av bestillinger: {str(e)}")
+            st.error("Importen feilet, ingen bestillinger ble lagret")
+
+
+def vis_masseredigering():
+    """Redigerbar tabell for å endre og slette mange bestillinger samtidig"""
+    st.subheader("Rediger flere bestillinger")
+    st.caption("Endre celler eller slett rader. Nye bestillinger legges inn via import.")
+    # Tabellen lastes bare når den åpnes, ikke ved hver oppdatering av siden
+    if not st.toggle("Vis redigeringstabell", key="tun_batch_vis"):
+        return
+    try:
+        original = _hent_redigerbare_bestillinger()
+    except Exception as e:
+        logger.error(f"Feil ved henting av bestillinger til redigering: {str(e)}")
+        st.error("Kunne ikke hente bestillinger")
+        return
+
+    redigert = st.data_editor(
+        original,
+        key="tun_batch_editor",
+        num_rows="dynamic",
+        disabled=["id"],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "id": "ID",
+            "customer_id": "Hytte",
+            "ankomst_dato": st.column_config.DateColumn("Ankomst", format="DD.MM.YYYY"),
+            "avreise_dato": st.column_config.DateColumn("Avreise", format="DD.MM.YYYY"),
+            "abonnement_type": st.column_config.SelectboxColumn(
+                "Abonnement", options=list(ABONNEMENT_TYPER), required=True
+            ),
+        },
+    )
+    endrede, slettede = finn_batchendringer(original, redigert)
+    if endrede.empty and not slettede:
+        return
+
+    validert = valider_bestillinger(endrede)
+    ugyldige = validert[validert["feil"] != ""]
+    st.write(f"{len(endrede)} endret og {len(slettede)} slettet")
+    if not ugyldige.empty:
+        st.error("Rett opp ugyldige rader før lagring")
+        st.dataframe(ugyldige, use_container_width=True)
+        return
+    if st.button("Lagre endringer", key="tun_batch_lagre"):
+        if lagre_batchendringer(validert, slettede):
+            st.success("Endringene er lagret")
+        else:
+            st.error("Kunne ikke lagre endringene. Sjekk for dupliserte bestillinger.")
+
+
+def vis_eksport():
+    """Nedlasting av alle bestillinger som CSV, bygget først når admin ber om det"""
+    if st.button("Forbered eksport", key="tun_eksport_forbered"):
+        buffer = io.StringIO()
+        for bit in eksporter_bestillinger_csv():
+            buffer.write(bit)
+        st.session_state["tun_eksport_csv"] = buffer.getvalue()
+    if "tun_eksport_csv" not in st.session_state:
+        return
+    st.download_button(
+        label="📥 Last ned alle bestillinger (CSV)",
+        data=st.session_state["tun_eksport_csv"],
+        file_name="tunbroyting_bestillinger.csv",
+        mime="text/csv",
+    )
@@ -1,12 +1,12 @@
 import sqlite3
+import uuid
 from datetime import date, datetime, time, timedelta
-from typing import Any, Dict, Tuple, List
+from typing import Any, Dict, Tuple, List, Optional
 
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
-import pytz
 
 from utils.core.config import (
     TZ,
@@ -18,20 +18,26 @@ from utils.core.config import (
     safe_to_datetime,
     format_date,
     combine_date_with_tz,
-    normalize_datetime,
-    convert_for_db,
     parse_date,
     ensure_tz_datetime
 )
-from utils.core.models import MapBooking
+from utils.core.models import BrukerBestilling, MapBooking
 from utils.core.logging_config import get_logger
-from utils.core.util_functions import neste_fredag, filter_todays_bookings
+from utils.core.util_functions import neste_fredag
 from utils.core.validation_utils import validere_bestilling
 from utils.db.db_utils import (
+    get_data_version,
     get_db_connection,
     verify_tunbroyting_database
 )
-from utils.services.map_utils import vis_dagens_tunkart, debug_map_data
+from utils.db.schemas import ANKOMST_DAG, AVREISE_DAG
+from utils.services.map_utils import (
+    vis_dagens_tunkart,
+    vis_broytespor_kart,
+    vis_alle_hytter_tunkart,
+    legg_til_dekningslag,
+    debug_map_data
+)
 from utils.services.customer_utils import (
     customer_edit_component,
     get_customer_by_id,
@@ -44,9 +50,40 @@ from utils.services.map_interface import (
     create_default_map_config,
     prepare_map_data,
     debug_map_data,
-    verify_map_configuration
+    verify_map_configuration,
+    get_map_viewports,
+    ALL_RODER,
 )
 from utils.services.map_utils import ny_dagens_tunkart
+from utils.services.gps_track_utils import get_simplified_tracks
+from utils.services.coverage_utils import get_dekning
+from utils.services.figure_cache_utils import get_cached_figure
+from utils.services.occupancy_utils import (
+    BookingIntervalIndex,
+    TunStatistikk,
+    apply_booking_occupancy,
+    compute_tun_statistics,
+    get_daily_occupancy,
+    get_occupancy,
+    to_local_timestamps,
+)
+from utils.services.recurrence_utils import (
+    gjentakende_bestillinger,
+    hent_kundens_gjentakelser,
+    avslutt_gjentakelse,
+    lagre_gjentakelse,
+)
+from utils.services.tun_bulk_utils import (
+    vis_eksport,
+    vis_masseimport,
+    vis_masseredigering,
+)
+from utils.services.cabin_geojson_utils import (
+    PLOWING_MAP_FILE,
+    build_cabin_state_geojson,
+    get_cabin_state_url,
+)
+from utils.components.ui.cabin_map import display_cabin_map
 
 logger = get_logger(__name__)
 
@@ -141,6 +178,16 @@ def bestill_tunbroyting():
                 )
 
         avreise_dato = None
+        gjenta_til = None
+        if abonnement_type == "Ukentlig ved bestilling":
+            with col2:
+                if st.checkbox("Gjenta hver fredag", key="tun_gjenta"):
+                    gjenta_til = st.date_input(
+                        "Til og med",
+                        min_value=ankomst_dato,
+                        value=ankomst_dato + timedelta(weeks=4),
+                        format="DD.MM.YYYY",
+                    )
         if abonnement_type == "Årsabonnement":
             with col2:
                 avreise_dato = st.date_input(
@@ -150,25 +197,38 @@ def bestill_tunbroyting():
                     format="DD.MM.YYYY",
                 )
 
-        bestillingsfrist = combine_date_with_tz(
-            ankomst_dato - timedelta(days=1), 
-            time(12, 0)
-        )
+        bestillingsfrist = get_bestillingsfrist(ankomst_dato)
+
+        # Idempotensnøkkel for skjemaet; sendes med ved lagring
+        if "tun_bestilling_token" not in st.session_state:
+            st.session_state.tun_bestilling_token = uuid.uuid4().hex
 
         if st.button("Bestill Tunbrøyting"):
             if naa >= bestillingsfrist:
                 st.error(
                     f"Beklager, fristen for å bestille tunbrøyting for {ankomst_dato.strftime('%d.%m.%Y')} var {bestillingsfrist.strftime('%d.%m.%Y kl. %H:%M')}. "
                 )
+            elif gjenta_til:
+                # Lagres som én regel og utvides til fredager ved oppslag
+                if lagre_gjentakelse(customer_id, ankomst_dato, gjenta_til):
+                    st.success(
+                        f"Tunbrøyting er bestilt hver fredag til og med {gjenta_til.strftime('%d.%m.%Y')}!"
+                    )
+                else:
+                    st.error("Kunne ikke lagre den gjentakende bestillingen.")
             else:
                 resultat = lagre_bestilling(
                     customer_id,
                     ankomst_dato.isoformat(),
                     avreise_dato.isoformat() if avreise_dato else None,
-                    abonnement_type
+                    abonnement_type,
+                    request_token=st.session_state.tun_bestilling_token
                 )
                 if resultat:
+                    bruker_bestilling_lagret(customer_id, ankomst_dato)
                     st.success("Bestilling av tunbrøyting er registrert!")
+                    # Ny nøkkel, så neste bestilling ikke regnes som samme innsending
+                    st.session_state.tun_bestilling_token = uuid.uuid4().hex
                 else:
                     st.error(
                         f"Du har allerede en bestilling for {ankomst_dato.strftime('%d.%m.%Y')}. "
@@ -179,39 +239,47 @@ def bestill_tunbroyting():
             f"Merk: Frist for bestilling er kl. 12:00 dagen før ønsket ankomstdato. For valgt dato ({ankomst_dato.strftime('%d.%m.%Y')}) er fristen {bestillingsfrist.strftime('%d.%m.%Y kl. %H:%M')}."
         )
 
-        # Logging for bestillinger
-        logger.info("Attempting to fetch user bookings")
-        bruker_bestillinger = hent_bruker_bestillinger(customer_id)
-        logger.info(
-            f"Retrieved bookings data shape: {bruker_bestillinger.shape if not bruker_bestillinger.empty else 'Empty DataFrame'}"
-        )
-        logger.info(
-            f"Bookings columns: {bruker_bestillinger.columns.tolist() if not bruker_bestillinger.empty else 'No columns'}"
-        )
+        bruker_bestillinger = get_bruker_bestillinger(customer_id)
+
+        gjentakelser = hent_kundens_gjentakelser(customer_id)
+        if gjentakelser:
+            st.subheader("Dine faste fredager")
+            # Forekomster med passert frist er planlagt og blir stående
+            siste_bundne_dag = naa.date() + timedelta(days=1)
+            if naa < get_bestillingsfrist(siste_bundne_dag):
+                siste_bundne_dag = naa.date()
+            for regel in gjentakelser:
+                col_tekst, col_knapp = st.columns([3, 1])
+                slutt = regel.slutt_dato.strftime('%d.%m.%Y') if regel.slutt_dato else "videre"
+                col_tekst.write(f"Hver fredag fra {regel.start_dato.strftime('%d.%m.%Y')} til {slutt}")
+                if regel.slutt_dato is not None and regel.slutt_dato <= siste_bundne_dag:
+                    continue
+                if col_knapp.button("Avslutt", key=f"avslutt_gjentakelse_{regel.id}"):
+                    if avslutt_gjentakelse(regel.id, siste_bundne_dag, customer_id):
+                        st.success("Den gjentakende bestillingen er avsluttet.")
+                        st.rerun()
+                    else:
+                        st.error("Kunne ikke avslutte den gjentakende bestillingen.")
 
         st.subheader("Dine tidligere bestillinger")
-        if not bruker_bestillinger.empty:
-            logger.info("Processing non-empty bookings")
-            for idx, bestilling in bruker_bestillinger.iterrows():
-                logger.info(f"Processing booking {idx}: {bestilling.to_dict()}")
-                try:
-                    with st.expander(
-                        f"Bestilling - {pd.to_datetime(bestilling['ankomst_dato']).strftime('%d.%m.%Y')}"
+        if bruker_bestillinger:
+            for bestilling in bruker_bestillinger:
+                with st.expander(f"Bestilling - {bestilling.ankomst_dato.strftime('%d.%m.%Y')}"):
+                    st.write(f"Ankomst: {bestilling.ankomst_dato.strftime('%d.%m.%Y')}")
+                    if bestilling.avreise_dato:
+                        st.write(f"Avreise: {bestilling.avreise_dato.strftime('%d.%m.%Y')}")
+                    st.write(f"Type: {bestilling.abonnement_type}")
+                    # Samme frist som for å bestille; etter den er brøytingen planlagt
+                    if naa < get_bestillingsfrist(bestilling.ankomst_dato) and st.button(
+                        "Slett bestilling", key=f"slett_egen_{bestilling.id}"
                     ):
-                        st.write(
-                            f"Ankomst: {pd.to_datetime(bestilling['ankomst_dato']).strftime('%d.%m.%Y')}"
-                        )
-                        if pd.notna(bestilling["avreise_dato"]):
-                            st.write(
-                                f"Avreise: {pd.to_datetime(bestilling['avreise_dato']).strftime('%d.%m.%Y')}"
-                            )
-                        st.write(f"Type: {bestilling['abonnement_type']}")
-                except Exception as e:
-                    logger.error(
-                        f"Error processing booking {idx}: {str(e)}", exc_info=True
-                    )
+                        if slett_bestilling(bestilling.id):
+                            bruker_bestilling_slettet(customer_id, bestilling.id)
+                            st.success("Bestillingen er slettet.")
+                            st.rerun()
+                        else:
+                            st.error("Kunne ikke slette bestillingen.")
         else:
-            logger.info("No bookings found for user")
             st.info("Du har ingen tidligere bestillinger.")
 
         st.write("---")
@@ -224,55 +292,83 @@ def bestill_tunbroyting():
         )
 
 
+BESTILLING_KOLONNER = ("customer_id", "ankomst_dato", "avreise_dato", "abonnement_type")
+
+
+def get_bestillingsfrist(ankomst_dato: date) -> datetime:
+    """Frist for å bestille tunbrøyting: kl. 12:00 dagen før ankomst"""
+    return combine_date_with_tz(ankomst_dato - timedelta(days=1), time(12, 0))
+
+
 # CREATE - lagre i bestill_tunbroyting
 def lagre_bestilling(
     customer_id: str,
     ankomst_dato: str,
     avreise_dato: str = None,
-    abonnement_type: str = "Ukentlig ved bestilling"
+    abonnement_type: str = "Ukentlig ved bestilling",
+    request_token: Optional[str] = None
 ) -> bool:
+    """
+    Lagrer en bestilling i én transaksjon.
+    
+    Den unike indeksen på hytte og ankomstdag avviser duplikater. Med
+    request_token gir en ny innsending av samme skjema True uten ny bestilling.
+    
+    Returns:
+        bool: True hvis bestillingen er lagret, False ved duplikat eller feil
+    """
     try:
         # Verifiser database først
         if not verify_tunbroyting_database():
             logger.error("Kunne ikke verifisere tunbrøyting database")
             return False
             
+        if not all([customer_id, ankomst_dato, abonnement_type]):
+            logger.error("Manglende påkrevde felter i bestilling")
+            return False
+
+        query = """
+        INSERT INTO tunbroyting_bestillinger 
+        (customer_id, ankomst_dato, avreise_dato, abonnement_type)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT DO NOTHING
+        """
+        params = (
+            str(customer_id),
+            str(ankomst_dato),
+            str(avreise_dato) if avreise_dato else None,
+            str(abonnement_type)
+        )
+
         with get_db_connection("tunbroyting") as conn:
             cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT COUNT(*) FROM tunbroyting_bestillinger 
-                WHERE customer_id = ? AND ankomst_dato = ?
-                """,
-                (customer_id, ankomst_dato),
-            )
-
-            if cursor.fetchone()[0] > 0:
+            # IMMEDIATE tar skrivelåsen før belegget leses og oppdateres
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            if request_token:
+                cursor.execute(
+                    """
+                    INSERT INTO booking_requests (token, customer_id) VALUES (?, ?)
+                    ON CONFLICT(token) DO NOTHING
+                    """,
+                    (request_token, str(customer_id)),
+                )
+                if cursor.rowcount == 0:
+                    cursor.execute("ROLLBACK")
+                    logger.info(f"Innsending {request_token} er allerede lagret")
+                    return True
+
+            cursor.execute(query, params)
+            if cursor.rowcount == 0:
+                cursor.execute("ROLLBACK")
                 logger.warning(
                     f"Bruker {customer_id} har allerede bestilling på {ankomst_dato}"
                 )
                 return False
 
-            if not all([customer_id, ankomst_dato, abonnement_type]):
-                logger.error("Manglende påkrevde felter i bestilling")
-                return False
-
-            query = """
-            INSERT INTO tunbroyting_bestillinger 
-            (customer_id, ankomst_dato, avreise_dato, abonnement_type)
-            VALUES (?, ?, ?, ?)
-            """
-
-            cursor.execute(
-                query,
-                (
-                    str(customer_id),
-                    str(ankomst_dato),
-                    str(avreise_dato) if avreise_dato else None,
-                    str(abonnement_type)
-                )
-            )
-            conn.commit()
+            # Belegget oppdateres i samme transaksjon som bestillingen
+            apply_booking_occupancy(cursor, dict(zip(BESTILLING_KOLONNER, params)), 1)
+            cursor.execute("COMMIT")
             return True
 
     except Exception as e:
@@ -280,111 +376,180 @@ def lagre_bestilling(
         return False
 
 
+BRUKER_BESTILLINGER_QUERY = """
+    SELECT id, ankomst_dato, avreise_dato, abonnement_type
+    FROM tunbroyting_bestillinger
+    WHERE customer_id = ?
+"""
+
+
+def _sorter_bruker_bestillinger(rader: List[BrukerBestilling]) -> List[BrukerBestilling]:
+    return sorted(rader, key=lambda b: (b.ankomst_dato, b.id), reverse=True)
+
+
+@st.cache_data(ttl=3600, max_entries=256)
+def _cached_bruker_bestillinger(customer_id: str, bookings_version: int) -> Tuple[BrukerBestilling, ...]:
+    """Brukerens bestillinger; bookings_version gjør at cachen følger tabellen"""
+    with get_db_connection("tunbroyting") as conn:
+        rader = conn.execute(BRUKER_BESTILLINGER_QUERY, (str(customer_id),)).fetchall()
+    return tuple(_sorter_bruker_bestillinger([BrukerBestilling.fra_rad(r) for r in rader]))
+
+
+def get_bruker_bestillinger(customer_id: str) -> List[BrukerBestilling]:
+    """
+    Brukerens bestillinger for bestillingssiden.
+    
+    Visningen ligger i session_state sammen med tabellversjonen, så en rerun
+    (f.eks. når en dato endres) koster bare ett oppslag av versjonen.
+    """
+    try:
+        versjon = get_data_version("tunbroyting", "tunbroyting_bestillinger")
+        visning = st.session_state.get("tun_bruker_visning")
+        if (
+            versjon is not None
+            and visning
+            and visning["customer_id"] == customer_id
+            and visning["versjon"] == versjon
+        ):
+            return visning["rader"]
+
+        rader = list(_cached_bruker_bestillinger(customer_id, versjon))
+        st.session_state.tun_bruker_visning = {
+            "customer_id": customer_id, "versjon": versjon, "rader": rader
+        }
+        return rader
+    except Exception as e:
+        logger.error(f"Feil ved henting av bestillinger for bruker {customer_id}: {str(e)}")
+        return []
+
+
+def _oppdater_bruker_visning(customer_id: str, endring) -> None:
+    """
+    Oppdaterer visningen etter brukerens egen lagring eller sletting.
+    
+    Har versjonen økt med nøyaktig én, er endringen vår den eneste, og
+    endring(rader) brukes på listen. Ellers forkastes visningen og lastes på nytt.
+    """
+    visning = st.session_state.get("tun_bruker_visning")
+    if not visning or visning["customer_id"] != customer_id:
+        return
+    versjon = get_data_version("tunbroyting", "tunbroyting_bestillinger")
+    if versjon == visning["versjon"]:
+        return
+    if versjon is not None and visning["versjon"] is not None and versjon == visning["versjon"] + 1:
+        visning["rader"] = _sorter_bruker_bestillinger(endring(visning["rader"]))
+        visning["versjon"] = versjon
+    else:
+        del st.session_state["tun_bruker_visning"]
+
+
+def _hent_bruker_bestilling_for_dag(customer_id: str, dag: date) -> Optional[BrukerBestilling]:
+    """Én bestilling via den unike indeksen på hytte og ankomstdag"""
+    with get_db_connection("tunbroyting") as conn:
+        rad = conn.execute(
+            BRUKER_BESTILLINGER_QUERY + f" AND {ANKOMST_DAG} = ?",
+            (str(customer_id), dag.isoformat()),
+        ).fetchone()
+    return BrukerBestilling.fra_rad(rad) if rad else None
+
+
+def bruker_bestilling_lagret(customer_id: str, ankomst_dato: date) -> None:
+    """Legger en nylig lagret bestilling inn i brukerens visning"""
+    try:
+        ny = _hent_bruker_bestilling_for_dag(customer_id, ankomst_dato)
+        _oppdater_bruker_visning(
+            customer_id, lambda rader: rader + [ny] if ny and ny not in rader else rader
+        )
+    except Exception as e:
+        logger.error(f"Feil ved oppdatering av brukervisning: {str(e)}")
+        st.session_state.pop("tun_bruker_visning", None)
+
+
+def bruker_bestilling_slettet(customer_id: str, bestilling_id: int) -> None:
+    """Fjerner en slettet bestilling fra brukerens visning"""
+    _oppdater_bruker_visning(
+        customer_id, lambda rader: [b for b in rader if b.id != bestilling_id]
+    )
+
+
 # READ
 def hent_bruker_bestillinger(customer_id):
     """Henter brukerens bestillinger"""
     try:
         with get_db_connection("tunbroyting") as conn:
             query = """
-            SELECT DISTINCT * FROM tunbroyting_bestillinger 
+            SELECT * FROM tunbroyting_bestillinger 
             WHERE customer_id = ? 
             ORDER BY ankomst_dato DESC
             """
             df = pd.read_sql_query(query, conn, params=(customer_id,))
 
-        logger.info(f"Hentet {len(df)} unike bestillinger for bruker {customer_id}")
+        logger.info(f"Hentet {len(df)} bestillinger for bruker {customer_id}")
         return df
 
     except Exception as e:
         logger.error(f"Feil ved henting av bestillinger: {str(e)}")
         return pd.DataFrame()
 
+# Aktive bestillinger i en periode. Ukentlige er aktive på ankomstdagen,
+# årsabonnement fra ankomst til og med avreise (eller uten slutt). Dagene
+# sammenlignes med de indekserte dagsuttrykkene fra schemas.py.
+AKTIVE_BESTILLINGER_QUERY = f"""
+    SELECT id, customer_id, ankomst_dato, avreise_dato, abonnement_type
+    FROM tunbroyting_bestillinger
+    WHERE
+        (abonnement_type != 'Årsabonnement' AND
+         {ANKOMST_DAG} BETWEEN :start AND :slutt)
+        OR
+        (abonnement_type = 'Årsabonnement' AND
+         {ANKOMST_DAG} <= :slutt AND
+         (avreise_dato IS NULL OR {AVREISE_DAG} >= max(:start, {ANKOMST_DAG})))
+    ORDER BY ankomst_dato
+"""
+
+
 def hent_bestillinger_for_periode(start_date, end_date):
     """
-    Henter bestillinger for en gitt periode.
+    Henter bestillinger som er aktive minst én dag i en gitt periode.
+    
+    Filtreringen skjer i SQL, og datokolonnene returneres som tidspunkter
+    i norsk tid. Forekomster av gjentakende bestillinger er med, med tom id
+    og gjentakelse_id satt.
     
     Args:
-        start_date: Startdato (datetime eller str)
-        end_date: Sluttdato (datetime eller str)
+        start_date: Startdato (date, datetime eller str)
+        end_date: Sluttdato (date, datetime eller str)
         
     Returns:
         pd.DataFrame: DataFrame med bestillinger for perioden
     """
     try:
-        # Konverter og normaliser datoer
-        start_dt = normalize_datetime(safe_to_datetime(start_date))
-        end_dt = normalize_datetime(safe_to_datetime(end_date))
+        start_dt = safe_to_datetime(start_date)
+        end_dt = safe_to_datetime(end_date)
         
         if not all([start_dt, end_dt]):
             logger.error("Ugyldig start- eller sluttdato")
             return pd.DataFrame()
             
-        logger.info(
-            f"Henter bestillinger fra {format_date(start_dt)} til {format_date(end_dt)}"
-        )
-
-        # Konverter datoer til databaseformat
-        start_db = convert_for_db(start_dt, "DATE", "tunbroyting_bestillinger")
-        end_db = convert_for_db(end_dt, "DATE", "tunbroyting_bestillinger")
+        params = {"start": start_dt.date().isoformat(), "slutt": end_dt.date().isoformat()}
+        logger.info(f"Henter bestillinger fra {params['start']} til {params['slutt']}")
 
         with get_db_connection("tunbroyting") as conn:
-            query = """
-            SELECT id, customer_id, ankomst_dato, 
-                   avreise_dato, abonnement_type
-            FROM tunbroyting_bestillinger 
-            WHERE 
-                (
-                    (abonnement_type != 'Årsabonnement' AND
-                     ankomst_dato >= ? AND ankomst_dato <= ?)
-                    OR
-                    (abonnement_type = 'Årsabonnement' AND
-                     ankomst_dato <= ? AND 
-                     (avreise_dato IS NULL OR avreise_dato >= ?))
-                )
-            ORDER BY ankomst_dato
-            """
+            df = pd.read_sql_query(AKTIVE_BESTILLINGER_QUERY, conn, params=params)
 
-            params = [
-                start_db, end_db,    # For vanlige bestillinger
-                end_db, start_db     # For årsabonnement
-            ]
-
-            logger.info(f"Executing query with params: {params}")
-            df = pd.read_sql_query(query, conn, params=params)
-            
-            if df.empty:
-                logger.info("Ingen bestillinger funnet for perioden")
-                return df
-            
-            # Konverter datokolonner til datetime med tidssone
-            for col in ['ankomst_dato', 'avreise_dato']:
-                if col in df.columns:
-                    df[col] = pd.to_datetime(df[col]).dt.tz_localize(TZ)
-                    # Formater datoer for visning
-                    df[f"{col}_formatted"] = df[col].apply(
-                        lambda x: format_date(x, "display", "date")
-                    )
-                            
-            # Lag en visningsversjon av dataframe for logging
-            display_df = df.copy()
-            # Bruk formaterte datokolonner for visning
-            for col in ['ankomst_dato', 'avreise_dato']:
-                if f"{col}_formatted" in display_df.columns:
-                    display_df[col] = display_df[f"{col}_formatted"]
-                    display_df = display_df.drop(f"{col}_formatted", axis=1)
+        # Forekomster av gjentakende bestillinger i perioden
+        gjentakende = gjentakende_bestillinger(start_dt.date(), end_dt.date())
+        if not gjentakende.empty:
+            df = pd.concat([df, gjentakende], ignore_index=True).sort_values(
+                "ankomst_dato", kind="stable", ignore_index=True
+            )
+            df["id"] = df["id"].astype("Int64")
             
-            # Logg resultater
-            logger.info(f"Hentet {len(df)} bestillinger")
-            logger.info("Bestillinger for perioden:")
-            logger.info("\n" + display_df.to_string(
-                index=False,
-                max_colwidth=20,
-                justify='left'
-            ))
+        for col in ['ankomst_dato', 'avreise_dato']:
+            df[col] = to_local_timestamps(df[col])
             
-            # Fjern de formaterte kolonner før retur
-            return df.drop([col for col in df.columns if col.endswith('_formatted')], 
-                         axis=1)
+        logger.info(f"Hentet {len(df)} bestillinger")
+        return df
 
     except Exception as e:
         logger.error(f"Error i hent_bestillinger_for_periode: {str(e)}", exc_info=True)
@@ -423,6 +588,16 @@ def hent_bestilling(bestilling_id):
         return None
 
 # update
+def _hent_bestillingsrad(cursor, bestilling_id: int):
+    """Bestillingens kolonner før endring, for å trekke den fra belegget"""
+    cursor.execute(
+        f"SELECT {', '.join(BESTILLING_KOLONNER)} FROM tunbroyting_bestillinger WHERE id = ?",
+        (bestilling_id,),
+    )
+    rad = cursor.fetchone()
+    return dict(zip(BESTILLING_KOLONNER, rad)) if rad is not None else None
+
+
 def oppdater_bestilling(bestilling_id: int, nye_data: Dict[str, Any]) -> bool:
     try:
         query = """UPDATE tunbroyting_bestillinger
@@ -438,8 +613,14 @@ def oppdater_bestilling(bestilling_id: int, nye_data: Dict[str, Any]) -> bool:
         
         with get_db_connection("tunbroyting") as conn:
             c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            gammel = _hent_bestillingsrad(c, bestilling_id)
             c.execute(query, params)
-            conn.commit()
+            # Belegget flyttes fra gammel til ny bestilling i samme transaksjon
+            if gammel is not None:
+                apply_booking_occupancy(c, gammel, -1)
+                apply_booking_occupancy(c, dict(zip(BESTILLING_KOLONNER, params)), 1)
+            c.execute("COMMIT")
             
         logger.info("Bestilling %s oppdatert", bestilling_id)
         return True
@@ -457,10 +638,14 @@ def slett_bestilling(bestilling_id: int) -> bool:
     try:
         with get_db_connection("tunbroyting") as conn:
             c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            gammel = _hent_bestillingsrad(c, bestilling_id)
             c.execute(
                 "DELETE FROM tunbroyting_bestillinger WHERE id = ?", (bestilling_id,)
             )
-            conn.commit()
+            if gammel is not None:
+                apply_booking_occupancy(c, gammel, -1)
+            c.execute("COMMIT")
         logger.info("Slettet bestilling med id: %s", bestilling_id)
         return True
     except sqlite3.Error as e:
@@ -573,6 +758,12 @@ def handle_tun():
     with st.expander("Vis statistikk og visualiseringer", expanded=False):
         vis_tunbroyting_statistikk()
 
+    # Masseimport, masseredigering og eksport, f.eks. ved sesongstart
+    with st.expander("Import, masseredigering og eksport", expanded=False):
+        vis_masseimport()
+        vis_masseredigering()
+        vis_eksport()
+
     # Rediger bestilling
     vis_rediger_bestilling()
 
@@ -604,82 +795,18 @@ def hent_aktive_bestillinger_for_dag(dato: datetime.date) -> pd.DataFrame:
     """
     logger.info("=== STARTER HENT_AKTIVE_BESTILLINGER_FOR_DAG ===")
     try:
-        # Hent alle bestillinger først
-        bestillinger = get_bookings()
-        if bestillinger.empty:
-            return bestillinger
-            
-        # Normaliser input-dato til midnatt med tidssone
-        dato_normalisert = datetime.combine(dato, datetime.min.time())
-        dato_normalisert = pytz.timezone('Europe/Oslo').localize(dato_normalisert)
-        logger.info(f"Normalisert dato for filtrering: {dato_normalisert}")
-        
-        # Konverter datoer til datetime med tidssone
-        bestillinger['ankomst_dato'] = pd.to_datetime(bestillinger['ankomst_dato'])
-        if 'avreise_dato' in bestillinger.columns:
-            bestillinger['avreise_dato'] = pd.to_datetime(bestillinger['avreise_dato'])
-            
-        # Konverter til riktig tidssone hvis ikke allerede satt
-        for col in ['ankomst_dato', 'avreise_dato']:
-            if col in bestillinger.columns:
-                if bestillinger[col].dt.tz is None:
-                    bestillinger[col] = bestillinger[col].dt.tz_localize('Europe/Oslo')
-                else:
-                    bestillinger[col] = bestillinger[col].dt.tz_convert('Europe/Oslo')
-        
-        # Filtrer basert på dato og abonnement_type
-        mask = (
-            # Vanlige bestillinger som starter på den gitte datoen
-            (
-                (bestillinger["abonnement_type"] != "Årsabonnement") &
-                (bestillinger["ankomst_dato"].dt.normalize() == dato_normalisert)
-            ) |
-            # Årsabonnement som er aktive (ankomst passert og ikke utløpt)
-            (
-                (bestillinger["abonnement_type"] == "Årsabonnement") &
-                (bestillinger["ankomst_dato"].dt.normalize() <= dato_normalisert) &
-                (
-                    bestillinger["avreise_dato"].isna() |
-                    (bestillinger["avreise_dato"].dt.normalize() >= dato_normalisert)
-                )
-            )
-        )
-            
-        return bestillinger[mask].copy()
+        return hent_bestillinger_for_periode(dato, dato)
         
     except Exception as e:
         logger.error(f"Feil i hent_aktive_bestillinger_for_dag: {str(e)}")
         return pd.DataFrame()
 
 def tunbroyting_kommende_uke(bestillinger):
-    current_date = get_current_time()
-    end_date = current_date + timedelta(days=7)
-    
-    # Sikre at datoene er i riktig timezone
-    current_date = current_date.astimezone(TZ)
-    end_date = end_date.astimezone(TZ)
-
-    return bestillinger[
-        (
-            # Bestillinger som starter i kommende uke
-            (
-                (bestillinger["ankomst_dato"].dt.tz_convert(TZ) >= current_date) & 
-                (bestillinger["ankomst_dato"].dt.tz_convert(TZ) <= end_date)
-            )
-            |
-            # Pågående bestillinger
-            (
-                (bestillinger["ankomst_dato"].dt.tz_convert(TZ) < current_date) &
-                (
-                    (bestillinger["avreise_dato"].isnull()) |
-                    (bestillinger["avreise_dato"].dt.tz_convert(TZ) >= current_date)
-                )
-            )
-            |
-            # Årsabonnement bestillinger
-            (bestillinger["abonnement_type"] == "Årsabonnement")
-        )
-    ]
+    """Bestillinger som er aktive minst én dag de neste sju dagene"""
+    current_date = get_current_time().date()
+    return BookingIntervalIndex(bestillinger).active_between(
+        current_date, current_date + timedelta(days=7)
+    )
 
 def get_bookings(start_date=None, end_date=None):
     """Henter bestillinger fra databasen"""
@@ -693,7 +820,7 @@ def get_bookings(start_date=None, end_date=None):
 
         with get_db_connection("tunbroyting") as conn:
             query = """
-            SELECT DISTINCT 
+            SELECT
                 id, 
                 customer_id,
                 ankomst_dato,
@@ -726,7 +853,57 @@ def get_bookings(start_date=None, end_date=None):
     except Exception as e:
         logger.error(f"Error in get_bookings: {str(e)}", exc_info=True)
         return pd.DataFrame()
-   
+
+
+@st.cache_resource(max_entries=2, ttl=3600)
+def _cached_booking_index(bookings_version: int) -> BookingIntervalIndex:
+    return BookingIntervalIndex(get_bookings())
+
+
+def get_booking_index() -> BookingIntervalIndex:
+    """
+    Intervallindeks over alle bestillinger, delt mellom sidene.
+
+    Indeksen bygges én gang per versjon av bestillingstabellen, så oppslag på
+    aktive bestillinger slipper å hente og filtrere alt på nytt.
+    """
+    bookings_version = get_data_version("tunbroyting", "tunbroyting_bestillinger")
+    if bookings_version is None:
+        return BookingIntervalIndex(get_bookings())
+    return _cached_booking_index(bookings_version)
+
+
+def _bookings_for_statistics(start_date: date, end_date: date) -> pd.DataFrame:
+    gjentakende = gjentakende_bestillinger(start_date, end_date)
+    bookings = get_bookings()
+    if gjentakende.empty:
+        return bookings
+    return pd.concat([bookings, gjentakende.drop(columns="gjentakelse_id")], ignore_index=True)
+
+
+@st.cache_data(ttl=3600, max_entries=16)
+def _cached_tun_statistics(
+    start_date: date, end_date: date, bookings_version: int, rules_version: int
+) -> TunStatistikk:
+    return compute_tun_statistics(_bookings_for_statistics(start_date, end_date), start_date, end_date)
+
+
+def get_tun_statistics(start_date: date, end_date: date) -> TunStatistikk:
+    """
+    Statistikk for tunbestillingene i perioden, inkludert gjentakende bestillinger.
+
+    Cachen følger versjonene av bestillings- og gjentakelsestabellen, så
+    statistikksiden og rapportdashbordet deler samme utregning.
+    """
+    bookings_version = get_data_version("tunbroyting", "tunbroyting_bestillinger")
+    rules_version = get_data_version("tunbroyting", "tunbroyting_gjentakelser")
+    if bookings_version is None or rules_version is None:
+        return compute_tun_statistics(
+            _bookings_for_statistics(start_date, end_date), start_date, end_date
+        )
+    return _cached_tun_statistics(start_date, end_date, bookings_version, rules_version)
+
+
 # Visninger for tunbrøyting
 def vis_tunbroyting_statistikk(bookings_func=None):
     """
@@ -736,87 +913,77 @@ def vis_tunbroyting_statistikk(bookings_func=None):
         bookings_func (callable, optional): Funksjon for å hente bestillinger
     """
     try:
-        bestillinger = bookings_func() if bookings_func else get_bookings()
+        idag = get_current_time().date()
+        index = BookingIntervalIndex(bookings_func()) if bookings_func else get_booking_index()
+        bestillinger = index.bookings
         
         if bestillinger.empty:
             st.info("Ingen bestillinger å vise statistikk for.")
             return
-            
-        # Konverter datokolonner til datetime med tidssone
-        for col in ['ankomst_dato', 'avreise_dato']:
-            if col in bestillinger.columns:
-                bestillinger[col] = pd.to_datetime(bestillinger[col])
-                if bestillinger[col].dt.tz is None:
-                    bestillinger[col] = bestillinger[col].dt.tz_localize('Europe/Oslo')
-                else:
-                    bestillinger[col] = bestillinger[col].dt.tz_convert('Europe/Oslo')
-                
-        # Filtrer aktive bestillinger - bruk samme logikk som i hent_aktive_bestillinger_for_dag
-        current_date = get_current_time().replace(hour=0, minute=0, second=0, microsecond=0)
-        aktive_bestillinger = bestillinger[
-            (
-                (bestillinger['abonnement_type'] == 'Årsabonnement') &
-                (bestillinger['ankomst_dato'].dt.floor('D') <= current_date) &
-                (
-                    bestillinger['avreise_dato'].isna() |
-                    (bestillinger['avreise_dato'].dt.floor('D') >= current_date)
-                )
-            ) |
-            (
-                (bestillinger['abonnement_type'] == 'Ukentlig ved bestilling') &
-                (bestillinger['ankomst_dato'].dt.floor('D') <= current_date) &
-                (
-                    bestillinger['avreise_dato'].isna() |
-                    (bestillinger['avreise_dato'].dt.floor('D') >= current_date)
-                )
-            )
-        ]
+
+        # Perioden fra første ankomst til siste avreise, og minst til og med i dag
+        forste_ankomst = bestillinger['ankomst_dato'].min()
+        siste_avreise = bestillinger['avreise_dato'].max()
+        start_date = min(forste_ankomst.date() if pd.notna(forste_ankomst) else idag, idag)
+        end_date = max(siste_avreise.date() if pd.notna(siste_avreise) else idag, idag)
+
+        if bookings_func:
+            statistikk = compute_tun_statistics(bestillinger, start_date, end_date)
+        else:
+            statistikk = get_tun_statistics(start_date, end_date)
+        daglig = statistikk.daglig
         
-        # Vis statistikk
+        # Vis statistikk; alle tallene tar med gjentakende bestillinger
         col1, col2 = st.columns(2)
         
         with col1:
             st.metric(
                 "Totalt antall bestillinger", 
-                len(bestillinger)
+                statistikk.totalt
             )
             st.metric(
                 "Aktive bestillinger", 
-                len(aktive_bestillinger)
+                int(daglig.loc[pd.Timestamp(idag), "aktive"])
             )
             
         with col2:
             st.metric(
                 "Årsabonnementer", 
-                len(bestillinger[bestillinger['abonnement_type'] == 'Årsabonnement'])
+                statistikk.per_abonnement.get('Årsabonnement', 0)
             )
             st.metric(
                 "Ukentlige bestillinger",
-                len(bestillinger[bestillinger['abonnement_type'] == 'Ukentlig ved bestilling'])
+                statistikk.per_abonnement.get('Ukentlig ved bestilling', 0)
             )
             
-        # Vis tidslinje over bestillinger
-        if not bestillinger.empty:
-            start_date = bestillinger['ankomst_dato'].min()
-            end_date = bestillinger['avreise_dato'].max()
-            
-            if pd.notna(start_date) and pd.notna(end_date):
-                dato_range = pd.date_range(
-                    start=normalize_datetime(start_date),
-                    end=normalize_datetime(end_date),
-                    freq='D',
-                    tz=TZ
-                )
-                
-                fig = px.bar(
-                    dato_range,
-                    x=dato_range,
-                    y=[len(bestillinger[bestillinger['ankomst_dato'].dt.date == dato.date()]) for dato in dato_range],
-                    labels={'x': 'Dato', 'y': 'Antall bestillinger'},
-                    title='Tunbrøytingsaktivitet neste uke'
-                )
-                
-                st.plotly_chart(fig, use_container_width=True, key="fig_today")
+        # Belegg per rode for én dag, f.eks. kommende fredag
+        belegg_dato = st.date_input(
+            "Belegg per rode for dato", value=neste_fredag(), format="DD.MM.YYYY", key="belegg_dato"
+        )
+        belegg = get_occupancy(belegg_dato, belegg_dato)
+        if belegg.empty:
+            st.info(f"Ingen aktive bestillinger {belegg_dato.strftime('%d.%m.%Y')}")
+        else:
+            st.dataframe(
+                belegg.drop(columns="date").sort_values("rode").rename(columns={
+                    "rode": "Rode", "annual_count": "Årsabonnement", "weekly_count": "Ukentlig",
+                }),
+                hide_index=True,
+                use_container_width=True,
+            )
+        
+        # Tidslinje over ankomster, avreiser og aktive bestillinger
+        fig = go.Figure()
+        fig.add_trace(go.Bar(x=daglig.index, y=daglig["ankomster"], name="Ankomster"))
+        fig.add_trace(go.Bar(x=daglig.index, y=daglig["avreiser"], name="Avreiser"))
+        fig.add_trace(go.Scatter(x=daglig.index, y=daglig["aktive"], name="Aktive", mode="lines"))
+        fig.update_layout(
+            title="Tunbrøytingsaktivitet",
+            xaxis_title="Dato",
+            yaxis_title="Antall bestillinger",
+            barmode="group",
+        )
+        st.plotly_chart(fig, use_container_width=True, key="fig_today")
         
     except Exception as e:
         logger.error(f"Feil i vis_tunbroyting_statistikk: {str(e)}", exc_info=True)
@@ -929,21 +1096,9 @@ def vis_tunbroyting_oversikt():
         mapbox_token = st.secrets["mapbox"]["access_token"]
         logger.info(f"Mapbox token hentet fra secrets: {'Ja' if mapbox_token else 'Nei'}")
         
-        # Hent bestillinger
-        bestillinger = get_bookings()
-        
-        if bestillinger.empty:
-            st.write("Ingen bestillinger å vise.")
-            return
-
-        # Konverter datokolonner til riktig format og tidssone først
-        for col in ['ankomst_dato', 'avreise_dato']:
-            if col in bestillinger.columns:
-                bestillinger[col] = bestillinger[col].apply(safe_to_datetime)
-
         # --- Vis kart for dagens bestillinger ---
         current_time = get_current_time()
-        dagens_bestillinger = filter_todays_bookings(bestillinger.copy())
+        dagens_bestillinger = hent_aktive_bestillinger_for_dag(current_time.date())
         
         # Debug logging
         logger.info(f"Dagens bestillinger før kartvisning: {len(dagens_bestillinger)} rader")
@@ -960,12 +1115,26 @@ def vis_tunbroyting_oversikt():
             debug_map_data(dagens_bestillinger)  # Logger debug info
             
             # Bruk ny kartfunksjon
-            fig_today = ny_dagens_tunkart(
-                dagens_bestillinger, 
-                mapbox_token, 
-                f"Tunbrøyting {format_date(current_time, 'display', 'date')}"
+            fig_today = get_cached_figure(
+                "tunkart_i_dag",
+                current_time.date(),
+                mapbox_token,
+                lambda: ny_dagens_tunkart(
+                    dagens_bestillinger, 
+                    mapbox_token, 
+                    f"Tunbrøyting {format_date(current_time, 'display', 'date')}"
+                ),
             )
             
+            if fig_today and st.checkbox("Vis brøytedekning", key="vis_dekning"):
+                dekning_periode = st.date_input(
+                    "Periode for brøytedekning",
+                    value=(current_time.date() - timedelta(days=1), current_time.date()),
+                    key="dekning_periode",
+                )
+                if isinstance(dekning_periode, tuple) and len(dekning_periode) == 2:
+                    fig_today = legg_til_dekningslag(fig_today, get_dekning(*dekning_periode))
+
             if fig_today:
                 st.plotly_chart(fig_today, use_container_width=True, key="fig_today")
             else:
@@ -973,10 +1142,42 @@ def vis_tunbroyting_oversikt():
         else:
             st.warning(f"Kunne ikke vise kart: {error_msg}")
         
+        # --- Kart for én rode ---
+        with st.expander("Kart per rode"):
+            roder = sorted(r for r in get_map_viewports() if r != ALL_RODER)
+            valgt_rode = st.selectbox("Rode", roder, key="kart_rode")
+            if valgt_rode:
+                fig_rode = get_cached_figure(
+                    f"tunkart_rode_{valgt_rode}",
+                    current_time.date(),
+                    mapbox_token,
+                    lambda: vis_alle_hytter_tunkart(
+                        dagens_bestillinger, mapbox_token, f"Rode {valgt_rode}", rode=valgt_rode
+                    ),
+                )
+                if fig_rode:
+                    st.plotly_chart(fig_rode, use_container_width=True, key="fig_rode")
+
         # --- Vis dagens bestillinger som liste ---
         st.subheader(f"Tunbrøytinger {format_date(current_time, 'display', 'date')}")
         vis_dagens_bestillinger()
         st.write("---")
+
+        # --- Brøytespor fra GPS ---
+        with st.expander("Brøytespor"):
+            spor_dato = st.date_input("Dato for brøytespor", value=current_time.date(), key="spor_dato")
+            detalj = st.select_slider(
+                "Detaljnivå (zoom)", options=list(range(12, 18)), value=14, key="spor_zoom"
+            )
+            fig_spor = vis_broytespor_kart(
+                get_simplified_tracks(spor_dato, detalj),
+                mapbox_token,
+                f"Brøytespor {format_date(spor_dato, 'display', 'date')}",
+                zoom=detalj,
+            )
+            if fig_spor:
+                st.plotly_chart(fig_spor, use_container_width=True, key="fig_spor")
+        st.write("---")
         
         # --- Vis bestillinger for valgt periode ---
         st.subheader("Tunbrøyting i valgt periode")
@@ -1009,10 +1210,6 @@ def vis_tunbroyting_oversikt():
         
         periode_bestillinger = hent_bestillinger_for_periode(periode_start, periode_slutt)
         if not periode_bestillinger.empty:
-            for col in ['ankomst_dato', 'avreise_dato']:
-                if col in periode_bestillinger.columns:
-                    periode_bestillinger[col] = periode_bestillinger[col].apply(safe_to_datetime)
-            
             # Vis oversikt
             st.dataframe(
                 periode_bestillinger,
@@ -1040,7 +1237,7 @@ def vis_tunbroyting_oversikt():
         st.write("---")
         st.subheader("Oversiktskart - Hytter og abonnementstyper")
         try:
-            with open("utils/services/plowing_map.html", "r") as f:
+            with open(PLOWING_MAP_FILE, "r", encoding="utf-8") as f:
                 html_content = f.read()
             st.components.v1.html(html_content, height=600)
         except Exception as e:
@@ -1083,75 +1280,32 @@ def vis_hyttegrend_aktivitet():
             st.error("Kunne ikke laste aktivitetsoversikt på grunn av databasefeil")
             return None
             
-        alle_bestillinger = get_bookings()
-        if alle_bestillinger.empty:
+        # Bare bestillingene som er aktive i grafens periode hentes fra databasen
+        start_date, end_date = get_date_range_defaults()
+        periode_bestillinger = hent_bestillinger_for_periode(start_date, end_date)
+        if periode_bestillinger.empty:
             st.info("Ingen bestillinger funnet for perioden.")
             return
 
-        # Konverter datoer til datetime med tidssone
-        for col in ['ankomst_dato', 'avreise_dato']:
-            if col in alle_bestillinger.columns:
-                alle_bestillinger[col] = alle_bestillinger[col].apply(safe_to_datetime)
-        
         # Vis kart over dagens bestillinger
         current_time = get_current_time()
-        dagens_bestillinger = filter_todays_bookings(alle_bestillinger.copy())
+        dagens_bestillinger = BookingIntervalIndex(periode_bestillinger).active_on(current_time.date())
         
-        # Hent Mapbox token
-        mapbox_token = st.secrets["mapbox"]["access_token"]
-        
-        # Vis kartet
+        # Vis kartet; nettleseren tegner det fra en cachet GeoJSON-fil
         if not dagens_bestillinger.empty:
-            fig_today = ny_dagens_tunkart(
-                dagens_bestillinger, 
-                mapbox_token, 
-                f"Tunbrøyting {format_date(current_time, 'display', 'date')}"
-            )
-            if fig_today:
-                st.plotly_chart(fig_today, use_container_width=True)
+            title = f"Tunbrøyting {format_date(current_time, 'display', 'date')}"
+            url = get_cabin_state_url(current_time.date(), lambda: dagens_bestillinger)
+            if url:
+                display_cabin_map(geojson_url=url, legend_title=title)
             else:
-                st.warning("Kunne ikke generere kart for dagens tunbrøytinger")
+                display_cabin_map(
+                    geojson=build_cabin_state_geojson(dagens_bestillinger), legend_title=title
+                )
         else:
             st.info("Ingen aktive tunbrøytinger i dag")
         
-        # Vis aktivitetsgrafen under kartet
-        start_date, end_date = get_date_range_defaults()
-        if isinstance(start_date, date):
-            start_date = datetime.combine(start_date, datetime.min.time())
-        if isinstance(end_date, date):
-            end_date = datetime.combine(end_date, datetime.min.time())
-            
-        dato_range = pd.date_range(
-            start=start_date,
-            end=end_date,
-            freq='D'
-        )
-        
-        df_aktivitet = pd.DataFrame(index=dato_range)
-        df_aktivitet['dato_str'] = df_aktivitet.index.strftime(get_date_format("display", "short_date"))
-        df_aktivitet['årsabonnement'] = 0  # Ny kolonne for årsabonnement
-        df_aktivitet['ukentlig'] = 0       # Ny kolonne for ukentlige bestillinger
-        
-        for dato in dato_range:
-            dato_normalized = normalize_datetime(dato)
-            
-            # Tell enkeltbestillinger for denne dagen
-            enkelt_bestillinger = alle_bestillinger[
-                (alle_bestillinger['abonnement_type'] != 'Årsabonnement') &
-                (alle_bestillinger['ankomst_dato'].apply(normalize_datetime) == dato_normalized)
-            ]
-            df_aktivitet.loc[dato, 'ukentlig'] = len(enkelt_bestillinger)
-            
-            # Tell årsabonnement som er aktive denne dagen
-            års_bestillinger = alle_bestillinger[
-                (alle_bestillinger['abonnement_type'] == 'Årsabonnement') &
-                (alle_bestillinger['ankomst_dato'].apply(normalize_datetime) <= dato_normalized) &
-                (
-                    alle_bestillinger['avreise_dato'].isna() |
-                    (alle_bestillinger['avreise_dato'].apply(normalize_datetime) >= dato_normalized)
-                )
-            ]
-            df_aktivitet.loc[dato, 'årsabonnement'] = len(års_bestillinger)
+        # Vis aktivitetsgrafen under kartet, lest fra det materialiserte belegget
+        df_aktivitet = get_daily_occupancy(start_date, end_date)
         
         # Lag stablede stolper med forskjellige farger
         fig = px.bar(